@@ -0,0 +1,100 @@
+"""
+Benchmark: async route handlers vs their old sync (threadpool) versions.
+Fires 100-1000 simultaneous requests at /pets/owner/{id} through the real
+app (httpx + ASGITransport, no network) and at a sync copy of the handler
+mounted next to it, then reports throughput and latency percentiles.
+
+The sync copy opens its session inline on its own 40-connection pool (one
+per threadpool worker). Behind the usual get_db generator dependency it
+stalls once requests outnumber the workers: handlers blocked on pool
+checkout hold every worker, so the dependency teardown that would return
+connections never runs and requests hit the 30 s pool timeout.
+
+Needs httpx and aiosqlite.
+Run from the repo root:  python -m backend.benchmarks.bench_async_routes [concurrency ...]
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+from backend.benchmarks import common  # noqa: F401  (points GAME_SAVE_DIR at a throwaway dir)
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.main import app
+from backend.db_connect import DATABASE_URL, SessionLocal
+from backend import models, schemas
+
+USERS = 50
+PETS_PER_USER = 40
+THREADPOOL_WORKERS = 40  # Starlette/anyio default
+
+sync_engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False},
+                            pool_size=THREADPOOL_WORKERS, max_overflow=0)
+SyncSession = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+
+
+@app.get("/bench/sync/pets/owner/{owner_id}", response_model=list[schemas.Pet])
+def get_pets_by_owner_sync(owner_id: int):
+    """The pre-async handler, kept here as the baseline."""
+    with SyncSession() as db:
+        user = db.query(models.User).filter(models.User.id == owner_id).first()
+        pets = db.query(models.Pet).filter(models.Pet.owner_id == owner_id).all()
+        return [schemas.Pet.model_validate(pet, from_attributes=True) for pet in pets]
+
+
+def seed():
+    db = SessionLocal()
+    db.execute(models.User.__table__.insert(), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@test.com", "password_hash": "x", "balance": 1000}
+        for i in range(1, USERS + 1)
+    ])
+    db.execute(models.Pet.__table__.insert(), [
+        {"owner_id": 1 + i % USERS, "name": f"Pig {i}", "species": "Guinea Pig", "color": "Brown", "vitals_day": 0}
+        for i in range(USERS * PETS_PER_USER)
+    ])
+    db.commit()
+    db.close()
+
+
+async def burst(client, path, concurrency):
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        start = time.perf_counter()
+        response = await client.get(path.format(random.randint(1, USERS)))
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies, failures
+
+
+async def main(levels):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await burst(client, "/pets/owner/{}", 20)  # warm both pools
+        await burst(client, "/bench/sync/pets/owner/{}", 20)
+        for concurrency in levels:
+            print(f"\n{concurrency} simultaneous requests")
+            for label, path in (("sync def", "/bench/sync/pets/owner/{}"), ("async def", "/pets/owner/{}")):
+                elapsed, latencies, failures = await burst(client, path, concurrency)
+                p50 = latencies[len(latencies) // 2] * 1000
+                p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+                print(f"  {label:<10} {concurrency / elapsed:8.1f} req/s   p50 {p50:8.1f} ms   p99 {p99:8.1f} ms"
+                      f"   failures {failures}")
+
+
+if __name__ == "__main__":
+    levels = [int(arg) for arg in sys.argv[1:]] or [100, 300, 1000]
+    seed()
+    asyncio.run(main(levels))
@@ -0,0 +1,96 @@
+"""
+Benchmark: genetic_code strings vs the packed genotype column (genotype.py).
+
+1. Reading a pet's coat and hair alleles: parsing the string vs shifting the int
+2. Decoding a whole column at once: per-row parsing vs numpy shifts on an array
+3. Finding pets of a genotype: pattern match on genetic_code vs a range on genotype_packed
+
+Run from the repo root:  python -m backend.benchmarks.bench_genotype [pets]
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+from backend.benchmarks.common import make_engine, timed
+from sqlalchemy import func, or_, select, text
+
+from backend import genotype, models
+from backend.pricing import RarityCalculator
+
+
+def random_code(rng):
+    return ";".join(
+        f"{gene}:{rng.choice(symbols)}-{rng.choice(symbols)}" for gene, symbols in genotype.LOCI
+    )
+
+
+def per_call(codes, packed):
+    started = time.perf_counter()
+    for code in codes:
+        genes = RarityCalculator.parse_genetic_code(code)
+        genes.get("coat_color"), genes.get("hair_length")
+    parsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for value in packed:
+        genotype.alleles(value, "coat_color"), genotype.alleles(value, "hair_length")
+    shifted = time.perf_counter() - started
+    print(f"  {'alleles of one pet: parse string':<40} {parsed / len(codes) * 1e6:8.2f} us")
+    print(f"  {'alleles of one pet: packed int':<40} {shifted / len(codes) * 1e6:8.2f} us")
+
+
+def whole_column(codes, packed):
+    started = time.perf_counter()
+    fluffy = sum(1 for code in codes if RarityCalculator.parse_genetic_code(code).get("hair_length") == "hh")
+    parsed = time.perf_counter() - started
+
+    column = np.array(packed, dtype=np.int64)
+    started = time.perf_counter()
+    first, second = genotype.allele_codes(column, "hair_length")
+    fluffy_vectorized = int(np.count_nonzero((first == 2) & (second == 2)))
+    shifted = time.perf_counter() - started
+    assert fluffy == fluffy_vectorized
+    print(f"  {'count hh over column: parse strings':<40} {parsed * 1000:8.1f} ms")
+    print(f"  {'count hh over column: numpy shifts':<40} {shifted * 1000:8.1f} ms")
+
+
+def queries(codes, packed):
+    engine, Session = make_engine("genotype")
+    db = Session()
+    db.execute(models.Pet.__table__.insert(), [
+        {"id": i, "name": f"Pig {i}", "genetic_code": code, "genotype_packed": value}
+        for i, (code, value) in enumerate(zip(codes, packed), 1)
+    ])
+    db.commit()
+    db.execute(text("ANALYZE"))
+    pets = models.Pet
+    # Both allele orders of a heterozygous coat, as the string stores them (GLOB: LIKE ignores case)
+    by_string = select(func.count()).where(
+        or_(pets.genetic_code.op("GLOB")("coat_color:B-O;hair_length:h-h;*"),
+            pets.genetic_code.op("GLOB")("coat_color:O-B;hair_length:h-h;*"))
+    )
+    by_packed = select(func.count()).where(
+        genotype.genotype_filter(pets.genotype_packed, {"coat_color": "BO", "hair_length": "hh"})
+    )
+    with timed("coat+hair genotype: GLOB on string"):
+        for _ in range(20):
+            expected = db.scalar(by_string)
+    with timed("coat+hair genotype: packed range"):
+        for _ in range(20):
+            found = db.scalar(by_packed)
+    assert expected == found, (expected, found)
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    pets = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = random.Random(5)
+    codes = [random_code(rng) for _ in range(pets)]
+    packed = [genotype.pack_genetic_code(code) for code in codes]
+    print(f"\n{pets} genotypes")
+    per_call(codes, packed)
+    whole_column(codes, packed)
+    queries(codes, packed)
@@ -0,0 +1,106 @@
+"""
+Benchmark: per-request commits vs the group-commit writer (write_queue.py).
+Writer threads post transactions through the real route body
+(routes/transactions._create_transaction), once committing on their own
+session each and once funnelled through a WriteCoordinator. Balances are
+checked afterwards, since racing read-modify-write commits can lose updates.
+
+Run from the repo root:  python -m backend.benchmarks.bench_group_commit [seconds] [writers]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from backend.benchmarks import common  # noqa: F401  (points GAME_SAVE_DIR at a throwaway dir)
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend.db_connect import Base, SQLITE_PROFILES, build_engine
+from backend.write_queue import WriteCoordinator, writer_session_factory
+from backend.routes.transactions import _create_transaction
+from backend import models, schemas
+
+USERS = 20
+
+
+def fresh_database(profile):
+    path = os.path.join(tempfile.mkdtemp(prefix="gg_bench_"), f"{profile}.db")
+    url = f"sqlite:///{path}"
+    engine = build_engine(url, profile=profile)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    db.execute(models.User.__table__.insert(), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@test.com", "password_hash": "x", "balance": 0}
+        for i in range(1, USERS + 1)
+    ])
+    db.commit()
+    db.close()
+    return url, engine, Session
+
+
+def direct_writer(Session, stop, counts, n):
+    while not stop.is_set():
+        db = Session()
+        try:
+            _create_transaction(db, schemas.TransactionCreate(user_id=1 + n % USERS, type="bench", amount=1, description="bench"))
+            db.commit()
+            counts["writes"] += 1
+        except OperationalError:
+            db.rollback()
+            counts["errors"] += 1
+        finally:
+            db.close()
+        n += 1
+
+
+def grouped_writer(coordinator, stop, counts, n):
+    while not stop.is_set():
+        try:
+            coordinator.submit(_create_transaction, schemas.TransactionCreate(user_id=1 + n % USERS, type="bench", amount=1, description="bench"))
+            counts["writes"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+        n += 1
+
+
+def run(profile, mode, seconds, writers):
+    url, engine, Session = fresh_database(profile)
+    coordinator = WriteCoordinator(writer_session_factory(url, profile)) if mode == "grouped" else None
+
+    counts = {"writes": 0, "errors": 0}
+    stop = threading.Event()
+    if coordinator:
+        threads = [threading.Thread(target=grouped_writer, args=(coordinator, stop, counts, i)) for i in range(writers)]
+    else:
+        threads = [threading.Thread(target=direct_writer, args=(Session, stop, counts, i)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if coordinator:
+        coordinator.stop()
+
+    db = Session()
+    logged = db.query(func.count(models.Transaction.id)).scalar()
+    balances = db.query(func.sum(models.User.balance)).scalar()
+    db.close()
+    engine.dispose()
+
+    print(f"  {profile:<11} {mode:<8} writes/s {counts['writes'] / seconds:9.1f}   errors {counts['errors']:5}"
+          f"   lost balance updates {logged - balances}")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    print(f"\n{seconds:g}s, {writers} writer threads")
+    for profile in SQLITE_PROFILES:
+        for mode in ("direct", "grouped"):
+            run(profile, mode, seconds, writers)
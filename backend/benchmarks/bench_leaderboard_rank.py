@@ -0,0 +1,147 @@
+"""
+Benchmark: leaderboard score writes with full re-ranking vs ranks computed on read,
+plus the read paths (single rank, top page, "around me" window).
+The legacy path is the old update_leaderboard_ranks (rewrite every row's rank
+after each score change); the new path updates one row and the rank counter
+tree (leaderboard_counts.py), and reads a rank from at most SCORE_FANOUT - 1
+counter rows per level. The read paths run twice: on scores spread over
+0..1,000,000 and on scores bunched around 5,000 (most players within a few
+dozen points, thousands per exact score), where a count of the higher scores
+near the player's own grows with the crowd but the counter tree does not.
+Ranks and totals are checked against a plain COUNT of higher scores.
+
+Run from the repo root:  python -m backend.benchmarks.bench_leaderboard_rank [players] [writes]
+"""
+
+import random
+import sys
+import time
+
+from backend.benchmarks.common import make_engine, timed
+from sqlalchemy import desc, func
+
+from backend import models
+from backend.leaderboard_counts import move_score, rebuild_leaderboard_counts
+from backend.routes.leaderboard import BY_SCORE, get_user_neighborhood, rank_entry, rank_page
+
+
+def legacy_update_ranks(db):
+    """The old routes/leaderboard.update_leaderboard_ranks."""
+    leaderboard_entries = db.query(models.Leaderboard).order_by(desc(models.Leaderboard.score)).all()
+    for rank, entry in enumerate(leaderboard_entries, 1):
+        entry.rank = rank
+    db.commit()
+
+
+def seed(Session, players, clustered=False):
+    rng = random.Random(7)
+    score = (lambda: max(0, round(rng.gauss(5000, 20)))) if clustered else (lambda: rng.randint(0, 1_000_000))
+    db = Session()
+    db.execute(models.User.__table__.insert(), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@test.com", "password_hash": "x"}
+        for i in range(1, players + 1)
+    ])
+    db.execute(models.Leaderboard.__table__.insert(), [
+        {"user_id": i, "score": score()} for i in range(1, players + 1)
+    ])
+    rebuild_leaderboard_counts(db)
+    db.commit()
+    db.close()
+
+
+def score_writes(Session, players, writes, legacy):
+    rng = random.Random(11)
+    db = Session()
+    for _ in range(writes):
+        entry = db.query(models.Leaderboard).filter(models.Leaderboard.user_id == rng.randint(1, players)).first()
+        before = entry.score
+        entry.score += rng.randint(1, 5000)
+        move_score(db, before, entry.score)
+        db.commit()
+        if legacy:
+            legacy_update_ranks(db)
+            db.refresh(entry)
+        else:
+            rank_entry(db, entry)
+    db.close()
+
+
+def rank_reads(Session, players, reads, counted=False):
+    """Random single-rank reads, from the counters or (counted=True) by COUNT(score > s)."""
+    rng = random.Random(13)
+    board = models.Leaderboard
+    db = Session()
+    for _ in range(reads):
+        entry = db.query(board).filter(board.user_id == rng.randint(1, players)).first()
+        if counted:
+            db.query(func.count(board.id)).filter(board.score > entry.score).scalar()
+        else:
+            rank_entry(db, entry)
+    db.close()
+
+
+def check_windows(Session, players):
+    """Time 100 "around me" windows and check them against COUNT. Returns a list of problems."""
+    rng = random.Random(17)
+    with timed("100 'around me' windows (k=10)"):
+        db = Session()
+        windows = [get_user_neighborhood(rng.randint(1, players), k=10, db=db) for _ in range(100)]
+        db.close()
+
+    db = Session()
+    board = models.Leaderboard
+    total = db.query(func.count(board.id)).scalar()
+    wrong = [
+        window["user_id"] for window in windows
+        if window["total_players"] != total or any(
+            ranked.rank != 1 + db.query(func.count(board.id)).filter(board.score > ranked.score).scalar()
+            for ranked in window["entries"]
+        )
+    ]
+    repaired = rebuild_leaderboard_counts(db)
+    db.close()
+    problems = [f"{len(wrong)} windows wrong"] if wrong else []
+    if repaired:
+        problems.append("counters had drifted")
+    print(f"  {'ranks vs COUNT(score > s)':<32} {'ok' if not problems else '; '.join(problems)}")
+    return problems
+
+
+if __name__ == "__main__":
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"\n{players:,} players, scores spread over 0..1,000,000")
+    engine, Session = make_engine("leaderboard")
+    start = time.perf_counter()
+    seed(Session, players)
+    print(f"  (seeded in {time.perf_counter() - start:.1f}s)")
+
+    results = {}
+    with timed(f"{writes} writes, full re-rank", results):
+        score_writes(Session, players, writes, legacy=True)
+    with timed(f"{writes} writes, rank on read", results):
+        score_writes(Session, players, writes, legacy=False)
+    legacy_ms = results[f"{writes} writes, full re-rank"] / writes * 1000
+    new_ms = results[f"{writes} writes, rank on read"] / writes * 1000
+    print(f"  per write: {legacy_ms:.1f} ms -> {new_ms:.2f} ms ({legacy_ms / new_ms:.0f}x)")
+
+    with timed("1000 random rank reads"):
+        rank_reads(Session, players, 1000)
+    with timed("top 100 page"):
+        db = Session()
+        page = rank_page(db.query(models.Leaderboard).order_by(*BY_SCORE).limit(100).all())
+        db.close()
+    assert page[0].rank == 1
+    problems = check_windows(Session, players)
+
+    print(f"\n{players:,} players, scores bunched around 5,000")
+    engine, Session = make_engine("leaderboard_clustered")
+    seed(Session, players, clustered=True)
+    with timed(f"{writes} writes, rank on read"):
+        score_writes(Session, players, writes, legacy=False)
+    with timed("1000 rank reads, COUNT(score > s)"):
+        rank_reads(Session, players, 1000, counted=True)
+    with timed("1000 rank reads, counters"):
+        rank_reads(Session, players, 1000)
+    problems += check_windows(Session, players)
+    sys.exit(1 if problems else 0)
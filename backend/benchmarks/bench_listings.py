@@ -0,0 +1,100 @@
+"""
+Benchmark: /marketplace/listings response time as the market grows.
+Grows the listing count step by step (default 10k -> 100k -> 1M) and times
+the first page and a deep page of every sort order through the real route,
+plus the old unpaginated join (query.all() of every listing) up to a cap.
+
+Run from the repo root:  python -m backend.benchmarks.bench_listings [sizes] [legacy_cap]
+    e.g. python -m backend.benchmarks.bench_listings 10000,100000,1000000 100000
+"""
+
+import random
+import sys
+import time
+
+from backend.benchmarks import common  # noqa: F401  (points GAME_SAVE_DIR at a throwaway dir)
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from backend.main import app
+from backend.db_connect import SessionLocal, engine
+from backend.routes.marketplace import LISTING_SORTS, encode_listing_cursor
+from backend import models
+
+TIERS = ["Common"] * 12 + ["Uncommon"] * 5 + ["Rare", "Rare", "Legendary"]
+CHUNK = 50_000
+
+
+def grow(start, stop, rng):
+    """Add pets start+1..stop, every one of them listed."""
+    db = SessionLocal()
+    for low in range(start, stop, CHUNK):
+        ids = range(low + 1, min(low + CHUNK, stop) + 1)
+        prices = {i: rng.randint(10, 5000) for i in ids}
+        db.execute(models.Pet.__table__.insert(), [
+            {"id": i, "owner_id": 1, "name": f"Pig {i}", "species": "guinea_pig",
+             "rarity_tier": rng.choice(TIERS), "rarity_score": rng.randint(0, 100),
+             "market_value": rng.randint(50, 5000), "hair_type": rng.choice(("short", "fluffy")),
+             "color_phenotype": rng.choice(("Brown", "White", "Orange-White mix")),
+             "for_sale": 1, "asking_price": prices[i], "vitals_day": 0}
+            for i in ids
+        ])
+        db.execute(models.PetMarketplace.__table__.insert(), [
+            {"pet_id": i, "seller_id": 1, "asking_price": prices[i]} for i in ids
+        ])
+        db.commit()
+    db.close()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def time_get(client, params, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get("/marketplace/listings", params=params)
+        best = min(best, time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return best * 1000
+
+
+def legacy_all_listings():
+    """The old route body: join, sort, query.all() and serialize every row."""
+    db = SessionLocal()
+    start = time.perf_counter()
+    rows = db.query(models.Pet, models.PetMarketplace).join(
+        models.PetMarketplace, models.Pet.id == models.PetMarketplace.pet_id
+    ).order_by(models.PetMarketplace.asking_price.asc()).all()
+    result = [{"pet_id": pet.id, "asking_price": listing.asking_price, "listed_date": listing.listed_date}
+              for pet, listing in rows]
+    db.close()
+    return (time.perf_counter() - start) * 1000, len(result)
+
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10_000, 100_000, 1_000_000]
+    legacy_cap = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    rng = random.Random(3)
+
+    db = SessionLocal()
+    db.execute(models.User.__table__.insert(), [{"id": 1, "username": "seller", "email": "s@test.com", "password_hash": "x"}])
+    db.commit()
+    db.close()
+
+    with TestClient(app) as client:
+        current = 0
+        for size in sizes:
+            start = time.perf_counter()
+            grow(current, size, rng)
+            current = size
+            print(f"\n{size:,} listings (seeded in {time.perf_counter() - start:.1f}s), page size 50, best of 5")
+            for sort_by, (column, descending) in LISTING_SORTS.items():
+                first = time_get(client, {"sort_by": sort_by})
+                # A cursor from the middle of the order, as if the user had paged halfway down
+                middle = 2500 if column.key != "rarity_score" else 50
+                deep = time_get(client, {"sort_by": sort_by, "cursor": encode_listing_cursor(sort_by, middle, size // 2)})
+                tier = time_get(client, {"sort_by": sort_by, "rarity": "Legendary"})
+                print(f"  {sort_by:<11} first page {first:7.1f} ms   deep page {deep:7.1f} ms   Legendary only {tier:7.1f} ms")
+            if size <= legacy_cap:
+                elapsed, count = legacy_all_listings()
+                print(f"  old route (all {count:,} rows, no paging)  {elapsed:9.1f} ms")
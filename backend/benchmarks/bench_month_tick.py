@@ -0,0 +1,108 @@
+"""
+Benchmark: monthly world tick.
+Compares the old per-pet ORM loop with the set-based game_time.apply_month_tick
+at 1k / 10k / 100k pets and checks that both kill the same pets.
+
+Run from the repo root:  python -m backend.benchmarks.bench_month_tick [sizes...]
+"""
+
+import random
+import sys
+
+from backend.benchmarks.common import make_engine, timed
+from backend.game_time import apply_month_tick, OLD_AGE_THRESHOLD, DEATH_AGE_THRESHOLD
+from backend.models import Pet
+
+
+def legacy_month_tick(db):
+    """The pre-bulk inc_month loop, kept here as the reference implementation."""
+    dead_pet_names = []
+    for pet in db.query(Pet).all():
+        pet.tick_progress = 0
+        pet.age_months += 1
+        pet.age_days += 30
+        if pet.age_months == OLD_AGE_THRESHOLD:
+            pet.speed = pet.speed // 2
+            pet.endurance = pet.endurance // 2
+        if pet.hunger < 3:
+            pet.hunger += 1
+        if pet.hunger >= 3:
+            pet.health -= 20
+            pet.happiness -= 20
+        if pet.age_months >= 57: pet.points += 10
+        elif pet.age_months >= 48: pet.points += 5
+        elif pet.age_months >= 36: pet.points += 3
+        elif pet.age_months >= 12: pet.points += 2
+        elif pet.age_months >= 3: pet.points += 1
+        if pet.health <= 0 or pet.age_months >= DEATH_AGE_THRESHOLD:
+            dead_pet_names.append(pet.name)
+            db.delete(pet)
+            continue
+        pet.health = max(0, min(100, pet.health))
+        pet.happiness = max(0, min(100, pet.happiness))
+        pet.cleanliness = max(0, min(100, pet.cleanliness))
+        pet.hunger = max(0, min(3, pet.hunger))
+    return dead_pet_names
+
+
+def seed(Session, count, rng_seed=42):
+    rng = random.Random(rng_seed)
+    rows = [
+        {
+            "owner_id": 1,
+            "name": f"Pig {i}",
+            "species": "Guinea Pig",
+            "color": "Brown",
+            "age_days": 0,
+            "age_months": rng.randint(0, 60),
+            "health": rng.randint(0, 100),
+            "happiness": rng.randint(0, 100),
+            "hunger": rng.randint(0, 3),
+            "cleanliness": rng.randint(0, 100),
+            "points": 0,
+            "speed": rng.randint(0, 100),
+            "endurance": rng.randint(0, 100),
+        }
+        for i in range(count)
+    ]
+    db = Session()
+    db.execute(Pet.__table__.insert(), rows)
+    db.commit()
+    db.close()
+
+
+def snapshot(Session):
+    db = Session()
+    try:
+        return db.query(
+            Pet.id, Pet.age_months, Pet.health, Pet.happiness, Pet.hunger, Pet.points, Pet.speed
+        ).order_by(Pet.id).all()
+    finally:
+        db.close()
+
+
+def run(count):
+    print(f"\n{count:,} pets")
+    results = {}
+    outcomes = {}
+    for label, tick in (("legacy ORM loop", legacy_month_tick), ("set-based apply_month_tick", apply_month_tick)):
+        engine, Session = make_engine(f"month_{count}")
+        seed(Session, count)
+        db = Session()
+        with timed(label, results):
+            dead = tick(db)
+            db.commit()
+        db.close()
+        outcomes[label] = (sorted(dead), snapshot(Session))
+        engine.dispose()
+
+    legacy, bulk = outcomes.values()
+    assert legacy == bulk, "bulk tick diverged from the legacy loop"
+    speedup = results["legacy ORM loop"] / results["set-based apply_month_tick"]
+    print(f"  identical results, {len(legacy[0])} deaths, speedup x{speedup:.1f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,257 @@
+"""
+Benchmark: auction and standing-bid order book (order_book.py).
+
+Request threads submit bids straight into the in-memory book (half on timed
+auctions, half standing bids per tier / coat colour), then the matching engine
+runs its rounds: one whose commit fails (as on "database is locked") and must
+keep every accepted bid, one that only persists the accepted bids, and one after the
+auctions have ended that settles them and matches the standing bids against
+fixed-price listings. While that last round runs, FEEDERS threads keep feeding
+pets through the production SQLite profile (busy_timeout 5000 ms), as request
+handlers would; none of their writes may fail with "database is locked".
+Afterwards the ledger is audited:
+
+- no accepted bid was lost to the failed round
+- money is conserved and each balance moved by exactly its logged transactions
+- no pet was sold twice, and every sold pet belongs to its buyer
+- every settled auction went to its highest bid that was still open
+- persisted bids match the book, and the market stats counters match a rebuild
+
+Exits 1 on any of these.
+
+Run from the repo root:  python -m backend.benchmarks.bench_order_book [bids] [threads]
+"""
+
+import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.benchmarks import common  # noqa: F401  (points GAME_SAVE_DIR at a throwaway dir)
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.db_connect import Base, build_engine
+from backend.market_stats import rebuild_market_stats
+from backend.order_book import OrderBook, OrderBookConfig
+from backend.write_queue import writer_session_factory
+
+USERS = 200
+START_BALANCE = 5000
+AUCTIONS = 200
+LISTINGS = 1000
+TIERS = ("Common", "Rare")
+COATS = ("Brown", "Orange", "White")
+FEEDERS = 4
+
+
+def fresh_database():
+    path = os.path.join(tempfile.mkdtemp(prefix="gg_bench_"), "order_book.db")
+    url = f"sqlite:///{path}"
+    engine = build_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    rng = random.Random(3)
+    now = datetime.datetime.utcnow()
+    db = Session()
+    db.execute(models.User.__table__.insert(), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@test.com", "password_hash": "x", "balance": START_BALANCE}
+        for i in range(1, USERS + 1)
+    ])
+    pets = AUCTIONS + LISTINGS
+    db.execute(models.Pet.__table__.insert(), [
+        {"id": i, "owner_id": rng.randint(1, USERS), "name": f"Pig {i}", "rarity_tier": rng.choice(TIERS),
+         "coat_dominant": rng.choice(COATS), "hair_type": "short", "market_value": 100,
+         "for_sale": 1 if i > AUCTIONS else 0, "asking_price": rng.randint(50, 500) if i > AUCTIONS else None}
+        for i in range(1, pets + 1)
+    ])
+    db.execute(models.PetMarketplace.__table__.insert(), [
+        {"pet_id": pet.id, "seller_id": pet.owner_id, "asking_price": pet.asking_price}
+        for pet in db.scalars(select(models.Pet).where(models.Pet.for_sale == 1))
+    ])
+    db.execute(models.Auction.__table__.insert(), [
+        {"id": i, "pet_id": i, "seller_id": db.get(models.Pet, i).owner_id, "reserve_price": 20,
+         "starts_at": now, "ends_at": now + datetime.timedelta(minutes=5), "status": "open"}
+        for i in range(1, AUCTIONS + 1)
+    ])
+    rebuild_market_stats(db)
+    db.commit()
+    db.close()
+    return url, engine, Session
+
+
+def audit(Session, book):
+    """Problems found in the ledger (empty when consistent)."""
+    db = Session()
+    problems = []
+    total = db.scalar(select(func.sum(models.User.balance)))
+    if total != START_BALANCE * USERS:
+        problems.append(f"money not conserved: {total - START_BALANCE * USERS:+}")
+    logged = dict(db.execute(
+        select(models.Transaction.user_id, func.sum(models.Transaction.amount)).group_by(models.Transaction.user_id)
+    ).all())
+    drifted = sum(
+        1 for user_id, balance in db.execute(select(models.User.id, models.User.balance))
+        if balance != START_BALANCE + logged.get(user_id, 0) or balance < 0
+    )
+    if drifted:
+        problems.append(f"{drifted} balances negative or disagreeing with their transactions")
+    resold = db.execute(
+        select(models.PetSalesHistory.pet_id).group_by(models.PetSalesHistory.pet_id).having(func.count() > 1)
+    ).all()
+    if resold:
+        problems.append(f"{len(resold)} pets sold more than once")
+    wrong_owner = db.scalar(
+        select(func.count()).select_from(models.PetSalesHistory)
+        .join(models.Pet, models.Pet.id == models.PetSalesHistory.pet_id)
+        .where(models.Pet.owner_id != models.PetSalesHistory.buyer_id)
+    )
+    if wrong_owner:
+        problems.append(f"{wrong_owner} sold pets not owned by their buyer")
+
+    bids = models.MarketBid
+    for auction in db.scalars(select(models.Auction).where(models.Auction.status == "settled")):
+        # Bids above the winner may only have lost because their bidder could not pay
+        higher = db.scalar(select(func.count()).where(
+            bids.auction_id == auction.id, bids.price > auction.final_price, bids.status != "rejected"
+        ))
+        if higher:
+            problems.append(f"auction {auction.id} did not go to its best payable bid")
+            break
+    still_open = db.scalar(select(func.count()).select_from(models.Auction).where(models.Auction.status == "open"))
+    if still_open:
+        problems.append(f"{still_open} auctions left open")
+    persisted = db.scalar(select(func.count()).select_from(bids))
+    if persisted != book.metrics["bids_accepted"]:
+        problems.append(f"{persisted} bids persisted of {book.metrics['bids_accepted']} accepted")
+    drifted_tiers = rebuild_market_stats(db)
+    if drifted_tiers:
+        problems.append(f"market stats drifted for {drifted_tiers}")
+    db.rollback()
+    db.close()
+    return problems
+
+
+def feed_while(Session, running, results):
+    """Feed random pets, one short write transaction each, until `running` is cleared."""
+    rng = random.Random(threading.get_ident())
+    while running.is_set():
+        db = Session()
+        started = time.perf_counter()
+        try:
+            db.execute(update(models.Pet).where(models.Pet.id == rng.randint(1, AUCTIONS + LISTINGS))
+                       .values(hunger=0))
+            db.commit()
+            results.append(time.perf_counter() - started)
+        except OperationalError:
+            db.rollback()
+            results.append(None)
+        finally:
+            db.close()
+        time.sleep(0.01)
+
+
+class FailingCommit:
+    """Session factory whose sessions fail to commit while `failing` is set."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.failing = False
+
+    def __call__(self):
+        db = self.factory()
+        if self.failing:
+            def commit():
+                raise RuntimeError("database is locked")
+            db.commit = commit
+        return db
+
+
+def run(bids, threads):
+    url, engine, Session = fresh_database()
+    sessions = FailingCommit(writer_session_factory(url))
+    book = OrderBook(sessions, OrderBookConfig())
+    book.config.max_trades = bids
+    book.load()
+
+    rng = random.Random(11)
+    orders = []
+    for _ in range(bids):
+        bidder = rng.randint(1, USERS)
+        if rng.random() < 0.5:
+            orders.append((bidder, rng.randint(20, 2000), rng.randint(1, AUCTIONS), None))
+        else:
+            orders.append((bidder, rng.randint(10, 400), None, (rng.choice(TIERS), rng.choice(COATS), None)))
+
+    def submit(order):
+        bidder, price, auction_id, key = order
+        try:
+            book.submit_bid(bidder, price, auction_id=auction_id, key=key)
+            return True
+        except ValueError:
+            return False  # did not beat the best auction bid, or own auction
+
+    print(f"\n{bids} bids from {threads} threads, {AUCTIONS} auctions, {LISTINGS} listings, {USERS} players")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        accepted = sum(pool.map(submit, orders))
+    elapsed = time.perf_counter() - started
+    print(f"  {'submit':<32} {bids / elapsed:10.0f} bids/s   accepted {accepted}, refused {bids - accepted}")
+
+    # Standing bids are matched on every round; auctions only once they end
+    book.config.max_trades = 0
+    sessions.failing = True
+    try:
+        book.run_round()
+    except RuntimeError:
+        pass
+    sessions.failing = False
+    kept = len(book._bids)
+    print(f"  {'round: commit fails':<32} {kept:10} of {accepted} bids kept")
+    started = time.perf_counter()
+    book.run_round()
+    print(f"  {'round: persist bids':<32} {(time.perf_counter() - started) * 1000:10.1f} ms")
+
+    book.config.max_trades = bids
+    feeds, running = [], threading.Event()
+    running.set()
+    feeders = [threading.Thread(target=feed_while, args=(Session, running, feeds)) for _ in range(FEEDERS)]
+    for feeder in feeders:
+        feeder.start()
+    started = time.perf_counter()
+    try:
+        trades = book.run_round(now=datetime.datetime.utcnow() + datetime.timedelta(minutes=10))
+    finally:
+        elapsed = time.perf_counter() - started
+        running.clear()
+        for feeder in feeders:
+            feeder.join()
+    metrics = book.metrics
+    print(f"  {'round: settle and match':<32} {elapsed * 1000:10.1f} ms   {trades} trades "
+          f"({metrics['auctions_settled']} auctions settled, {metrics['auctions_expired']} expired, "
+          f"{metrics['auctions_cancelled']} cancelled, {metrics['bids_rejected']} bids rejected)")
+    locked = feeds.count(None)
+    waits = [wait for wait in feeds if wait is not None] or [0.0]
+    print(f"  {'feeds during the round':<32} {len(feeds):10} writes   {locked} locked, "
+          f"slowest {max(waits) * 1000:.1f} ms")
+
+    problems = audit(Session, book)
+    if kept != accepted:
+        problems.append(f"failed round lost {accepted - kept} bids")
+    if locked:
+        problems.append(f"{locked} feeds failed with 'database is locked' during the round")
+    engine.dispose()
+    print(f"  {'ledger':<32} {'consistent' if not problems else '; '.join(problems)}")
+    return problems
+
+
+if __name__ == "__main__":
+    bids = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    sys.exit(1 if run(bids, threads) else 0)
@@ -0,0 +1,145 @@
+"""
+Benchmark: the batch revaluation job (revaluation.py) against revaluing pets
+one ORM object at a time with RarityCalculator.calculate_and_store_valuation.
+
+The population has stale valuations, a share of listed pets, and a few codes
+the game would not write (other locus order, no dashes, malformed loci, extra
+genes). The job is stopped after a few chunks and then resumed, as after a
+restart. Afterwards:
+
+- every pet holds exactly what value_pet computes for it
+- the resumed run finished the same RevaluationRun and counted every pet once
+- the market stats counters match a rebuild
+- a second pass changes nothing
+
+Exits 1 on any of these.
+
+Run from the repo root:  python -m backend.benchmarks.bench_revaluation [pets]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from backend.benchmarks import common  # noqa: F401  (points GAME_SAVE_DIR at a throwaway dir)
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import genotype, models
+from backend.db_connect import Base, build_engine
+from backend.market_stats import rebuild_market_stats
+from backend.pricing import RarityCalculator
+from backend.revaluation import VALUED_COLUMNS, RevaluationConfig, RevaluationJob
+from backend.write_queue import writer_session_factory
+
+BASELINE_PETS = 5000
+
+
+def random_code(rng):
+    loci = [(gene, rng.choice(symbols), rng.choice(symbols)) for gene, symbols in genotype.LOCI
+            if rng.random() > 0.05]
+    roll = rng.random()
+    if roll < 0.02:
+        rng.shuffle(loci)
+    elif roll < 0.03:
+        return ";".join(f"{gene}:{a}{b}" for gene, a, b in loci)
+    elif roll < 0.035:
+        loci.append(("speed", "F", "X"))
+    elif roll < 0.04:
+        loci.append(("whiskers", "L", "l"))
+    return ";".join(f"{gene}:{a}-{b}" for gene, a, b in loci)
+
+
+def fresh_database(pets):
+    path = os.path.join(tempfile.mkdtemp(prefix="gg_bench_"), "revaluation.db")
+    url = f"sqlite:///{path}"
+    engine = build_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    rng = random.Random(24)
+    db = Session()
+    rows = []
+    for i in range(1, pets + 1):
+        listed = rng.random() < 0.05
+        rows.append({
+            "id": i, "owner_id": 1, "name": f"Pig {i}",
+            "genetic_code": random_code(rng) if rng.random() > 0.02 else None,
+            "speed": rng.randint(0, 100), "endurance": rng.randint(0, 100),
+            "rarity_score": 0, "rarity_tier": "Common", "market_value": 100,
+            "for_sale": 1 if listed else 0, "asking_price": rng.randint(50, 5000) if listed else None,
+        })
+    db.execute(models.Pet.__table__.insert(), rows)
+    rebuild_market_stats(db)
+    db.commit()
+    db.close()
+    return url, engine, Session
+
+
+def one_by_one(Session):
+    """pets/s of the per-pet ORM path (rolled back afterwards)"""
+    db = Session()
+    started = time.perf_counter()
+    pets = db.scalars(select(models.Pet).where(models.Pet.genetic_code.isnot(None)).limit(BASELINE_PETS)).all()
+    for pet in pets:
+        RarityCalculator.calculate_and_store_valuation(pet, db)
+    db.flush()
+    elapsed = time.perf_counter() - started
+    db.rollback()
+    db.close()
+    return len(pets) / elapsed
+
+
+def audit(Session, run_id, summary):
+    db = Session()
+    problems = []
+    pets = models.Pet.__table__
+    wrong = 0
+    for row in db.execute(select(pets).where(pets.c.genetic_code.isnot(None), pets.c.genetic_code != "")):
+        expected = SimpleNamespace(genetic_code=row.genetic_code, speed=row.speed, endurance=row.endurance)
+        RarityCalculator.value_pet(expected)
+        if tuple(getattr(expected, name) for name in VALUED_COLUMNS) != tuple(row._mapping[name] for name in VALUED_COLUMNS):
+            wrong += 1
+    if wrong:
+        problems.append(f"{wrong} pets disagree with value_pet")
+    with_code = db.scalar(select(func.count()).select_from(pets).where(
+        pets.c.genetic_code.isnot(None), pets.c.genetic_code != ""
+    ))
+    if summary["run_id"] != run_id or summary["status"] != "done" or summary["pets_done"] != with_code:
+        problems.append(f"resumed run {summary['run_id']} ({summary['status']}) did {summary['pets_done']} "
+                        f"of {with_code} pets, expected run {run_id}")
+    drifted = rebuild_market_stats(db)
+    if drifted:
+        problems.append(f"market stats drifted for {drifted}")
+    db.rollback()
+    db.close()
+    return problems
+
+
+def run(pets):
+    url, engine, Session = fresh_database(pets)
+    print(f"\n{pets} pets")
+    print(f"  {'one by one (ORM, flush)':<32} {one_by_one(Session):10.0f} pets/s")
+
+    config = RevaluationConfig()
+    factory = writer_session_factory(url)
+    interrupted = RevaluationJob(factory, config).run(max_chunks=3)
+    resumed = RevaluationJob(factory, config).run()
+    print(f"  {'batch job':<32} {resumed['pets_per_second']:10.0f} pets/s   {resumed['pets_changed']} changed, "
+          f"{resumed['chunks']} chunks of {config.chunk_size} (stopped after {interrupted['chunks']}, resumed)")
+
+    problems = audit(Session, interrupted["run_id"], resumed)
+    again = RevaluationJob(factory, config).run()
+    print(f"  {'second pass':<32} {again['pets_per_second']:10.0f} pets/s   {again['pets_changed']} changed")
+    if again["pets_changed"]:
+        problems.append(f"second pass changed {again['pets_changed']} pets")
+    engine.dispose()
+    print(f"  {'audit':<32} {'consistent' if not problems else '; '.join(problems)}")
+    return problems
+
+
+if __name__ == "__main__":
+    pets = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    sys.exit(1 if run(pets) else 0)
@@ -0,0 +1,104 @@
+"""
+Benchmark: SQLite engine profiles under a concurrent read/write mix.
+Each profile gets a fresh database file. Reader threads page through a
+player's pets while writer threads feed pets and log transactions,
+which is the same shape as the game and the API working on one save.
+
+Run from the repo root:  python -m backend.benchmarks.bench_sqlite_profiles [seconds] [readers] [writers]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from backend.benchmarks import common  # noqa: F401  (points GAME_SAVE_DIR at a throwaway dir)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend.db_connect import Base, SQLITE_PROFILES, build_engine
+from backend import models
+
+USERS = 20
+PETS_PER_USER = 250
+
+
+def seed(Session):
+    db = Session()
+    db.execute(models.User.__table__.insert(), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@test.com", "password_hash": "x", "balance": 1000}
+        for i in range(1, USERS + 1)
+    ])
+    db.execute(models.Pet.__table__.insert(), [
+        {"owner_id": 1 + i % USERS, "name": f"Pig {i}", "species": "Guinea Pig", "color": "Brown",
+         "hunger": 1, "health": 100, "happiness": 100}
+        for i in range(USERS * PETS_PER_USER)
+    ])
+    db.commit()
+    db.close()
+
+
+def reader(Session, stop, counts):
+    rng = random.Random()
+    while not stop.is_set():
+        db = Session()
+        try:
+            db.query(models.Pet).filter(models.Pet.owner_id == rng.randint(1, USERS)).all()
+            counts["reads"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+        finally:
+            db.close()
+
+
+def writer(Session, stop, counts):
+    rng = random.Random()
+    while not stop.is_set():
+        db = Session()
+        try:
+            user_id = rng.randint(1, USERS)
+            pet = db.query(models.Pet).filter(models.Pet.owner_id == user_id).first()
+            pet.hunger = max(0, pet.hunger - 1)
+            db.add(models.Transaction(user_id=user_id, type="pet_feed", amount=0, description="bench"))
+            db.commit()
+            counts["writes"] += 1
+        except OperationalError:
+            db.rollback()
+            counts["errors"] += 1
+        finally:
+            db.close()
+
+
+def run(profile, seconds, readers, writers):
+    path = os.path.join(tempfile.mkdtemp(prefix="gg_bench_"), f"{profile}.db")
+    engine = build_engine(f"sqlite:///{path}", profile=profile)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(Session)
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    stop = threading.Event()
+    threads = [threading.Thread(target=reader, args=(Session, stop, counts)) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(Session, stop, counts)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    print(f"  {profile:<12} reads/s {counts['reads'] / seconds:9.1f}   writes/s {counts['writes'] / seconds:9.1f}"
+          f"   'database is locked' errors {counts['errors']}")
+    return counts
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    print(f"\n{seconds:g}s, {readers} readers, {writers} writers, {USERS * PETS_PER_USER:,} pets")
+    for profile in SQLITE_PROFILES:
+        run(profile, seconds, readers, writers)
@@ -0,0 +1,124 @@
+"""
+API checks against every database backend.
+Runs the same request flow (users, pets, feeding, inventory and leaderboard
+upserts under concurrency, leaderboard counters under concurrent score writes,
+marketplace purchase, month tick) once on a fresh
+SQLite file and once on a throwaway PostgreSQL (see local_postgres.py;
+skipped when PostgreSQL isn't installed). Each backend gets a fresh
+interpreter because DATABASE_URL is read when db_connect is imported.
+
+Run from the repo root:  python -m backend.benchmarks.check_backends
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from backend.benchmarks.local_postgres import find_pg_bin, local_postgres
+
+THREADS = 8
+ADDS_PER_THREAD = 10
+
+
+def run_checks():
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from backend.db_connect import SessionLocal
+    from backend.game_time import apply_month_tick
+    from backend.leaderboard_counts import rebuild_leaderboard_counts
+    from backend import models
+
+    with TestClient(app) as client:
+        def post(path, **kwargs):
+            response = client.post(path, **kwargs)
+            assert response.status_code == 200, (path, response.status_code, response.text)
+            return response.json()
+
+        seller = post("/users/", json={"username": "seller", "email": "s@test.com", "password": "x"})
+        buyer = post("/users/", json={"username": "buyer", "email": "b@test.com", "password": "x"})
+        post("/transactions/", json={"user_id": buyer["id"], "type": "earn", "amount": 500, "description": "check"})
+
+        # Inventory upsert: concurrent adds land on one stack
+        def add_pellets():
+            for _ in range(ADDS_PER_THREAD):
+                post("/inventory/", json={"user_id": seller["id"], "item_name": "Pellets", "quantity": 1})
+        threads = [threading.Thread(target=add_pellets) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stacks = client.get(f"/inventory/{seller['id']}").json()
+        assert [(s["item_name"], s["quantity"]) for s in stacks] == [("Pellets", THREADS * ADDS_PER_THREAD)], stacks
+
+        # Leaderboard upsert: one entry per player, score overwritten
+        post("/leaderboard/", json={"user_id": seller["id"], "score": 10})
+        entry = post("/leaderboard/", json={"user_id": seller["id"], "score": 25})
+        post("/leaderboard/", json={"user_id": buyer["id"], "score": 15})
+        board = client.get("/leaderboard/").json()
+        assert [(e["user_id"], e["score"], e["rank"]) for e in board] == [(seller["id"], 25, 1), (buyer["id"], 15, 2)], board
+        assert entry["score"] == 25
+
+        # Leaderboard counters: concurrent score writes for the same players move them exactly once each
+        def write_scores(thread):
+            for i in range(ADDS_PER_THREAD):
+                response = client.put(f"/leaderboard/user/{buyer['id']}", params={"score_update": 100})
+                assert response.status_code == 200, response.text
+                post("/leaderboard/", json={"user_id": seller["id"], "score": 100 * i + thread})
+        threads = [threading.Thread(target=write_scores, args=(thread,)) for thread in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert client.get(f"/leaderboard/user/{buyer['id']}").json()["score"] == 15 + 100 * THREADS * ADDS_PER_THREAD
+        db = SessionLocal()
+        try:
+            assert not rebuild_leaderboard_counts(db), "leaderboard counters drifted"
+        finally:
+            db.close()
+
+        pet = post("/pets/", json={"owner_id": seller["id"], "name": "Biscuit", "species": "guinea_pig", "color": "Brown"})
+        client.put(f"/pets/{pet['id']}", json={"hunger": 2})
+        fed = post(f"/pets/{pet['id']}/feed", json={"item_name": "Pellets"})
+        assert fed["hunger"] == 1, fed
+
+        post(f"/marketplace/list/{pet['id']}", params={"seller_id": seller["id"], "asking_price": 100})
+        assert len(client.get("/marketplace/listings").json()) == 1
+        sale = post(f"/marketplace/purchase/{pet['id']}", params={"buyer_id": buyer["id"]})
+        assert sale["buyer_balance"] == 400 and sale["seller_balance"] == 100, sale
+        assert [p["id"] for p in client.get(f"/pets/owner/{buyer['id']}").json()] == [pet["id"]]
+
+        db = SessionLocal()
+        try:
+            apply_month_tick(db)
+            db.commit()
+            assert db.get(models.Pet, pet["id"]).age_months == 1
+        finally:
+            db.close()
+
+
+def run_backend(label, url):
+    env = dict(os.environ, DATABASE_URL=url, GAME_SAVE_DIR=tempfile.mkdtemp(prefix="gg_check_"))
+    result = subprocess.run([sys.executable, "-m", "backend.benchmarks.check_backends", "--child"],
+                            env=env, capture_output=True, text=True)
+    status = "ok" if result.returncode == 0 else "FAILED"
+    print(f"  {label:<11} {status}")
+    if result.returncode != 0:
+        print(result.stdout[-3000:], result.stderr[-3000:])
+    return result.returncode == 0
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        run_checks()
+        sys.exit(0)
+
+    sqlite_path = os.path.join(tempfile.mkdtemp(prefix="gg_check_"), "check.db")
+    passed = run_backend("sqlite", f"sqlite:///{sqlite_path}")
+    if find_pg_bin() is None:
+        print("  postgresql  skipped (PostgreSQL binaries not found)")
+    else:
+        with local_postgres() as url:
+            passed = run_backend("postgresql", url) and passed
+    sys.exit(0 if passed else 1)
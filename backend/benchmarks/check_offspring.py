@@ -0,0 +1,123 @@
+"""
+Property check: the offspring engine (offspring.py) against brute force.
+
+For each parent pair, every child breed could produce is enumerated - every
+Punnett square cell of every locus times every speed and endurance roll - and
+pushed through the real BreedingEngine.update_stats_from_genetics (the rolls
+fed in order) and RarityCalculator.value_pet. The exact tier, phenotype and
+market value distributions of that population must equal the engine's.
+
+Pairs: random full genotypes, pairs where one parent lacks a locus, and
+identical parents. Also times the engine per pair, uncached and cached.
+Exits 1 on the first disagreement.
+
+Run from the repo root:  python -m backend.benchmarks.check_offspring [pairs]
+"""
+
+import itertools
+import random
+import sys
+import time
+from collections import defaultdict
+from fractions import Fraction
+from types import SimpleNamespace
+from unittest import mock
+
+from backend.benchmarks.common import make_engine
+from backend import genotype
+from backend.genetics import BreedingEngine, PunnettSquare, gene_registry, initialize_genetics_system
+from backend.offspring import STAT_ROLLS, OffspringEngine
+from backend.pricing import RarityCalculator
+
+
+def random_packed(rng, drop=0.0):
+    genes = {gene: rng.choice(symbols) + rng.choice(symbols) for gene, symbols in genotype.LOCI if rng.random() >= drop}
+    return genotype.pack(genes)
+
+
+def brute_force(registry, packed1, packed2):
+    """Exact (tiers, phenotypes, expected value) over every child breed could make"""
+    crosses = []
+    for gene, _ in genotype.LOCI:
+        pair1, pair2 = genotype.alleles(packed1, gene), genotype.alleles(packed2, gene)
+        if pair1 and pair2:
+            crosses.append((gene, PunnettSquare.calculate(pair1, pair2)["offspring_genotypes"]))
+
+    tiers, phenotypes = defaultdict(int), defaultdict(int)
+    value_sum, children = 0, 0
+    rolls = []  # handed to update_stats_from_genetics in order: speed, then endurance
+    with mock.patch("backend.genetics.random.randint", side_effect=lambda low, high: rolls.pop(0)):
+        for cells in itertools.product(*(cells for _, cells in crosses)):
+            loci = [(gene, cell) for (gene, _), cell in zip(crosses, cells)]
+            genetics = [
+                SimpleNamespace(gene_id=registry.genes_by_name[gene].id,
+                                allele1_id=registry.allele(registry.genes_by_name[gene].id, cell[0]).id,
+                                allele2_id=registry.allele(registry.genes_by_name[gene].id, cell[1]).id)
+                for gene, cell in loci
+            ]
+            code = ";".join(f"{gene}:{cell[0]}-{cell[1]}" for gene, cell in loci)
+            for speed_roll, endurance_roll in itertools.product(STAT_ROLLS, STAT_ROLLS):
+                rolls[:] = [speed_roll, endurance_roll]
+                child = SimpleNamespace(genetic_code=code, speed=50, endurance=50)
+                BreedingEngine.update_stats_from_genetics(None, child, genetics)
+                RarityCalculator.value_pet(child)
+                tiers[child.rarity_tier] += 1
+                phenotypes[child.color_phenotype, child.hair_type] += 1
+                value_sum += child.market_value
+                children += 1
+    return (
+        {tier: Fraction(count, children) for tier, count in tiers.items()},
+        {key: Fraction(count, children) for key, count in phenotypes.items()},
+        Fraction(value_sum, children),
+    )
+
+
+def agree(engine, registry, packed1, packed2):
+    result = engine.distribution(packed1, packed2)
+    tiers, phenotypes, expected = brute_force(registry, packed1, packed2)
+    engine_tiers = dict(result.rarity_tiers)
+    engine_phenotypes = {(coat, hair): p for coat, hair, p, *_ in result.phenotypes}
+    same = (
+        engine_tiers == {tier: float(p) for tier, p in tiers.items()}
+        and engine_phenotypes == {key: float(p) for key, p in phenotypes.items()}
+        and result.expected_market_value == float(expected)
+        and abs(sum(p for _, p in result.genotypes) - 1) < 1e-12
+    )
+    if not same:
+        print(f"  MISMATCH {genotype.to_genetic_code(packed1)!r} x {genotype.to_genetic_code(packed2)!r}\n"
+              f"    engine: {engine_tiers} {result.expected_market_value}\n"
+              f"    brute:  {dict((t, float(p)) for t, p in tiers.items())} {float(expected)}")
+    return same
+
+
+if __name__ == "__main__":
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    engine_db, Session = make_engine("offspring")
+    db = Session()
+    initialize_genetics_system(db)
+    registry = gene_registry(db)  # update_stats_from_genetics reads the shared one
+    db.close()
+
+    rng = random.Random(25)
+    cases = [(random_packed(rng), random_packed(rng)) for _ in range(pairs)]
+    cases += [(random_packed(rng, drop=0.4), random_packed(rng, drop=0.4)) for _ in range(pairs // 2)]
+    same_parent = random_packed(rng)
+    cases.append((same_parent, same_parent))
+
+    engine = OffspringEngine(registry)
+    started = time.perf_counter()
+    ok = all([agree(engine, registry, *case) for case in cases])
+    print(f"\n  brute force vs engine               {len(cases):6} pairs    {'ok' if ok else 'FAILED'}"
+          f"   ({time.perf_counter() - started:.1f} s)")
+
+    population = [random_packed(rng) for _ in range(300)]
+    pairs_all = [(a, b) for a in population for b in population]
+    engine = OffspringEngine(registry)
+    for label in ("uncached pairs (first sight)", "cached pairs"):
+        started = time.perf_counter()
+        for a, b in pairs_all:
+            engine.distribution(a, b)
+        elapsed = time.perf_counter() - started
+        print(f"  {label:<35} {elapsed / len(pairs_all) * 1e6:8.2f} us per pair ({len(pairs_all)} lookups)")
+
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,109 @@
+"""
+Property check: RarityCalculator.value_pet (one VALUATION_TABLE lookup) gives
+exactly what the formulas give (value_pet_by_formulas), field for field.
+
+- every genotype of the four loci in both allele orders, each locus also
+  missing, at the stats around every bonus band edge
+- random pets, including malformed and partial genetic codes and extra genes
+
+Also times both paths. Exits 1 on the first disagreement.
+
+Run from the repo root:  python -m backend.benchmarks.check_valuation_table [random_pets]
+"""
+
+import itertools
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from backend.benchmarks import common  # noqa: F401  (points GAME_SAVE_DIR at a throwaway dir)
+from backend.genotype import LOCI
+from backend.pricing import RarityCalculator, _build_valuation_table
+
+FIELDS = ("rarity_score", "rarity_tier", "market_value", "color_phenotype", "hair_type",
+          "coat_dominant", "coat_secondary", "coat_is_pure", "hair_genotype", "genotype_packed")
+EDGE_STATS = [(0, 0), (59, 60), (60, 59), (60, 60), (69, 70), (70, 70), (79, 80), (80, 79), (80, 80),
+              (100, 100), (33, 34), (99, 100)]
+
+
+def stand_in(genetic_code, speed, endurance):
+    return SimpleNamespace(genetic_code=genetic_code, speed=speed, endurance=endurance, rarity_score=0,
+                           rarity_tier="Common", market_value=100, color_phenotype=None, hair_type="short")
+
+
+def outcome(value, genetic_code, speed, endurance):
+    pet = stand_in(genetic_code, speed, endurance)
+    try:
+        returned = value(pet)
+    except Exception as e:
+        return ("raises", type(e).__name__)
+    return returned, tuple(getattr(pet, field, None) for field in FIELDS)
+
+
+def agree(genetic_code, speed, endurance):
+    table = outcome(RarityCalculator.value_pet, genetic_code, speed, endurance)
+    formulas = outcome(RarityCalculator.value_pet_by_formulas, genetic_code, speed, endurance)
+    if table != formulas:
+        print(f"  MISMATCH {genetic_code!r} speed={speed} endurance={endurance}\n"
+              f"    table:    {table}\n    formulas: {formulas}")
+        return False
+    return True
+
+
+def every_genotype():
+    """Genetic codes for every ordered genotype of the loci, each locus also left out."""
+    choices = [[None] + [f"{a}-{b}" for a, b in itertools.product(symbols, repeat=2)] for _, symbols in LOCI]
+    for picks in itertools.product(*choices):
+        yield ";".join(f"{gene}:{alleles}" for (gene, _), alleles in zip(LOCI, picks) if alleles)
+
+
+def random_code(rng):
+    loci = []
+    for gene, symbols in LOCI:
+        roll = rng.random()
+        if roll < 0.1:
+            continue  # missing locus
+        if roll < 0.13:
+            loci.append(f"{gene}:{rng.choice(symbols)}{rng.choice('XYZ')}")  # unknown allele
+        elif roll < 0.15:
+            loci.append(f"{gene}:{rng.choice(symbols)}")  # one allele only
+        else:
+            sep = rng.choice(("-", "-", ""))
+            loci.append(f"{gene}:{rng.choice(symbols)}{sep}{rng.choice(symbols)}")
+    if rng.random() < 0.1:
+        loci.append("whiskers:L-l")
+    rng.shuffle(loci)
+    return ";".join(loci) if rng.random() > 0.01 else rng.choice(("", None))
+
+
+if __name__ == "__main__":
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    started = time.perf_counter()
+    table = _build_valuation_table()
+    print(f"\nVALUATION_TABLE: {len(table)} entries, built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    checked, ok = 0, True
+    for code in every_genotype():
+        for speed, endurance in EDGE_STATS:
+            checked += 1
+            ok = agree(code or None, speed, endurance) and ok
+    print(f"  exhaustive genotypes x band edges   {checked:8} cases   {'ok' if ok else 'FAILED'}")
+
+    rng = random.Random(23)
+    cases = [(random_code(rng), rng.randint(0, 100), rng.randint(0, 100)) for _ in range(samples)]
+    random_ok = all([agree(*case) for case in cases])
+    print(f"  random pets                         {samples:8} cases   {'ok' if random_ok else 'FAILED'}")
+
+    pets = [stand_in(*case) for case in cases if case[0]]
+    for label, value in (("formulas", RarityCalculator.value_pet_by_formulas), ("table lookup", RarityCalculator.value_pet)):
+        started = time.perf_counter()
+        for pet in pets:
+            try:
+                value(pet)
+            except (IndexError, ValueError):
+                pass
+        elapsed = time.perf_counter() - started
+        print(f"  {label:<35} {elapsed / len(pets) * 1e6:8.2f} us per pet")
+
+    sys.exit(0 if ok and random_ok else 1)
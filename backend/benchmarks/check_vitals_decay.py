@@ -0,0 +1,160 @@
+"""
+Property check: vitals.catch_up_decay against the per-day decay it replaces.
+
+The client clock calls /pets/decay once per game day, SECONDS_PER_GAME_DAY
+(10 s) apart. For random pets (hunger, health, happiness, last_updated) and
+pending day counts, step_decay is called at each of those moments, the last
+one at `now`, and catch_up_decay must leave the pet in exactly the same state.
+Includes the idle cases from the review: 60 and 90 game days (600 s, 900 s)
+on a pet fed just before.
+
+Then mixes monthly ticks in with lazy days on a throwaway database: users
+advance their decay_day, game_time.apply_month_tick runs between days, and the
+surviving pets must match stepping each day in turn with the month applied
+where it fell (pets the month kills must be the same ones too).
+
+Also times both paths. Exits 1 on the first disagreement.
+
+Run from the repo root:  python -m backend.benchmarks.check_vitals_decay [pets]
+"""
+
+import datetime
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from backend.benchmarks.common import make_engine
+from backend.game_time import apply_month_tick
+from backend.models import Pet, User
+from backend.vitals import SECONDS_PER_GAME_DAY, apply_pending_decay_all, catch_up_decay, step_decay
+
+FIELDS = ("age_days", "hunger", "health", "happiness", "last_updated")
+NOW = datetime.datetime(2026, 1, 1, 12, 0, 0)
+
+
+def stepped(pet, days):
+    for k in range(days):
+        step_decay(pet, NOW - datetime.timedelta(seconds=SECONDS_PER_GAME_DAY * (days - 1 - k)))
+
+
+def state(pet):
+    return tuple(getattr(pet, field) for field in FIELDS)
+
+
+def agree(hunger, health, happiness, idle_seconds, days):
+    last_updated = NOW - datetime.timedelta(seconds=idle_seconds)
+    reference = SimpleNamespace(age_days=0, hunger=hunger, health=health, happiness=happiness, last_updated=last_updated)
+    lazy = SimpleNamespace(**vars(reference))
+    stepped(reference, days)
+    catch_up_decay(lazy, days, NOW)
+    if state(reference) != state(lazy):
+        print(f"  MISMATCH hunger={hunger} health={health} happiness={happiness} idle={idle_seconds}s days={days}\n"
+              f"    step by step: {state(reference)}\n    catch up:     {state(lazy)}")
+        return False
+    return True
+
+
+def day_time(day, total_days):
+    """Real time game day `day` (1-based) of `total_days` happened at; the last one is NOW."""
+    return NOW - datetime.timedelta(seconds=SECONDS_PER_GAME_DAY * (total_days - day))
+
+
+def month_step(pet):
+    """One month of the vitals apply_month_tick changes, per pet."""
+    pet.age_days += 30
+    pet.hunger = min(3, pet.hunger + 1)
+    if pet.hunger >= 3:
+        pet.health -= 20
+        pet.happiness -= 20
+    pet.health = max(0, min(100, pet.health))
+    pet.happiness = max(0, min(100, pet.happiness))
+
+
+def months_agree(count, rng):
+    """Lazy days with month ticks in between, against stepping every day in turn."""
+    total_days = rng.randint(40, 400)
+    month_after = sorted(rng.sample(range(1, total_days), 3))
+
+    rows = []
+    for i in range(count):
+        rows.append({
+            "id": i + 1, "owner_id": i % 50 + 1, "name": f"Pig {i}", "vitals_day": 0, "age_days": 0,
+            "age_months": 0, "hunger": rng.randint(0, 3), "health": rng.randint(0, 100),
+            "happiness": rng.randint(0, 100), "cleanliness": 100, "points": 0,
+            "last_updated": NOW - datetime.timedelta(seconds=rng.randint(0, total_days * SECONDS_PER_GAME_DAY + 1500)),
+        })
+
+    reference = {row["id"]: SimpleNamespace(**{field: row[field] for field in FIELDS}) for row in rows}
+    done = 0
+    for boundary in month_after + [total_days]:
+        for day in range(done + 1, boundary + 1):
+            for pet in reference.values():
+                step_decay(pet, day_time(day, total_days))
+        if boundary < total_days:
+            for pet_id, pet in list(reference.items()):
+                month_step(pet)
+                if pet.health <= 0:
+                    del reference[pet_id]
+        done = boundary
+
+    engine, Session = make_engine("vitals_months")
+    db = Session()
+    try:
+        db.execute(User.__table__.insert(), [{"id": u, "username": f"user{u}", "decay_day": 0} for u in range(1, 51)])
+        db.execute(Pet.__table__.insert(), rows)
+        db.commit()
+
+        done = 0
+        for boundary in month_after + [total_days]:
+            db.execute(User.__table__.update().values(decay_day=User.__table__.c.decay_day + (boundary - done)))
+            if boundary < total_days:
+                apply_month_tick(db, day_time(boundary, total_days))
+            db.commit()
+            done = boundary
+
+        pets = db.query(Pet).order_by(Pet.id).all()
+        apply_pending_decay_all(db, pets, NOW)
+        lazy = {pet.id: state(pet) for pet in pets}
+    finally:
+        db.close()
+        engine.dispose()
+
+    expected = {pet_id: state(pet) for pet_id, pet in reference.items()}
+    if lazy != expected:
+        for pet_id in sorted(set(lazy) | set(expected)):
+            if lazy.get(pet_id) != expected.get(pet_id):
+                print(f"  MISMATCH pet {pet_id} ({total_days} days, months after {month_after})\n"
+                      f"    step by step: {expected.get(pet_id)}\n    lazy + month: {lazy.get(pet_id)}")
+                break
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    pets = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    ok = agree(0, 100, 100, 600, 60) and agree(0, 100, 100, 900, 90)
+    print(f"\n  idle 600 s / 900 s (fed just before)        {'ok' if ok else 'FAILED'}")
+
+    rng = random.Random(3)
+    cases = []
+    for _ in range(pets):
+        days = rng.choice((0, 1, 2, rng.randint(1, 100), rng.randint(1, 3000)))
+        # last_updated anywhere from long before the first pending day to after now
+        idle = rng.randint(-50, int(days * SECONDS_PER_GAME_DAY) + 1500)
+        cases.append((rng.randint(0, 3), rng.randint(0, 100), rng.randint(0, 100), idle, days))
+    random_ok = all([agree(*case) for case in cases])
+    print(f"  random pets, step_decay every {SECONDS_PER_GAME_DAY:g} s {pets:8} cases   {'ok' if random_ok else 'FAILED'}")
+
+    months_ok = all([months_agree(500, rng) for _ in range(5)])
+    print(f"  lazy days mixed with month ticks, 5 x 500 pets   {'ok' if months_ok else 'FAILED'}")
+
+    for label, run in (("step by step", stepped), ("catch up", lambda pet, days: catch_up_decay(pet, days, NOW))):
+        started = time.perf_counter()
+        for hunger, health, happiness, idle, days in cases:
+            pet = SimpleNamespace(age_days=0, hunger=hunger, health=health, happiness=happiness,
+                                  last_updated=NOW - datetime.timedelta(seconds=idle))
+            run(pet, days)
+        print(f"  {label:<44} {(time.perf_counter() - started) / len(cases) * 1e6:8.2f} us per pet")
+
+    sys.exit(0 if ok and random_ok and months_ok else 1)
@@ -0,0 +1,38 @@
+"""
+Shared helpers for the backend benchmark scripts.
+Every benchmark runs against a throwaway SQLite file so the real save is never touched.
+"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Keep db_connect from creating/printing the real save location on import
+os.environ.setdefault("GAME_SAVE_DIR", tempfile.mkdtemp(prefix="gg_bench_save_"))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.db_connect import Base
+from backend import models  # noqa: F401  (registers every table on Base.metadata)
+
+
+def make_engine(name="bench"):
+    """Create an empty database file with the full schema and return (engine, Session)."""
+    directory = tempfile.mkdtemp(prefix="gg_bench_")
+    path = os.path.join(directory, f"{name}.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@contextmanager
+def timed(label, results=None):
+    """Print (and optionally record) how long the wrapped block took."""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<32} {elapsed * 1000:10.1f} ms")
+    if results is not None:
+        results[label] = elapsed
@@ -0,0 +1,245 @@
+"""
+Index check: EXPLAIN QUERY PLAN for every hot query the routes run.
+Builds the schema from models.py on a throwaway SQLite file, seeds enough
+rows for the planner to care, runs ANALYZE, and fails (exit 1) if any hot
+query scans a table or searches another index than the one it is meant for.
+
+Run from the repo root:  python -m backend.benchmarks.explain_hot_queries
+"""
+
+import datetime
+import re
+import sys
+
+from backend.benchmarks.common import make_engine
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import sqlite
+
+from backend import models
+from backend.db_connect import Base
+from backend.genotype import LOCI, genotype_filter, pack
+from backend.leaderboard_counts import players_ahead_query
+from backend.routes.marketplace import listings_query
+from backend.routes.pets import owner_pets_query
+from backend.score_buckets import period_start
+
+USERS = 200
+PETS_PER_USER = 25
+TIERS = ["Common"] * 12 + ["Uncommon"] * 5 + ["Rare", "Rare", "Legendary"]
+COATS = [("Brown", None, 1), ("Brown", "Orange", 0), ("Brown", "White", 0),
+         ("Orange", None, 1), ("Orange", "White", 0), ("White", None, 1)]
+
+
+def random_genotype(i):
+    """A deterministic spread of packed genotypes over the four loci."""
+    genotypes = {}
+    for gene, symbols in LOCI:
+        genotypes[gene] = symbols[i % len(symbols)] + symbols[(i // 7) % len(symbols)]
+        i //= 3
+    return pack(genotypes)
+
+
+def seed(Session):
+    db = Session()
+    now = datetime.datetime.utcnow()
+    db.execute(models.User.__table__.insert(), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@test.com", "password_hash": "x"}
+        for i in range(1, USERS + 1)
+    ])
+    db.execute(models.Pet.__table__.insert(), [
+        {"id": i, "owner_id": 1 + i % USERS, "name": f"Pig {i}", "species": "guinea_pig", "hunger": i % 4,
+         "for_sale": int(i % 10 == 0), "rarity_tier": TIERS[i % len(TIERS)],
+         "asking_price": i % 500 if i % 10 == 0 else None,
+         "coat_dominant": COATS[i % len(COATS)][0], "coat_secondary": COATS[i % len(COATS)][1],
+         "coat_is_pure": COATS[i % len(COATS)][2], "hair_genotype": ("HH", "Hh", "hh")[i % 3],
+         "genotype_packed": random_genotype(i),
+         "breedable_at": None if i % 5 == 0 else now + datetime.timedelta(minutes=i % 50 - 10)}
+        for i in range(1, USERS * PETS_PER_USER + 1)
+    ])
+    db.execute(models.Transaction.__table__.insert(), [
+        {"user_id": 1 + i % USERS, "type": ("pet_feed", "earn", "pet_sale")[i % 3], "amount": 1,
+         "timestamp": now - datetime.timedelta(minutes=i)}
+        for i in range(USERS * 20)
+    ])
+    db.execute(models.Inventory.__table__.insert(), [
+        {"user_id": u, "item_name": item, "quantity": 3}
+        for u in range(1, USERS + 1) for item in ("Pellets", "Hay", "Carrot")
+    ])
+    db.execute(models.Leaderboard.__table__.insert(), [
+        {"user_id": u, "score": u * 7 % 1000} for u in range(1, USERS + 1)
+    ])
+    db.execute(models.PetMarketplace.__table__.insert(), [
+        {"pet_id": i, "seller_id": 1 + i % USERS, "asking_price": i % 500}
+        for i in range(10, USERS * PETS_PER_USER + 1, 10)
+    ])
+    db.execute(models.PetSalesHistory.__table__.insert(), [
+        {"pet_id": i, "seller_id": 1 + i % USERS, "buyer_id": 1 + (i + 1) % USERS, "sale_price": 100}
+        for i in range(1, 2000)
+    ])
+    db.execute(models.Offspring.__table__.insert(), [
+        {"parent1_id": i, "parent2_id": i + 1, "child_id": i + 2} for i in range(1, 2000, 3)
+    ])
+    db.execute(models.PetGenetics.__table__.insert(), [
+        {"pet_id": i, "gene_id": g, "allele1_id": 1, "allele2_id": 2} for i in range(1, 2000) for g in (1, 2)
+    ])
+    db.execute(models.Allele.__table__.insert(), [
+        {"gene_id": 1 + i % 20, "name": f"a{i}", "symbol": "A"} for i in range(200)
+    ])
+    db.execute(models.SaleRollup.__table__.insert(), [
+        {"hour_start": now - datetime.timedelta(hours=h), "rarity_tier": tier, "coat_color": coat, "hair_type": "short",
+         "sale_count": 1, "volume": 100, "last_price": 100, "last_sale_at": now - datetime.timedelta(hours=h)}
+        for h in range(2000) for tier in ("Common", "Rare") for coat in ("Brown", "White")
+    ])
+    db.commit()
+    db.execute(text("ANALYZE"))
+    db.commit()
+    db.close()
+
+
+# Indexes that lead with the column a query filters on alone; the planner may
+# pick any of them and each is as good as the others
+OWNER_INDEXES = ("ix_pets_owner_hunger", "ix_pets_owner_breedable_at", "ix_pets_owner_value")
+LISTING_INDEXES = ("ix_pets_listing_price", "ix_pets_listing_rarity", "ix_pets_listing_value",
+                   "ix_pets_listing_tier_price", "ix_pets_listing_tier_rarity", "ix_pets_listing_tier_value",
+                   "ix_pets_listing_coat_dominant", "ix_pets_listing_coat_secondary", "ix_pets_listing_coat_pure",
+                   "ix_pets_listing_genotype")
+
+
+def hot_queries():
+    """
+    (label, expected indexes, statement) for the lookups the routes and jobs
+    run most. Each expected entry is an index name, or a tuple of
+    interchangeable ones.
+    """
+    Pet, Tx, Inv, Bucket = models.Pet, models.Transaction, models.Inventory, models.LeaderboardBucket
+    now = datetime.datetime.utcnow()
+    week = period_start("weekly", now)
+    price_order = (Pet.asking_price.asc(), Pet.id.asc())
+    return [
+        ("pets of an owner (/pets/owner)", (OWNER_INDEXES,), select(Pet).where(Pet.owner_id == 7)),
+        ("hungry guinea pigs (feeding.py)", ("ix_pets_owner_hunger",),
+         select(Pet).where(Pet.owner_id == 7, Pet.species == "guinea_pig", Pet.hunger > 0)
+         .order_by(Pet.hunger.desc(), Pet.id.asc())),
+        # /pets/owner?can_breed= (owner_pets_query)
+        ("breedable pets of an owner", ("ix_pets_owner_breedable_at",), owner_pets_query(7, True, now)),
+        ("pets of an owner still cooling down", ("ix_pets_owner_breedable_at",), owner_pets_query(7, False, now)),
+        ("portfolio totals", (OWNER_INDEXES,),
+         select(Pet.rarity_tier, Pet.coat_dominant, Pet.hair_type, func.count(), func.sum(Pet.market_value))
+         .where(Pet.owner_id == 7).group_by(Pet.rarity_tier, Pet.coat_dominant, Pet.hair_type)),
+        ("portfolio detail page", ("ix_pets_owner_value",),
+         select(Pet).where(Pet.owner_id == 7).order_by(Pet.market_value.desc(), Pet.id.desc()).limit(51)),
+        ("pets for sale", (LISTING_INDEXES,), select(Pet).where(Pet.for_sale == 1)),
+        ("pets by rarity tier", ("ix_pets_rarity_tier",), select(Pet).where(Pet.rarity_tier == "Legendary")),
+        ("inventory of a player", ("uq_inventory_user_item",), select(Inv).where(Inv.user_id == 7)),
+        ("inventory stack (feed/upsert)", ("uq_inventory_user_item",),
+         select(Inv).where(Inv.user_id == 7, Inv.item_name == "Hay")),
+        ("transactions of a player", (("ix_transactions_user_type", "ix_transactions_user_timestamp"),),
+         select(Tx).where(Tx.user_id == 7)),
+        ("transactions by type", ("ix_transactions_user_type",),
+         select(Tx).where(Tx.user_id == 7, Tx.type == "pet_feed")),
+        ("recent transactions", ("ix_transactions_user_timestamp",),
+         select(Tx).where(Tx.user_id == 7).order_by(Tx.timestamp.desc()).limit(20)),
+        ("leaderboard top 10", ("ix_leaderboards_score",),
+         select(models.Leaderboard).order_by(models.Leaderboard.score.desc()).limit(10)),
+        ("leaderboard entry", ("ix_leaderboards_user_id",),
+         select(models.Leaderboard).where(models.Leaderboard.user_id == 7)),
+        # One range of the (level, bucket) key per level of the counter tree
+        ("leaderboard rank from counters", ("sqlite_autoindex_leaderboard_score_counts_1",),
+         players_ahead_query(5003)),
+        # /marketplace/listings statements (listings_query); the listing row is
+        # joined on its unique pet_id for the rows of the page
+        ("listings by price", ("ix_pets_listing_price", "sqlite_autoindex_pet_marketplace_1"), listings_query()),
+        ("listings by coat colour",
+         ("ix_pets_listing_coat_dominant", "ix_pets_listing_coat_secondary", "sqlite_autoindex_pet_marketplace_1"),
+         listings_query(coat_color="White")),
+        ("mixed coats for sale", ("ix_pets_listing_coat_pure", "sqlite_autoindex_pet_marketplace_1"),
+         listings_query(coat_color="mix")),
+        ("pets by hair genotype", ("ix_pets_hair_genotype",), select(Pet).where(Pet.hair_genotype == "hh")),
+        ("pets by packed coat+hair genotype", ("ix_pets_genotype_packed",),
+         select(Pet).where(genotype_filter(Pet.genotype_packed, {"coat_color": "BO", "hair_length": "hh"}))),
+        ("listings by packed genotype", ("ix_pets_listing_genotype", "sqlite_autoindex_pet_marketplace_1"),
+         listings_query(genotype_code="coat_color:W-W")),
+        ("market stats: tier min price", ("ix_pets_listing_tier_price",),
+         select(func.min(Pet.asking_price)).where(Pet.for_sale == 1, Pet.rarity_tier == "Rare")),
+        ("market stats: tier max value", ("ix_pets_listing_tier_value",),
+         select(func.max(Pet.market_value)).where(Pet.for_sale == 1, Pet.rarity_tier == "Common")),
+        ("price history: 7d window of a tier", ("ix_sale_rollups_tier_hour",),
+         select(func.sum(models.SaleRollup.sale_count), func.sum(models.SaleRollup.volume))
+         .where(models.SaleRollup.rarity_tier == "Rare", models.SaleRollup.hour_start > now - datetime.timedelta(days=7))),
+        ("price history: last sale", ("ix_sale_rollups_last_sale_at",),
+         select(models.SaleRollup.last_price).where(models.SaleRollup.coat_color == "White")
+         .order_by(models.SaleRollup.last_sale_at.desc()).limit(1)),
+        ("standing bid match (order book)", (("ix_pets_listing_coat_dominant", "ix_pets_listing_tier_price"),),
+         select(Pet).where(Pet.for_sale == 1, Pet.asking_price <= 400, Pet.owner_id != 7,
+                           Pet.rarity_tier == "Rare", Pet.coat_dominant == "White")
+         .order_by(Pet.asking_price, Pet.id).limit(1)),
+        ("auctions due for settlement", ("ix_auctions_status_ends_at",),
+         select(models.Auction).where(models.Auction.status == "open", models.Auction.ends_at <= now)),
+        ("listings of a seller", ("ix_pet_marketplace_seller_id",),
+         select(models.PetMarketplace).where(models.PetMarketplace.seller_id == 7)),
+        ("genes of a pet", (("ix_pet_genetics_pet_id", "uq_pet_genetics_pet_gene"),), select(models.PetGenetics).where(models.PetGenetics.pet_id == 7)),
+        ("alleles of a gene", ("ix_alleles_gene_id",), select(models.Allele).where(models.Allele.gene_id == 3)),
+        ("offspring by parent1", ("ix_offspring_parent1_id",),
+         select(models.Offspring).where(models.Offspring.parent1_id == 7)),
+        ("offspring by parent2", ("ix_offspring_parent2_id",),
+         select(models.Offspring).where(models.Offspring.parent2_id == 7)),
+        ("parents of a child", ("ix_offspring_child_id",),
+         select(models.Offspring).where(models.Offspring.child_id == 7)),
+        ("sales of a pet", ("ix_pet_sales_history_pet_id",),
+         select(models.PetSalesHistory).where(models.PetSalesHistory.pet_id == 7)),
+        ("purchases of a player", ("ix_pet_sales_history_buyer_id",),
+         select(models.PetSalesHistory).where(models.PetSalesHistory.buyer_id == 7)),
+        ("sales of a player", ("ix_pet_sales_history_seller_id",),
+         select(models.PetSalesHistory).where(models.PetSalesHistory.seller_id == 7)),
+        ("mini-game top 100 this week", ("ix_leaderboard_buckets_window_score",),
+         select(Bucket).where(Bucket.game_id == 1, Bucket.period == "weekly", Bucket.period_start == week)
+         .order_by(Bucket.score.desc(), Bucket.id.desc()).limit(100)),
+        ("expire old daily buckets", ("ix_leaderboard_buckets_period_start",),
+         select(Bucket.id).where(Bucket.period == "daily", Bucket.period_start < week)),
+    ]
+
+
+def plan(conn, statement):
+    sql = str(statement.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+    return [row[-1] for row in rows]
+
+
+# Indexes on a table's primary key alone (index=True on the id columns): using
+# one is the same lookup by id as the rowid, so it is never unexpected
+PRIMARY_KEY_INDEXES = {
+    index.name
+    for table in Base.metadata.tables.values() for index in table.indexes
+    if [column.name for column in index.columns] == [column.name for column in table.primary_key.columns]
+}
+
+
+def plan_problems(steps, expected):
+    """
+    What is wrong with a plan: a bare SCAN of a table (a materialized page may
+    be scanned), an index it uses that is not expected, or an expected index
+    it does not use.
+    """
+    problems = [step for step in steps
+                if step.startswith("SCAN") and "INDEX" not in step and step.split()[1] in Base.metadata.tables]
+    used = set(re.findall(r"USING (?:COVERING )?INDEX (\S+)", " | ".join(steps))) - PRIMARY_KEY_INDEXES
+    choices = [(entry,) if isinstance(entry, str) else entry for entry in expected]
+    problems += [f"unexpected {index}" for index in sorted(used) if not any(index in choice for choice in choices)]
+    problems += [f"expected {' or '.join(choice)}" for choice in choices if not used.intersection(choice)]
+    return problems
+
+
+if __name__ == "__main__":
+    engine, Session = make_engine("explain")
+    seed(Session)
+
+    failures = 0
+    with engine.connect() as conn:
+        for label, expected, statement in hot_queries():
+            steps = plan(conn, statement)
+            problems = plan_problems(steps, expected)
+            failures += bool(problems)
+            print(f"  {'FAIL' if problems else 'ok  '} {label:<34} {' | '.join(steps)}")
+            for problem in problems:
+                print(f"         {problem}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,69 @@
+"""
+A throwaway PostgreSQL server in a temp directory, so the backend can be
+checked against Postgres without touching a system install.
+Needs the server binaries (initdb, pg_ctl, createdb) on PATH or in $PG_BIN,
+psycopg2 for the sync engine, and a non-root user (initdb refuses root).
+
+    with local_postgres() as url:
+        ...  # url == "postgresql://postgres@127.0.0.1:<port>/guineagames"
+
+Run from the repo root to keep one up until Ctrl+C:  python -m backend.benchmarks.local_postgres
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def find_pg_bin():
+    """Directory holding initdb/pg_ctl, or None if PostgreSQL isn't installed."""
+    if os.environ.get("PG_BIN"):
+        return os.environ["PG_BIN"]
+    initdb = shutil.which("initdb")
+    return os.path.dirname(initdb) if initdb else None
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_postgres(database="guineagames"):
+    bin_dir = find_pg_bin()
+    if bin_dir is None:
+        raise RuntimeError("PostgreSQL binaries not found (put initdb on PATH or set PG_BIN)")
+
+    data_dir = tempfile.mkdtemp(prefix="gg_pg_")
+    port = _free_port()
+    log_path = os.path.join(data_dir, "server.log")
+    quiet = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+
+    subprocess.run([os.path.join(bin_dir, "initdb"), "-D", data_dir, "-U", "postgres", "-A", "trust", "--no-sync"],
+                   check=True, **quiet)
+    # -F: no fsync, this cluster is disposable
+    server_options = f"-p {port} -k {data_dir} -c listen_addresses=127.0.0.1 -F"
+    subprocess.run([os.path.join(bin_dir, "pg_ctl"), "-D", data_dir, "-o", server_options, "-l", log_path, "-w", "start"],
+                   check=True, **quiet)
+    try:
+        subprocess.run([os.path.join(bin_dir, "createdb"), "-h", "127.0.0.1", "-p", str(port), "-U", "postgres", database],
+                       check=True, **quiet)
+        yield f"postgresql://postgres@127.0.0.1:{port}/{database}"
+    finally:
+        subprocess.run([os.path.join(bin_dir, "pg_ctl"), "-D", data_dir, "-m", "fast", "-w", "stop"], **quiet)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    with local_postgres() as url:
+        print(f"DATABASE_URL={url}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,197 @@
+"""
+Stress test: hundreds of parallel purchases aimed at the same few listings.
+Buyer threads call the real route body (routes/marketplace._purchase_pet),
+committing on their own session each ("direct") and through the group-commit
+writer ("grouped"). A copy of the old read-check-write purchase runs first as
+the baseline. Afterwards the ledger is audited:
+
+- every pet was sold at most once, to the owner it ended up with
+- money is conserved and no balance went negative
+- each player's balance moved by exactly their logged transactions
+- no sold pet is still listed, and the market stats counters match a rebuild
+
+Exits 1 if the current purchase path breaks any of these.
+
+Run from the repo root:  python -m backend.benchmarks.stress_purchases [attempts] [threads] [listings]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.benchmarks import common  # noqa: F401  (points GAME_SAVE_DIR at a throwaway dir)
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.db_connect import Base, build_engine
+from backend.market_stats import listing_key, rebuild_market_stats, update_listing
+from backend.routes.marketplace import _purchase_pet
+from backend.write_queue import WriteCoordinator, writer_session_factory
+
+SELLERS = 5
+BUYERS = 100
+START_BALANCE = 1000
+PRICE = 300  # every buyer can afford three pets, so "Insufficient balance" races happen too
+
+
+def fresh_database(listings):
+    path = os.path.join(tempfile.mkdtemp(prefix="gg_bench_"), "stress.db")
+    url = f"sqlite:///{path}"
+    engine = build_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    db.execute(models.User.__table__.insert(), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@test.com", "password_hash": "x", "balance": START_BALANCE}
+        for i in range(1, SELLERS + BUYERS + 1)
+    ])
+    db.execute(models.Pet.__table__.insert(), [
+        {"id": i, "owner_id": 1 + i % SELLERS, "name": f"Pig {i}", "rarity_tier": "Common",
+         "market_value": 100, "for_sale": 1, "asking_price": PRICE}
+        for i in range(1, listings + 1)
+    ])
+    db.execute(models.PetMarketplace.__table__.insert(), [
+        {"pet_id": i, "seller_id": 1 + i % SELLERS, "asking_price": PRICE} for i in range(1, listings + 1)
+    ])
+    rebuild_market_stats(db)
+    db.commit()
+    db.close()
+    return url, engine, Session
+
+
+def legacy_purchase(db, pet_id, buyer_id):
+    """The old purchase: check in Python on rows read earlier, then write."""
+    pet = db.get(models.Pet, pet_id)
+    listing = db.scalars(select(models.PetMarketplace).where(models.PetMarketplace.pet_id == pet_id)).first()
+    if not listing:
+        raise HTTPException(status_code=404, detail="Pet not listed for sale")
+    buyer = db.get(models.User, buyer_id)
+    seller = db.get(models.User, listing.seller_id)
+    if buyer.balance < listing.asking_price:
+        raise HTTPException(status_code=400, detail="Insufficient balance")
+    price = listing.asking_price
+    buyer.balance -= price
+    seller.balance += price
+    pet.owner_id = buyer_id
+    db.add_all([
+        models.Transaction(user_id=buyer_id, type="pet_purchase", amount=-price, description="stress"),
+        models.Transaction(user_id=listing.seller_id, type="pet_sale", amount=price, description="stress"),
+        models.PetSalesHistory(pet_id=pet_id, seller_id=listing.seller_id, buyer_id=buyer_id, sale_price=price),
+    ])
+    listed_before = listing_key(pet)
+    db.delete(listing)
+    pet.for_sale = 0
+    pet.asking_price = None
+    update_listing(db, listed_before, None)
+    db.flush()
+
+
+def audit(Session, listings):
+    """Problems found in the ledger (empty when consistent)."""
+    db = Session()
+    problems = []
+    total = db.scalar(select(func.sum(models.User.balance)))
+    if total != START_BALANCE * (SELLERS + BUYERS):
+        problems.append(f"money not conserved: {total - START_BALANCE * (SELLERS + BUYERS):+}")
+    negative = db.scalar(select(func.count()).where(models.User.balance < 0))
+    if negative:
+        problems.append(f"{negative} negative balances")
+    resold = db.execute(
+        select(models.PetSalesHistory.pet_id).group_by(models.PetSalesHistory.pet_id).having(func.count() > 1)
+    ).all()
+    if resold:
+        problems.append(f"{len(resold)} pets sold more than once")
+    logged = dict(db.execute(
+        select(models.Transaction.user_id, func.sum(models.Transaction.amount)).group_by(models.Transaction.user_id)
+    ).all())
+    drifted = sum(
+        1 for user_id, balance in db.execute(select(models.User.id, models.User.balance))
+        if balance != START_BALANCE + logged.get(user_id, 0)
+    )
+    if drifted:
+        problems.append(f"{drifted} balances disagree with their transactions")
+    wrong_owner = db.scalar(
+        select(func.count()).select_from(models.PetSalesHistory)
+        .join(models.Pet, models.Pet.id == models.PetSalesHistory.pet_id)
+        .where(models.Pet.owner_id != models.PetSalesHistory.buyer_id)
+    )
+    if wrong_owner:
+        problems.append(f"{wrong_owner} sold pets not owned by their buyer")
+    still_listed = db.scalar(
+        select(func.count()).select_from(models.PetSalesHistory)
+        .join(models.PetMarketplace, models.PetMarketplace.pet_id == models.PetSalesHistory.pet_id)
+    )
+    if still_listed:
+        problems.append(f"{still_listed} sold pets still listed")
+    drifted_tiers = rebuild_market_stats(db)
+    if drifted_tiers:
+        problems.append(f"market stats drifted for {drifted_tiers}")
+    db.rollback()
+    db.close()
+    return problems
+
+
+def run(label, purchase, attempts, threads, listings, grouped=False):
+    url, engine, Session = fresh_database(listings)
+    coordinator = WriteCoordinator(writer_session_factory(url)) if grouped else None
+    counts = {"sold": 0, "rejected": 0, "errors": 0}
+    lock = threading.Lock()
+    rng = random.Random(7)
+    jobs = [(rng.randint(1, listings), rng.randint(SELLERS + 1, SELLERS + BUYERS)) for _ in range(attempts)]
+
+    def attempt(job):
+        outcome = "sold"
+        if coordinator:
+            try:
+                coordinator.submit(purchase, *job)
+            except HTTPException:
+                outcome = "rejected"
+            except OperationalError:
+                outcome = "errors"
+        else:
+            db = Session()
+            try:
+                purchase(db, *job)
+                db.commit()
+            except HTTPException:
+                db.rollback()
+                outcome = "rejected"
+            except OperationalError:
+                db.rollback()
+                outcome = "errors"
+            finally:
+                db.close()
+        with lock:
+            counts[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(attempt, jobs))
+    elapsed = time.perf_counter() - started
+    if coordinator:
+        coordinator.stop()
+
+    problems = audit(Session, listings)
+    engine.dispose()
+    print(f"  {label:<20} {attempts / elapsed:8.1f} attempts/s   sold {counts['sold']:4}   "
+          f"rejected {counts['rejected']:4}   errors {counts['errors']:3}   "
+          f"{'consistent' if not problems else '; '.join(problems)}")
+    return problems
+
+
+if __name__ == "__main__":
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    listings = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    print(f"\n{attempts} purchase attempts, {threads} threads, {listings} listings, {BUYERS} buyers")
+    run("legacy (baseline)", legacy_purchase, attempts, threads, listings)
+    failures = run("conditional direct", _purchase_pet, attempts, threads, listings)
+    failures += run("conditional grouped", _purchase_pet, attempts, threads, listings, grouped=True)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,81 @@
+"""
+Callbacks for when the session's current work is committed, or is not.
+
+Housekeeping piggybacked on a caller's write (the hourly expiry of leaderboard
+buckets and sale rollups) must only count as done once that write's
+transaction commits. on_commit registers a pair of callbacks on a session:
+
+- committed() runs after the outermost transaction commits
+- failed() runs as soon as anything in the session rolls back (a savepoint
+  included, even one the work was not in) or the session ends without a commit
+
+Treating any rollback as failure errs on the side of doing the work again.
+PeriodicExpiry uses it for the hourly expiry runs those write paths share.
+"""
+
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_KEY = "commit_hooks"
+
+
+def on_commit(db: Session, committed, failed=None) -> None:
+    """Call committed() once db's transaction commits, else failed() (if given)."""
+    db.info.setdefault(_KEY, []).append((committed, failed))
+
+
+def _run(session, succeeded: bool) -> None:
+    hooks = session.info.pop(_KEY, None)
+    for committed, failed in hooks or ():
+        if succeeded:
+            committed()
+        elif failed is not None:
+            failed()
+
+
+class PeriodicExpiry:
+    """
+    expire(db, now) run from a write path at most once per `interval` real
+    seconds in this process. The interval only restarts once the transaction
+    carrying the expiry commits; if it rolls back, the next write runs it again.
+    """
+
+    def __init__(self, expire, interval: float):
+        self.expire = expire
+        self.interval = interval
+        self._next_run = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, db: Session, now=None) -> int:
+        """Rows expired (0 when not due). Does NOT commit."""
+        with self._lock:
+            if time.monotonic() < self._next_run:
+                return 0
+        removed = self.expire(db, now)
+        on_commit(db, self._schedule_next_run)
+        return removed
+
+    def _schedule_next_run(self) -> None:
+        with self._lock:
+            self._next_run = time.monotonic() + self.interval
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    # Released savepoints fire this too; only the outermost commit is durable
+    if not session.in_nested_transaction():
+        _run(session, True)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(session, previous_transaction):
+    _run(session, False)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(session, transaction):
+    # Closed or discarded without a commit
+    if transaction.parent is None:
+        _run(session, False)
@@ -1,15 +1,22 @@
 import sys
 import os
 from datetime import datetime
+from sqlalchemy import case, delete, or_, select, update
 
 # --- SMART IMPORTS ---
 try:
     from backend.db_connect import SessionLocal
-    from backend.models import Pet
+    from backend.models import Pet, PetGenetics, Offspring, PetMarketplace, PetSalesHistory, WorldClock
+    from backend.migrations import WORLD_CLOCK_ID, migrate_world_clock
+    from backend.market_stats import listing_key, update_listing
+    from backend.vitals import settle_pending_decay
 except ImportError:
     try:
         from db_connect import SessionLocal
-        from models import Pet
+        from models import Pet, PetGenetics, Offspring, PetMarketplace, PetSalesHistory, WorldClock
+        from migrations import WORLD_CLOCK_ID, migrate_world_clock
+        from market_stats import listing_key, update_listing
+        from vitals import settle_pending_decay
     except ImportError:
         print("CRITICAL ERROR: Could not import database connection in game_time.py")
 
@@ -17,44 +24,55 @@ except ImportError:
 OLD_AGE_THRESHOLD = 48  # 4 Years (Stats halved here)
 DEATH_AGE_THRESHOLD = 60 # 5 Years (Pet dies here)
 
+def _clamp(value, low, high):
+    """SQL expression equivalent of max(low, min(high, value))."""
+    return case((value < low, low), (value > high, high), else_=value)
+
+DEFAULT_CLOCK = {"ticks": 0, "year": 1, "month": 1, "day": 1, "hour": 8}
+
 def load_clock():
     """
     Returns a dictionary with ticks AND calendar time.
     """
     db = SessionLocal()
     try:
-        pet = db.query(Pet).first()
-        if pet:
-            # print(f"Loading Game Time: Year {pet.game_year}, Day {pet.game_day}")
-            # Safety check: If fields are None, default to 1
-            return {
-                "ticks": pet.tick_progress if pet.tick_progress else 0,
-                "year": pet.game_year if pet.game_year else 1,
-                "month": pet.game_month if pet.game_month else 1,
-                "day": pet.game_day if pet.game_day else 1,
-                "hour": pet.game_hour if pet.game_hour else 8
-            }
-        else:
-            return {"ticks": 0, "year": 1, "month": 1, "day": 1, "hour": 8}
+        # The table and row come from run_migrations; an older save's first load creates the row
+        clock = migrate_world_clock(db)
+        db.commit()
+        # Safety check: If fields are None, fall back to the defaults
+        return {
+            "ticks": clock.ticks or 0,
+            "year": clock.game_year or 1,
+            "month": clock.game_month or 1,
+            "day": clock.game_day or 1,
+            "hour": clock.game_hour or 8
+        }
     except Exception as e:
         print(f"Error loading clock: {e}")
-        return {"ticks": 0, "year": 1, "month": 1, "day": 1, "hour": 8}
+        return dict(DEFAULT_CLOCK)
     finally:
         db.close()
 
 def save_clock(current_ticks, game_time_dict):
     """
     Saves ticks AND the visual calendar date.
+    One UPDATE of the single world clock row, so it costs the same no matter how many pets exist.
     """
+    clock = WorldClock.__table__
+    save = update(clock).where(clock.c.id == WORLD_CLOCK_ID).values(
+        ticks=current_ticks,
+        game_year=game_time_dict['year'],
+        game_month=game_time_dict['month'],
+        game_day=game_time_dict['day'],
+        game_hour=game_time_dict['hour'],
+        updated_at=datetime.utcnow()
+    )
     db = SessionLocal()
     try:
-        db.query(Pet).update({
-            Pet.tick_progress: current_ticks,
-            Pet.game_year: game_time_dict['year'],
-            Pet.game_month: game_time_dict['month'],
-            Pet.game_day: game_time_dict['day'],
-            Pet.game_hour: game_time_dict['hour']
-        })
+        if db.execute(save).rowcount == 0:
+            # No row yet (the server has not migrated this save): create it, then save
+            migrate_world_clock(db)
+            db.execute(save)
         db.commit()
         print("Game time & Calendar saved successfully.")
     except Exception as e:
@@ -63,6 +81,89 @@ def save_clock(current_ticks, game_time_dict):
     finally:
         db.close()
 
+def apply_month_tick(db, now=None):
+    """
+    Runs one in-game month for every pet as a handful of set-based statements.
+    Settles lazy decay still pending (see vitals.py) so the month starts from
+    current vitals, then ages, starves, scores and clamps all pets in a single
+    UPDATE, then collects and deletes the pets that died. Does NOT commit.
+    Returns: A list of names of pets that died this month.
+    """
+    settle_pending_decay(db, now)
+    # The UPDATE below bypasses the session; reload any pet loaded before it
+    db.expire_all()
+
+    pets = Pet.__table__
+    new_age = pets.c.age_months + 1
+
+    # Hunger climbs by one (up to 3); a pet that ends the month at 3 starves.
+    new_hunger = case((pets.c.hunger < 3, pets.c.hunger + 1), else_=pets.c.hunger)
+    starving = new_hunger >= 3
+
+    # Growth/Score by the NEW age, same brackets as the old per-pet loop
+    points_gain = case(
+        (new_age >= 57, 10),
+        (new_age >= 48, 5),
+        (new_age >= 36, 3),
+        (new_age >= 12, 2),
+        (new_age >= 3, 1),
+        else_=0
+    )
+
+    # --- OLD AGE LOGIC (Halve Stats) --- exactly at month 48 so it only happens once
+    becomes_elder = new_age == OLD_AGE_THRESHOLD
+
+    db.execute(
+        update(pets).values(
+            age_months=new_age,
+            age_days=pets.c.age_days + 30,
+            speed=case((becomes_elder, pets.c.speed // 2), else_=pets.c.speed),
+            endurance=case((becomes_elder, pets.c.endurance // 2), else_=pets.c.endurance),
+            hunger=_clamp(new_hunger, 0, 3),
+            health=_clamp(case((starving, pets.c.health - 20), else_=pets.c.health), 0, 100),
+            happiness=_clamp(case((starving, pets.c.happiness - 20), else_=pets.c.happiness), 0, 100),
+            cleanliness=_clamp(pets.c.cleanliness, 0, 100),
+            points=pets.c.points + points_gain,
+        )
+    )
+
+    # The month rolled over, so the saved tick counter starts again
+    db.execute(update(WorldClock.__table__).values(ticks=0))
+
+    # --- DEATH LOGIC ---
+    # Health is clamped above, so "health <= 0" still catches every pet that hit zero.
+    is_dead = or_(pets.c.health <= 0, pets.c.age_months >= DEATH_AGE_THRESHOLD)
+    dead_pet_names = [
+        row.name for row in db.execute(
+            select(pets.c.name).where(is_dead).order_by(pets.c.id)
+        )
+    ]
+    if not dead_pet_names:
+        return dead_pet_names
+
+    # Detach rows that point at the dead pets, like the ORM did on db.delete(pet)
+    dead_ids = select(pets.c.id).where(is_dead)
+    pet_references = (
+        PetGenetics.__table__.c.pet_id,
+        Offspring.__table__.c.parent1_id,
+        Offspring.__table__.c.parent2_id,
+        Offspring.__table__.c.child_id,
+        PetMarketplace.__table__.c.pet_id,
+        PetSalesHistory.__table__.c.pet_id,
+    )
+    for column in pet_references:
+        db.execute(
+            update(column.table).where(column.in_(dead_ids)).values({column.name: None})
+        )
+    dead_listings = db.execute(
+        select(pets.c.for_sale, pets.c.rarity_tier, pets.c.asking_price, pets.c.market_value)
+        .where(is_dead, pets.c.for_sale == 1)
+    ).all()
+    db.execute(delete(pets).where(is_dead))
+    for listing in dead_listings:
+        update_listing(db, listing_key(listing), None)
+    return dead_pet_names
+
 def inc_month():
     """
     Called by main.py when ticks reach limit.
@@ -71,57 +172,12 @@ def inc_month():
     print("In-Game Month Passing...")
     
     db = SessionLocal()
-    dead_pet_names = []
     
     try:
-        pets = db.query(Pet).all()
-        
-        for pet in pets:
-            # 1. Reset Tick Progress
-            pet.tick_progress = 0
-
-            # 2. Age the pet
-            pet.age_months += 1
-            pet.age_days += 30 
-            
-            # --- OLD AGE LOGIC (Halve Stats) ---
-            # We trigger this EXACTLY at month 48 so it only happens once.
-            if pet.age_months == OLD_AGE_THRESHOLD:
-                print(f"{pet.name} has become an elder! Stats are halved.")
-                pet.speed = pet.speed // 2
-                pet.endurance = pet.endurance // 2
-                pet.strength = pet.strength // 2
-                pet.intelligence = pet.intelligence // 2
-            
-            # 3. Hunger Logic
-            if pet.hunger < 3:
-                pet.hunger += 1
-            
-            if pet.hunger >= 3:
-                pet.health -= 20
-                pet.happiness -= 20
-            
-            # 4. Growth/Score Logic
-            if pet.age_months >= 57: pet.points += 10
-            elif pet.age_months >= 48: pet.points += 5
-            elif pet.age_months >= 36: pet.points += 3
-            elif pet.age_months >= 12: pet.points += 2
-            elif pet.age_months >= 3: pet.points += 1
-
-            # --- DEATH LOGIC ---
-            if pet.health <= 0 or pet.age_months >= DEATH_AGE_THRESHOLD:
-                print(f"Pet {pet.name} has passed away.")
-                dead_pet_names.append(pet.name) # Add to list for frontend
-                db.delete(pet)
-                continue 
-
-            # 5. Safety Clamps
-            pet.health = max(0, min(100, pet.health))
-            pet.happiness = max(0, min(100, pet.happiness))
-            pet.cleanliness = max(0, min(100, pet.cleanliness))
-            pet.hunger = max(0, min(3, pet.hunger))
-
+        dead_pet_names = apply_month_tick(db)
         db.commit()
+        for name in dead_pet_names:
+            print(f"Pet {name} has passed away.")
         print("Month update complete. Database saved.")
         return dead_pet_names
 
@@ -130,4 +186,4 @@ def inc_month():
         db.rollback()
         return []
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
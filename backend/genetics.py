@@ -5,11 +5,101 @@ Implements Mendelian inheritance, Punnett squares, and stat derivation from gene
 
 import random
 import json
-from typing import List, Dict, Tuple
+import threading
+from types import MappingProxyType
+from typing import List, Dict, NamedTuple, Tuple
 from sqlalchemy.orm import Session
 from .import models, schemas
 from .pricing import RarityCalculator
 
+# =====================
+# GENE REGISTRY
+# =====================
+
+class GeneInfo(NamedTuple):
+    id: int
+    name: str
+    trait: str
+    description: str
+    default_allele_id: int
+
+class AlleleInfo(NamedTuple):
+    """Read-only copy of an Allele row (same attributes, so PunnettSquare.get_phenotype takes either)"""
+    id: int
+    gene_id: int
+    name: str
+    symbol: str
+    dominance_level: int
+    effect_value: int
+    description: str
+
+
+class GeneRegistry:
+    """
+    Immutable snapshot of the genes and alleles tables.
+    Genes and alleles only change through /genetics/genes/ and /genetics/alleles/
+    (and initialize_genetics_system), which call reload_gene_registry() after
+    their commit; everything else reads this instead of querying the tables.
+    """
+
+    def __init__(self, genes: List[GeneInfo], alleles: List[AlleleInfo]):
+        genes = sorted(genes, key=lambda gene: gene.id)
+        alleles = sorted(alleles, key=lambda allele: allele.id)
+        self.genes = MappingProxyType({gene.id: gene for gene in genes})
+        self.genes_by_name = MappingProxyType({gene.name: gene for gene in genes})
+        self.alleles = MappingProxyType({allele.id: allele for allele in alleles})
+        self.alleles_by_symbol = MappingProxyType({(allele.gene_id, allele.symbol): allele for allele in alleles})
+        self.alleles_of_gene = MappingProxyType({
+            gene.id: tuple(allele for allele in alleles if allele.gene_id == gene.id) for gene in genes
+        })
+
+    @classmethod
+    def load(cls, db: Session) -> "GeneRegistry":
+        genes = [
+            GeneInfo(g.id, g.name, g.trait, g.description, g.default_allele_id)
+            for g in db.query(models.Gene).all()
+        ]
+        alleles = [
+            AlleleInfo(a.id, a.gene_id, a.name, a.symbol, a.dominance_level, a.effect_value, a.description)
+            for a in db.query(models.Allele).all()
+        ]
+        return cls(genes, alleles)
+
+    def allele(self, gene_id: int, symbol: str) -> AlleleInfo:
+        """Allele of a gene by symbol, or None"""
+        return self.alleles_by_symbol.get((gene_id, symbol))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def gene_registry(db: Session) -> GeneRegistry:
+    """The current registry, loaded with `db` on first use after startup."""
+    global _registry
+    registry = _registry
+    if registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = GeneRegistry.load(db)
+            registry = _registry
+    return registry
+
+
+def reload_gene_registry(db: Session) -> GeneRegistry:
+    """
+    Call right after committing new genes or alleles, with the session that
+    committed them. Loading here rather than on a reader's next call means the
+    snapshot cached is one taken after the commit, never an older read
+    transaction of whichever request happened to ask first; the lock makes the
+    last reload the one that sees every commit.
+    """
+    global _registry
+    with _registry_lock:
+        _registry = GeneRegistry.load(db)
+        return _registry
+
+
 # =====================
 # PUNNETT SQUARE LOGIC
 # =====================
@@ -69,8 +159,8 @@ class PunnettSquare:
         Handles incomplete dominance for coat color gene (B, O, W).
 
         Args:
-            allele1: First allele (SQLAlchemy model)
-            allele2: Second allele (SQLAlchemy model)
+            allele1: First allele (SQLAlchemy model or registry AlleleInfo)
+            allele2: Second allele (SQLAlchemy model or registry AlleleInfo)
             gene_name: Name of the gene (used for coat color special handling)
 
         Returns:
@@ -140,20 +230,26 @@ class GeneticCode:
     """Manages encoding and decoding of genetic information"""
 
     @staticmethod
-    def encode(pet_genetics: List[models.PetGenetics]) -> str:
+    def encode(pet_genetics: List[models.PetGenetics], registry: GeneRegistry = None) -> str:
         """
         Encode pet's genetic information into a compact string.
         Format: GENE1:allele1-allele2;GENE2:allele1-allele2;...
 
         Args:
             pet_genetics: List of PetGenetics records
+            registry: Gene registry to resolve ids with (otherwise the relationships are loaded)
 
         Returns:
             Encoded genetic code string
         """
         genetic_codes = []
         for pg in pet_genetics:
-            code = f"{pg.gene.name}:{pg.allele1.symbol}-{pg.allele2.symbol}"
+            if registry is not None:
+                gene = registry.genes[pg.gene_id]
+                allele1, allele2 = registry.alleles[pg.allele1_id], registry.alleles[pg.allele2_id]
+            else:
+                gene, allele1, allele2 = pg.gene, pg.allele1, pg.allele2
+            code = f"{gene.name}:{allele1.symbol}-{allele2.symbol}"
             genetic_codes.append(code)
 
         return ";".join(genetic_codes)
@@ -190,14 +286,16 @@ class GeneticCode:
         Returns:
             Encoded genetic code string
         """
-        genes = db.query(models.Gene).limit(num_genes).all()
+        registry = gene_registry(db)
+        genes = list(registry.genes.values())[:num_genes]
         genetic_codes = []
 
         for gene in genes:
-            if gene.alleles:
+            alleles = registry.alleles_of_gene[gene.id]
+            if alleles:
                 # Pick two random alleles for diploid genotype
-                allele1 = random.choice(gene.alleles)
-                allele2 = random.choice(gene.alleles)
+                allele1 = random.choice(alleles)
+                allele2 = random.choice(alleles)
                 code = f"{gene.name}:{allele1.symbol}-{allele2.symbol}"
                 genetic_codes.append(code)
 
@@ -242,6 +340,8 @@ class BreedingEngine:
         if not parent1_genetics or not parent2_genetics:
             raise ValueError("One or both parents lack genetic information")
 
+        registry = gene_registry(db)
+
         # Calculate Punnett squares for each gene
         punnett_squares = []
         offspring_alleles = {}
@@ -251,9 +351,9 @@ class BreedingEngine:
             if p1_gene.gene_id != p2_gene.gene_id:
                 continue
 
-            gene = p1_gene.gene
-            p1_alleles = (p1_gene.allele1.symbol, p1_gene.allele2.symbol)
-            p2_alleles = (p2_gene.allele1.symbol, p2_gene.allele2.symbol)
+            gene = registry.genes[p1_gene.gene_id]
+            p1_alleles = (registry.alleles[p1_gene.allele1_id].symbol, registry.alleles[p1_gene.allele2_id].symbol)
+            p2_alleles = (registry.alleles[p2_gene.allele1_id].symbol, registry.alleles[p2_gene.allele2_id].symbol)
 
             # Calculate Punnett square
             ps_result = PunnettSquare.calculate(p1_alleles, p2_alleles)
@@ -263,15 +363,8 @@ class BreedingEngine:
 
             # Find corresponding alleles for offspring
             allele_symbols = list(offspring_genotype)
-            allele1_obj = db.query(models.Allele).filter(
-                models.Allele.gene_id == gene.id,
-                models.Allele.symbol == allele_symbols[0]
-            ).first()
-
-            allele2_obj = db.query(models.Allele).filter(
-                models.Allele.gene_id == gene.id,
-                models.Allele.symbol == allele_symbols[1]
-            ).first()
+            allele1_obj = registry.allele(gene.id, allele_symbols[0])
+            allele2_obj = registry.allele(gene.id, allele_symbols[1])
 
             if allele1_obj and allele2_obj:
                 offspring_alleles[gene.id] = (allele1_obj, allele2_obj)
@@ -304,6 +397,7 @@ class BreedingEngine:
         db.flush()  # Get offspring ID
 
         # Create genetics for offspring
+        offspring_genetics = []
         for gene_id, (allele1, allele2) in offspring_alleles.items():
             pet_genetics = models.PetGenetics(
                 pet_id=offspring.id,
@@ -312,15 +406,13 @@ class BreedingEngine:
                 allele2_id=allele2.id
             )
             db.add(pet_genetics)
+            offspring_genetics.append(pet_genetics)
 
         # Set offspring genetic code
-        offspring_genetics = db.query(models.PetGenetics).filter(
-            models.PetGenetics.pet_id == offspring.id
-        ).all()
-        offspring.genetic_code = GeneticCode.encode(offspring_genetics)
+        offspring.genetic_code = GeneticCode.encode(offspring_genetics, registry)
 
         # Calculate stats based on genetics
-        BreedingEngine.update_stats_from_genetics(db, offspring)
+        BreedingEngine.update_stats_from_genetics(db, offspring, offspring_genetics)
 
         # Calculate rarity score and market value
         valuation = RarityCalculator.calculate_and_store_valuation(offspring, db)
@@ -342,7 +434,8 @@ class BreedingEngine:
         return offspring, punnett_squares, inheritance_summary
 
     @staticmethod
-    def update_stats_from_genetics(db: Session, pet: models.Pet) -> None:
+    def update_stats_from_genetics(db: Session, pet: models.Pet,
+                                   pet_genetics: List[models.PetGenetics] = None) -> None:
         """
         Calculate and update pet stats based on genetic code.
         Stats influenced by allele effect values.
@@ -351,14 +444,18 @@ class BreedingEngine:
         Args:
             db: Database session
             pet: Pet to update stats for
+            pet_genetics: The pet's PetGenetics rows, if the caller already has them
         """
-        pet_genetics = db.query(models.PetGenetics).filter(
-            models.PetGenetics.pet_id == pet.id
-        ).all()
+        if pet_genetics is None:
+            pet_genetics = db.query(models.PetGenetics).filter(
+                models.PetGenetics.pet_id == pet.id
+            ).all()
 
         if not pet_genetics:
             return
 
+        registry = gene_registry(db)
+
         # Calculate stat modifiers from genetics
         stat_modifiers = {
             "speed": 0,
@@ -372,10 +469,13 @@ class BreedingEngine:
         }
 
         for pg in pet_genetics:
-            gene_trait = pg.gene.name.lower()  # Use gene name for mapping
+            gene = registry.genes[pg.gene_id]
+            gene_trait = gene.name.lower()  # Use gene name for mapping
 
             # Determine phenotype and its effect
-            phenotype_info = PunnettSquare.get_phenotype(pg.allele1, pg.allele2, gene_name=pg.gene.name)
+            phenotype_info = PunnettSquare.get_phenotype(
+                registry.alleles[pg.allele1_id], registry.alleles[pg.allele2_id], gene_name=gene.name
+            )
             effect_value = phenotype_info["effect_value"]
 
             # Apply to relevant stats
@@ -488,3 +588,4 @@ def initialize_genetics_system(db: Session) -> None:
         db.add(gene)
 
     db.commit()
+    reload_gene_registry(db)
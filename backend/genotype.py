@@ -0,0 +1,173 @@
+"""
+Bit-packed genotypes.
+
+Pet.genotype_packed holds the four built-in loci of a pet's genetic code in one
+indexed integer: 4 bits per locus, 2 bits per allele, most significant locus
+first.
+
+    bits 15-12  coat_color   (B=1, O=2, W=3)
+    bits 11-8   hair_length  (H=1, h=2)
+    bits  7-4   speed        (F=1, f=2)
+    bits  3-0   endurance    (E=1, e=2)
+
+Allele codes follow dominance. Code 0 means the locus is absent. The two
+alleles of a locus are stored sorted, so B-O and O-B pack the same. The
+genetic_code string stays the stored, ordered view. Genes added at runtime
+through /genetics/genes/ are not packed.
+
+The leading loci are the high bits, so fixing coat colour (or coat colour and
+hair length, and so on) selects a range of packed values. genotype_filter turns
+such queries into index range scans. allele_codes only shifts and masks, so it
+works the same on an int and on a numpy integer array.
+"""
+
+from sqlalchemy import and_
+
+LOCI = (
+    ("coat_color", ("B", "O", "W")),
+    ("hair_length", ("H", "h")),
+    ("speed", ("F", "f")),
+    ("endurance", ("E", "e")),
+)
+BITS_PER_ALLELE = 2
+BITS_PER_LOCUS = 2 * BITS_PER_ALLELE
+TOTAL_BITS = BITS_PER_LOCUS * len(LOCI)
+ALLELE_MASK = (1 << BITS_PER_ALLELE) - 1
+LOCUS_MASK = (1 << BITS_PER_LOCUS) - 1
+
+_SHIFTS = {gene: (len(LOCI) - 1 - i) * BITS_PER_LOCUS for i, (gene, _) in enumerate(LOCI)}
+_CODES = {gene: {symbol: code for code, symbol in enumerate(symbols, 1)} for gene, symbols in LOCI}
+_SYMBOLS = {gene: (None,) + symbols for gene, symbols in LOCI}
+
+
+def parse(genetic_code: str) -> dict:
+    """{gene: "BO"} for every locus of a genetic code string ("coat_color:B-O;...")."""
+    genes = {}
+    for pair in (genetic_code or "").split(";"):
+        if ":" in pair:
+            gene, alleles = pair.split(":", 1)
+            genes[gene.strip()] = alleles.strip().replace("-", "")
+    return genes
+
+
+def locus_bits(gene: str, alleles) -> int:
+    """
+    Unshifted 4-bit code of one locus, from "BO", "B-O" or ("B", "O").
+    Raises ValueError for genes that are not packed and unknown alleles.
+    """
+    codes = _CODES.get(gene)
+    if codes is None:
+        raise ValueError(f"Gene {gene} is not part of the packed genotype")
+    symbols = tuple(alleles.replace("-", "").strip()) if isinstance(alleles, str) else tuple(alleles)
+    if len(symbols) != 2:
+        raise ValueError(f"Expected two {gene} alleles, got {alleles!r}")
+    try:
+        first, second = sorted(codes[symbol] for symbol in symbols)
+    except KeyError as e:
+        raise ValueError(f"Unknown {gene} allele {e}")
+    return (first << BITS_PER_ALLELE) | second
+
+
+# (gene, "BO") -> shifted bits of that locus, for every allele pair as parse() returns it
+_LOCUS_VALUES = {
+    (gene, first + second): locus_bits(gene, (first, second)) << _SHIFTS[gene]
+    for gene, symbols in LOCI for first in symbols for second in symbols
+}
+
+
+def packed_locus(gene: str, alleles: str):
+    """Shifted bits of one locus from parse() output ("BO"), or None when it cannot be packed."""
+    return _LOCUS_VALUES.get((gene, alleles))
+
+
+def pack(genotypes: dict) -> int:
+    """Packed value of {gene: alleles}. Raises ValueError like locus_bits."""
+    packed = 0
+    for gene, alleles in genotypes.items():
+        packed |= locus_bits(gene, alleles) << _SHIFTS.get(gene, 0)
+    return packed
+
+
+def pack_genetic_code(genetic_code: str):
+    """Packed genotype of a genetic code string, or None when it has no packed locus."""
+    packed, found = 0, False
+    for gene, alleles in parse(genetic_code).items():
+        bits = packed_locus(gene, alleles)
+        if bits is None:
+            continue  # runtime genes and malformed loci stay in the string only
+        packed |= bits
+        found = True
+    return packed if found else None
+
+
+def allele_codes(packed, gene: str) -> tuple:
+    """(code1, code2) of one locus, 0 when absent. Works element-wise on numpy integer arrays."""
+    locus = (packed >> _SHIFTS[gene]) & LOCUS_MASK
+    return locus >> BITS_PER_ALLELE, locus & ALLELE_MASK
+
+
+def locus(packed, gene: str):
+    """Unshifted 4-bit code of one locus, 0 when absent (also element-wise on numpy arrays)."""
+    return (packed >> _SHIFTS[gene]) & LOCUS_MASK
+
+
+def place_locus(gene: str, bits):
+    """Unshifted locus bits moved to their place in a packed genotype (the inverse of locus)."""
+    return bits << _SHIFTS[gene]
+
+
+def alleles(packed, gene: str):
+    """Allele symbols of one locus, e.g. ("B", "O"), or None when absent."""
+    if packed is None:
+        return None
+    first, second = allele_codes(int(packed), gene)
+    if not first:
+        return None
+    return _SYMBOLS[gene][first], _SYMBOLS[gene][second]
+
+
+def unpack(packed) -> dict:
+    """{gene: (allele1, allele2)} of the loci present, like GeneticCode.decode."""
+    genes = {}
+    for gene, _ in LOCI:
+        pair = alleles(packed, gene)
+        if pair:
+            genes[gene] = pair
+    return genes
+
+
+def to_genetic_code(packed) -> str:
+    """Canonical genetic code string of a packed genotype (alleles in dominance order)."""
+    return ";".join(f"{gene}:{first}-{second}" for gene, (first, second) in unpack(packed).items())
+
+
+def genotype_filter(column, genotypes: dict):
+    """
+    SQL condition matching the given loci exactly ({gene: alleles}). The run of
+    given loci from the top (coat_color first) becomes a BETWEEN on the column,
+    which is an index range. Any later loci are checked with a bit mask.
+    """
+    unknown = set(genotypes) - set(_SHIFTS)
+    if unknown:
+        raise ValueError(f"Gene {sorted(unknown)[0]} is not part of the packed genotype")
+
+    low, prefix_bits, in_prefix = 0, 0, True
+    mask, value = 0, 0
+    for gene, _ in LOCI:
+        if gene not in genotypes:
+            in_prefix = False
+            continue
+        bits = locus_bits(gene, genotypes[gene]) << _SHIFTS[gene]
+        if in_prefix:
+            low |= bits
+            prefix_bits += BITS_PER_LOCUS
+        else:
+            mask |= LOCUS_MASK << _SHIFTS[gene]
+            value |= bits
+
+    conditions = []
+    if prefix_bits:
+        conditions.append(column.between(low, low | ((1 << (TOTAL_BITS - prefix_bits)) - 1)))
+    if mask:
+        conditions.append(column.op("&")(mask) == value)
+    return and_(*conditions)
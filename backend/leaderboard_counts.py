@@ -0,0 +1,164 @@
+"""
+Overall leaderboard rank counters.
+
+LeaderboardScoreCount is a radix tree of player counts over the score line:
+level 0 counts the players on each exact score, and every level above groups
+SCORE_FANOUT buckets of the one below (bucket = score // SCORE_FANOUT**level).
+LeaderboardTotals (one row, id == 1) counts all players. Every score write
+moves its player between buckets in the same transaction - one row on each
+level where the bucket changed - so a rank is read as
+
+    1 + on each level, the players in the buckets above the score's own that
+        share its parent bucket (at most SCORE_FANOUT - 1 rows)
+      + on the top level, the players in every bucket above
+
+in one statement over the (level, bucket) key. That is O(SCORE_LEVELS *
+SCORE_FANOUT) rows however bunched the scores are, instead of counting every
+higher score, and the player total is one row.
+rebuild_leaderboard_counts recomputes everything from the leaderboards table;
+startup and the tick scheduler run it as a consistency check.
+
+- GG_LEADERBOARD_FANOUT  buckets per parent bucket  (16)
+- GG_LEADERBOARD_LEVELS  levels; a top bucket spans FANOUT**(LEVELS - 1) points  (6)
+"""
+
+import datetime
+import os
+from sqlalchemy import and_, case, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+from .import models
+from .upserts import upsert
+
+SCORE_FANOUT = int(os.environ.get("GG_LEADERBOARD_FANOUT", "16"))
+SCORE_LEVELS = int(os.environ.get("GG_LEADERBOARD_LEVELS", "6"))
+TOTALS_ID = 1
+
+
+def score_buckets(score) -> list:
+    """A score's bucket on every level, level 0 first (floor division, so negative scores bucket downwards)."""
+    score = score or 0
+    return [score // SCORE_FANOUT ** level for level in range(SCORE_LEVELS)]
+
+
+def _bucket_expression(score, width: int):
+    """score // width as SQL; integer division truncates towards zero, so floor negatives by hand."""
+    score = func.coalesce(score, 0)
+    return case(
+        (score >= 0, score // width),
+        else_=-((-score - 1) // width) - 1,
+    )
+
+
+def _shift(db: Session, level: int, bucket: int, players: int) -> None:
+    counts = models.LeaderboardScoreCount
+    upsert(
+        db, counts,
+        {"level": level, "bucket": bucket, "players": players},
+        key=["level", "bucket"],
+        on_conflict=lambda excluded: {"players": counts.players + excluded.players},
+    )
+
+
+def _shift_total(db: Session, players: int) -> None:
+    totals = models.LeaderboardTotals
+    upsert(
+        db, totals,
+        {"id": TOTALS_ID, "players": players, "updated_at": datetime.datetime.utcnow()},
+        key=["id"],
+        on_conflict=lambda excluded: {"players": totals.players + excluded.players,
+                                      "updated_at": excluded.updated_at},
+    )
+
+
+def move_score(db: Session, before, after) -> None:
+    """
+    Move a player's count from one score to another (either may be None for
+    "not on the leaderboard"). Does NOT commit.
+    """
+    old = None if before is None else score_buckets(before)
+    new = None if after is None else score_buckets(after)
+    for level in range(SCORE_LEVELS):
+        old_bucket = None if old is None else old[level]
+        new_bucket = None if new is None else new[level]
+        if old_bucket == new_bucket:
+            break  # same bucket here, so the same parent on every level above
+        if old_bucket is not None:
+            _shift(db, level, old_bucket, -1)
+        if new_bucket is not None:
+            _shift(db, level, new_bucket, 1)
+    if (before is None) != (after is None):
+        _shift_total(db, 1 if before is None else -1)
+
+
+def players_ahead_query(score):
+    """SELECT of the number of players scoring strictly more than `score`."""
+    counts = models.LeaderboardScoreCount
+    above = []
+    for level, bucket in enumerate(score_buckets(score)):
+        siblings = [counts.level == level, counts.bucket > bucket]
+        if level < SCORE_LEVELS - 1:
+            siblings.append(counts.bucket < (bucket // SCORE_FANOUT + 1) * SCORE_FANOUT)
+        above.append(and_(*siblings))
+    return select(func.sum(counts.players)).where(or_(*above))
+
+
+def players_ahead(db: Session, score) -> int:
+    """How many players score strictly more than `score`."""
+    return db.execute(players_ahead_query(score)).scalar() or 0
+
+
+def players_on_score(db: Session, score) -> int:
+    """How many players have exactly `score`."""
+    counts = models.LeaderboardScoreCount
+    return db.execute(
+        select(counts.players).where(counts.level == 0, counts.bucket == (score or 0))
+    ).scalar() or 0
+
+
+def total_players(db: Session) -> int:
+    return db.execute(
+        select(models.LeaderboardTotals.players).where(models.LeaderboardTotals.id == TOTALS_ID)
+    ).scalar() or 0
+
+
+def rebuild_leaderboard_counts(db: Session) -> bool:
+    """
+    Recompute the bucket and total counters from the leaderboards table and
+    overwrite any that drifted (buckets left empty are dropped). Returns True
+    when something was repaired. Does NOT commit.
+    """
+    counts, totals, board = models.LeaderboardScoreCount, models.LeaderboardTotals, models.Leaderboard
+    fresh = {}
+    for level in range(SCORE_LEVELS):
+        bucket = _bucket_expression(board.score, SCORE_FANOUT ** level)
+        for bucket_id, players in db.execute(select(bucket, func.count()).group_by(bucket)):
+            fresh[level, bucket_id] = players
+    existing = {(level, bucket): players for level, bucket, players in
+                db.execute(select(counts.level, counts.bucket, counts.players))}
+
+    repaired = False
+    for level, bucket in set(fresh) | set(existing):
+        players = fresh.get((level, bucket), 0)
+        where = (counts.level == level, counts.bucket == bucket)
+        if players == 0:
+            if existing[level, bucket]:
+                repaired = True
+            db.execute(delete(counts).where(*where))
+        elif (level, bucket) not in existing:
+            db.add(counts(level=level, bucket=bucket, players=players))
+            repaired = True
+        elif existing[level, bucket] != players:
+            db.execute(update(counts).where(*where).values(players=players))
+            repaired = True
+
+    players = sum(players for (level, _), players in fresh.items() if level == 0)
+    row = db.get(totals, TOTALS_ID)
+    if row is None:
+        db.add(totals(id=TOTALS_ID, players=players, updated_at=datetime.datetime.utcnow()))
+        repaired = True
+    elif row.players != players:
+        row.players = players
+        row.updated_at = datetime.datetime.utcnow()
+        repaired = True
+    db.flush()
+    return repaired
@@ -2,20 +2,57 @@ from fastapi import FastAPI
 from .routes import users, pets, inventory, transactions, mini_games, leaderboard, genetics, marketplace
 from .db_connect import Base, engine, SessionLocal
 from .genetics import initialize_genetics_system
+from .migrations import run_migrations
+from .leaderboard_counts import rebuild_leaderboard_counts
+from .market_stats import rebuild_market_stats
+from .order_book import resume_order_book, stop_order_book
+from .revaluation import resume_revaluation, stop_revaluation
+from .price_history import expire_rollups_if_due
+from .score_buckets import expire_buckets_if_due
+from .scheduler import SCHEDULER_CONFIG, TickScheduler
+from .write_queue import stop_write_coordinator
 
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Guinea Games API")
+scheduler = TickScheduler(SessionLocal)
 
-# Initialize genetics system on startup
+# Upgrade older saves and initialize genetics system on startup
 @app.on_event("startup")
 def startup():
+    run_migrations(engine, SessionLocal)
+
     db = SessionLocal()
     try:
         initialize_genetics_system(db)
+        # Old leaderboard windows and sale rollups go now, then hourly as scores and sales come in
+        expire_buckets_if_due(db)
+        expire_rollups_if_due(db)
+        # Fills the market stats counters on first run and repairs any drift
+        repaired = rebuild_market_stats(db)
+        if repaired:
+            print(f"Market stats rebuilt for tiers: {', '.join(repaired)}")
+        # Same for the leaderboard's rank counters
+        if rebuild_leaderboard_counts(db):
+            print("Leaderboard rank counters rebuilt")
+        db.commit()
+        # Auctions and standing bids left open by the previous run keep matching
+        resume_order_book(db)
+        # So does a batch revaluation that was interrupted
+        resume_revaluation(db)
     finally:
         db.close()
 
+    if SCHEDULER_CONFIG.enabled:
+        scheduler.start()
+
+@app.on_event("shutdown")
+def shutdown():
+    scheduler.stop()
+    stop_order_book()
+    stop_revaluation()
+    stop_write_coordinator()
+
 app.include_router(users.router)
 app.include_router(pets.router)
 app.include_router(inventory.router)
@@ -27,4 +64,9 @@ app.include_router(marketplace.router)
 
 @app.get("/")
 def root():
-    return {"message": "Welcome to Guinea Games Backend"}
\ No newline at end of file
+    return {"message": "Welcome to Guinea Games Backend"}
+
+@app.get("/scheduler/metrics")
+def scheduler_metrics():
+    """Counters from the server-side tick scheduler"""
+    return {"enabled": SCHEDULER_CONFIG.enabled, **scheduler.metrics}
\ No newline at end of file
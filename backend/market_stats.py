@@ -0,0 +1,161 @@
+"""
+Per-tier marketplace statistics.
+
+MarketTierStats keeps count, sum, min and max of asking_price and market_value
+over the pets listed in each rarity tier. Every change to the set of listed
+pets (list, re-price, unlist, purchase, revaluation, death) adjusts the
+counters in the same transaction, so /marketplace/market-stats reads one row
+per tier instead of every listing.
+
+Counts and sums move by the listing's own numbers. When a removed listing held
+a tier's min or max, that extreme is re-read from the (for_sale, rarity_tier,
+column, id) listing indexes, which is a seek. rebuild_market_stats recomputes
+everything from the pets table; startup and the tick scheduler run it as a
+consistency check.
+"""
+
+import datetime
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.orm import Session
+from .import models
+from .upserts import upsert
+
+TIER_ORDER = ("Common", "Uncommon", "Rare", "Legendary")
+DEFAULT_TIER = "Common"  # pets without a tier count as Common, as the old stats did
+
+COUNTER_COLUMNS = ("listed_count", "price_sum", "price_min", "price_max", "value_sum", "value_min", "value_max")
+
+
+def listing_key(pet):
+    """(tier, asking_price, market_value) of a listed pet (or pets row), or None when it is not for sale."""
+    if pet.for_sale != 1:
+        return None
+    return (pet.rarity_tier or DEFAULT_TIER, pet.asking_price or 0, pet.market_value or 0)
+
+
+def update_listing(db: Session, before, after) -> None:
+    """
+    Move the counters from one listing_key to another (either may be None for
+    "not listed"). Call after the pet itself has been changed. Does NOT commit.
+    """
+    if before == after:
+        return
+    if before is not None:
+        _remove(db, *before)
+    if after is not None:
+        _add(db, *after)
+
+
+def _lower(column, value):
+    return case((or_(column.is_(None), value < column), value), else_=column)
+
+
+def _higher(column, value):
+    return case((or_(column.is_(None), value > column), value), else_=column)
+
+
+def _add(db: Session, tier: str, price: int, value: int) -> None:
+    stats = models.MarketTierStats
+    upsert(
+        db, stats,
+        {"rarity_tier": tier, "listed_count": 1,
+         "price_sum": price, "price_min": price, "price_max": price,
+         "value_sum": value, "value_min": value, "value_max": value,
+         "updated_at": datetime.datetime.utcnow()},
+        key=["rarity_tier"],
+        on_conflict=lambda excluded: {
+            "listed_count": stats.listed_count + 1,
+            "price_sum": stats.price_sum + excluded.price_sum,
+            "price_min": _lower(stats.price_min, excluded.price_min),
+            "price_max": _higher(stats.price_max, excluded.price_max),
+            "value_sum": stats.value_sum + excluded.value_sum,
+            "value_min": _lower(stats.value_min, excluded.value_min),
+            "value_max": _higher(stats.value_max, excluded.value_max),
+            "updated_at": excluded.updated_at,
+        },
+    )
+
+
+def _remove(db: Session, tier: str, price: int, value: int) -> None:
+    stats = models.MarketTierStats
+    row = db.execute(
+        update(stats).where(stats.rarity_tier == tier)
+        .values(
+            listed_count=stats.listed_count - 1,
+            price_sum=stats.price_sum - price,
+            value_sum=stats.value_sum - value,
+            updated_at=datetime.datetime.utcnow(),
+        )
+        .returning(stats.price_min, stats.price_max, stats.value_min, stats.value_max)
+    ).first()
+    if row is None:
+        return  # counters not built yet; rebuild_market_stats fills them in
+    if price in (row.price_min, row.price_max) or value in (row.value_min, row.value_max):
+        _refresh_extremes(db, tier)
+
+
+def _refresh_extremes(db: Session, tier: str) -> None:
+    """Re-read min/max of a tier from the listed pets (NULL once the tier is empty)."""
+    db.flush()
+    pets, stats = models.Pet, models.MarketTierStats
+    # Saves with NULL tiers are normalised to Common by migrations.default_rarity_tier
+    listed = (pets.for_sale == 1, pets.rarity_tier == tier)
+
+    def extreme(aggregate, column):
+        return select(aggregate(column)).where(*listed).scalar_subquery()
+
+    db.execute(
+        update(stats).where(stats.rarity_tier == tier).values(
+            price_min=extreme(func.min, pets.asking_price),
+            price_max=extreme(func.max, pets.asking_price),
+            value_min=extreme(func.min, pets.market_value),
+            value_max=extreme(func.max, pets.market_value),
+        )
+    )
+
+
+def tier_stats(db: Session) -> list:
+    """Counter rows of the tiers that currently have listings, Common first."""
+    stats = models.MarketTierStats
+    rows = db.scalars(select(stats).where(stats.listed_count > 0)).all()
+    order = {tier: i for i, tier in enumerate(TIER_ORDER)}
+    return sorted(rows, key=lambda row: (order.get(row.rarity_tier, len(order)), row.rarity_tier))
+
+
+def rebuild_market_stats(db: Session) -> list:
+    """
+    Recompute every tier's counters from the listed pets and overwrite the
+    ones that drifted. Returns the tiers that were repaired. Does NOT commit.
+    """
+    pets, stats = models.Pet, models.MarketTierStats
+    tier = func.coalesce(pets.rarity_tier, DEFAULT_TIER)
+    price = func.coalesce(pets.asking_price, 0)
+    value = func.coalesce(pets.market_value, 0)
+    fresh = {
+        row.tier: dict(zip(COUNTER_COLUMNS, row[1:]))
+        for row in db.execute(
+            select(
+                tier.label("tier"), func.count(),
+                func.sum(price), func.min(price), func.max(price),
+                func.sum(value), func.min(value), func.max(value),
+            ).where(pets.for_sale == 1).group_by(tier)
+        )
+    }
+    empty = dict(zip(COUNTER_COLUMNS, (0, 0, None, None, 0, None, None)))
+
+    repaired = []
+    existing = {row.rarity_tier: row for row in db.scalars(select(stats))}
+    for name in sorted(set(fresh) | set(existing)):
+        counters = fresh.get(name, empty)
+        row = existing.get(name)
+        if row is None:
+            row = stats(rarity_tier=name)
+            db.add(row)
+        elif all(getattr(row, column) == counters[column] for column in COUNTER_COLUMNS):
+            continue
+        for column in COUNTER_COLUMNS:
+            setattr(row, column, counters[column])
+        row.updated_at = datetime.datetime.utcnow()
+        repaired.append(name)
+    db.flush()
+    return repaired
@@ -0,0 +1,306 @@
+"""
+Upgrade steps for existing save files.
+Base.metadata.create_all only creates missing tables, so anything that has to
+touch data already sitting in an older GuineaGames.db lives here.
+Every step is idempotent and runs on startup.
+"""
+
+import datetime
+from sqlalchemy import DateTime, String, bindparam, cast, delete, func, inspect, literal, or_, select, text, update
+
+try:
+    from backend.db_connect import Base
+    from backend.genotype import pack_genetic_code
+    from backend.models import Inventory, Leaderboard, Pet, PetGenetics, PetMarketplace, PetSalesHistory, SaleRollup, User, WorldClock
+    from backend.price_history import ROLLUPS_KEPT, hour_start, sale_key
+    from backend.pricing import RarityCalculator
+except ImportError:
+    from db_connect import Base
+    from genotype import pack_genetic_code
+    from models import Inventory, Leaderboard, Pet, PetGenetics, PetMarketplace, PetSalesHistory, SaleRollup, User, WorldClock
+    from price_history import ROLLUPS_KEPT, hour_start, sale_key
+    from pricing import RarityCalculator
+
+WORLD_CLOCK_ID = 1
+
+# Indexes older saves created that no query uses any more; every pet write
+# would otherwise keep maintaining them
+UNUSED_INDEXES = ("ix_pets_breedable_at",)
+# Tables replaced by others (leaderboard_score_counts took over the fixed-width bands)
+UNUSED_TABLES = ("leaderboard_score_bands",)
+
+
+def migrate_world_clock(db) -> WorldClock:
+    """
+    Make sure the world clock row exists.
+    Older saves stamped the clock onto every pet row, so the first pet's
+    copy (if any) becomes the starting value. Does NOT commit.
+    """
+    clock = db.get(WorldClock, WORLD_CLOCK_ID)
+    if clock:
+        return clock
+
+    clock = WorldClock(id=WORLD_CLOCK_ID, ticks=0, game_year=1, game_month=1, game_day=1, game_hour=8)
+    legacy = db.query(
+        Pet.tick_progress, Pet.game_year, Pet.game_month, Pet.game_day, Pet.game_hour
+    ).order_by(Pet.id).first()
+    if legacy:
+        clock.ticks = legacy.tick_progress or 0
+        clock.game_year = legacy.game_year or 1
+        clock.game_month = legacy.game_month or 1
+        clock.game_day = legacy.game_day or 1
+        clock.game_hour = legacy.game_hour or 8
+    clock.updated_at = datetime.datetime.utcnow()
+    db.add(clock)
+    db.flush()
+    return clock
+
+
+def add_missing_columns(engine) -> None:
+    """
+    ALTER TABLE ... ADD COLUMN for every model column an older save lacks.
+    Scalar Python defaults become SQL defaults so existing rows get them too.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    value = literal(column.default.arg).compile(
+                        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+                    )
+                    ddl += f" DEFAULT {value}"
+                conn.execute(text(ddl))
+
+
+def create_missing_indexes(engine) -> None:
+    """Create every index the models declare that an older save is missing."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def drop_unused_indexes(engine) -> None:
+    """Drop the indexes in UNUSED_INDEXES from saves that still have them."""
+    with engine.begin() as conn:
+        for name in UNUSED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def drop_unused_tables(engine) -> None:
+    """Drop the tables in UNUSED_TABLES from saves that still have them."""
+    with engine.begin() as conn:
+        for name in UNUSED_TABLES:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+
+
+def dedupe_upsert_keys(db) -> None:
+    """
+    Merge rows that would break the unique keys the models declare.
+    Duplicate inventory stacks are summed into the oldest one; duplicate
+    leaderboard entries and pet genes keep the oldest (the one the API always read).
+    """
+    duplicate_stacks = db.execute(
+        select(Inventory.user_id, Inventory.item_name, func.min(Inventory.id), func.sum(Inventory.quantity))
+        .group_by(Inventory.user_id, Inventory.item_name)
+        .having(func.count() > 1)
+    ).all()
+    for user_id, item_name, keep_id, quantity in duplicate_stacks:
+        db.execute(update(Inventory).where(Inventory.id == keep_id).values(quantity=quantity))
+        db.execute(delete(Inventory).where(
+            Inventory.user_id == user_id, Inventory.item_name == item_name, Inventory.id != keep_id
+        ))
+
+    oldest_entries = select(func.min(Leaderboard.id)).group_by(Leaderboard.user_id)
+    db.execute(delete(Leaderboard).where(
+        Leaderboard.user_id.is_not(None), Leaderboard.id.not_in(oldest_entries)
+    ))
+
+    oldest_genes = select(func.min(PetGenetics.id)).group_by(PetGenetics.pet_id, PetGenetics.gene_id)
+    db.execute(delete(PetGenetics).where(
+        PetGenetics.pet_id.is_not(None), PetGenetics.gene_id.is_not(None), PetGenetics.id.not_in(oldest_genes)
+    ))
+
+
+def migrate_vitals_day(db) -> None:
+    """Pets from older saves start lazy decay at their owner's current game day."""
+    pets = Pet.__table__
+    users = User.__table__
+    owner_day = (
+        select(users.c.decay_day).where(users.c.id == pets.c.owner_id).scalar_subquery()
+    )
+    db.execute(update(pets).where(pets.c.vitals_day.is_(None)).values(vitals_day=owner_day))
+    db.execute(update(pets).where(pets.c.vitals_day.is_(None)).values(vitals_day=0))
+
+
+def migrate_breeding_cooldowns(db) -> None:
+    """
+    Turn old seconds-remaining cooldowns into breedable_at expiry timestamps,
+    in one UPDATE, and drop the index saves from before that kept on the counter.
+    """
+    pets = Pet.__table__
+    now = datetime.datetime.utcnow()
+    seconds = pets.c.breeding_cooldown
+    if db.get_bind().dialect.name == "sqlite":
+        expiry = func.datetime(now.strftime("%Y-%m-%d %H:%M:%S"), "+" + cast(seconds, String) + " seconds")
+    else:
+        expiry = literal(now, DateTime) + func.make_interval(0, 0, 0, 0, 0, 0, seconds)
+    db.execute(
+        update(pets).where(seconds > 0, pets.c.breedable_at.is_(None))
+        .values(breedable_at=expiry, breeding_cooldown=0)
+    )
+    db.execute(text("DROP INDEX IF EXISTS ix_pets_breeding_cooldown"))
+
+
+def sync_listing_columns(db) -> None:
+    """
+    Pet.for_sale / Pet.asking_price mirror the PetMarketplace rows, and listings
+    are paged over those pet columns. Repair saves where the two drifted apart.
+    """
+    pets = Pet.__table__
+    listings = PetMarketplace.__table__
+    listed_price = select(listings.c.asking_price).where(listings.c.pet_id == pets.c.id).scalar_subquery()
+    is_listed = select(listings.c.id).where(listings.c.pet_id == pets.c.id).exists()
+    db.execute(
+        update(pets).where(is_listed, or_(
+            pets.c.for_sale.is_(None), pets.c.for_sale != 1,
+            pets.c.asking_price.is_(None), pets.c.asking_price != listed_price,
+        )).values(for_sale=1, asking_price=listed_price)
+    )
+    db.execute(update(pets).where(~is_listed, pets.c.for_sale == 1).values(for_sale=0, asking_price=None))
+
+
+def default_rarity_tier(db) -> None:
+    """Pets saved without a tier are Common (the column default); market_stats.py relies on it."""
+    pets = Pet.__table__
+    db.execute(update(pets).where(pets.c.rarity_tier.is_(None)).values(rarity_tier="Common"))
+
+
+def _phenotype_from_text(color_phenotype):
+    """(dominant, secondary, is_pure) read back from a stored color_phenotype string."""
+    text_value = color_phenotype.strip()
+    if text_value.endswith(" (pure)"):
+        return text_value[:-len(" (pure)")], None, 1
+    if text_value.endswith(" mix") and "-" in text_value:
+        dominant, secondary = text_value[:-len(" mix")].split("-", 1)
+        return dominant, secondary, 0
+    # Bare colour names set by create/breed; purity is unknown without genetics
+    return text_value, None, None
+
+
+def backfill_phenotype_columns(db) -> None:
+    """
+    Fill Pet.coat_dominant / coat_secondary / coat_is_pure / hair_genotype for
+    pets saved before those columns existed. Pets with a genetic code go through
+    RarityCalculator.store_phenotype; older code-less pets keep whatever their
+    color_phenotype text said, so the listings colour filter still finds them.
+    """
+    pets = Pet.__table__
+    rows = db.execute(
+        select(pets.c.id, pets.c.genetic_code, pets.c.color_phenotype)
+        .where(pets.c.coat_dominant.is_(None))
+        .where(or_(pets.c.genetic_code.isnot(None), pets.c.color_phenotype.isnot(None)))
+    ).all()
+    # One executemany per set of columns: coded pets fill more of them than text-only ones
+    batches = {}
+    for pet_id, genetic_code, color_phenotype in rows:
+        if genetic_code:
+            values = RarityCalculator.phenotype_columns(genetic_code)
+        else:
+            dominant, secondary, is_pure = _phenotype_from_text(color_phenotype)
+            values = dict(coat_dominant=dominant, coat_secondary=secondary, coat_is_pure=is_pure)
+        params = {f"new_{column}": value for column, value in values.items()}
+        params["pet_id"] = pet_id
+        batches.setdefault(tuple(values), []).append(params)
+    for columns, params in batches.items():
+        db.execute(
+            update(pets).where(pets.c.id == bindparam("pet_id"))
+            .values({column: bindparam(f"new_{column}") for column in columns}),
+            params
+        )
+
+
+def backfill_packed_genotypes(db) -> None:
+    """Fill Pet.genotype_packed for pets with a genetic code saved before the column existed."""
+    pets = Pet.__table__
+    rows = db.execute(
+        select(pets.c.id, pets.c.genetic_code)
+        .where(pets.c.genotype_packed.is_(None), pets.c.genetic_code.isnot(None))
+    ).all()
+    packed = [{"pet_id": pet_id, "packed": pack_genetic_code(code)} for pet_id, code in rows]
+    packed = [row for row in packed if row["packed"] is not None]
+    if packed:
+        db.execute(
+            update(pets).where(pets.c.id == bindparam("pet_id")).values(genotype_packed=bindparam("packed")),
+            packed
+        )
+
+
+def backfill_sale_rollups(db) -> None:
+    """
+    Build the hourly price history rollups from PetSalesHistory once, for saves
+    that recorded sales before the rollups existed. Sales are filed under the
+    pet's current tier and phenotype (sold pets that have since died: Unknown).
+    """
+    if db.execute(select(SaleRollup.id).limit(1)).first() is not None:
+        return
+    history, pets = PetSalesHistory.__table__, Pet.__table__
+    cutoff = datetime.datetime.utcnow() - ROLLUPS_KEPT
+    rows = db.execute(
+        select(history.c.sale_price, history.c.sale_date,
+               pets.c.rarity_tier, pets.c.coat_dominant, pets.c.hair_type)
+        .select_from(history.outerjoin(pets, pets.c.id == history.c.pet_id))
+        .where(history.c.sale_date >= cutoff)
+        .order_by(history.c.sale_date, history.c.id)
+    ).all()
+    rollups = {}
+    for row in rows:
+        key = (hour_start(row.sale_date),) + sale_key(row)
+        rollup = rollups.setdefault(key, {"sale_count": 0, "volume": 0})
+        rollup["sale_count"] += 1
+        rollup["volume"] += row.sale_price or 0
+        rollup["last_price"] = row.sale_price
+        rollup["last_sale_at"] = row.sale_date
+    if rollups:
+        db.execute(SaleRollup.__table__.insert(), [
+            dict(zip(("hour_start", "rarity_tier", "coat_color", "hair_type"), key), **totals)
+            for key, totals in rollups.items()
+        ])
+
+
+def run_migrations(engine, session_factory) -> None:
+    """Bring an existing database up to the current schema and data layout."""
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+
+    db = session_factory()
+    try:
+        dedupe_upsert_keys(db)
+        db.commit()
+    finally:
+        db.close()
+    create_missing_indexes(engine)
+    drop_unused_indexes(engine)
+    drop_unused_tables(engine)
+
+    db = session_factory()
+    try:
+        migrate_world_clock(db)
+        migrate_vitals_day(db)
+        migrate_breeding_cooldowns(db)
+        sync_listing_columns(db)
+        default_rarity_tier(db)
+        backfill_phenotype_columns(db)
+        backfill_packed_genotypes(db)
+        backfill_sale_rollups(db)
+        db.commit()
+    finally:
+        db.close()
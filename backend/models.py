@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index, select
 from sqlalchemy.orm import relationship
 try:
     # Try importing the new filename
@@ -7,6 +7,7 @@ except ImportError:
     from db_connect import Base
 
 import datetime
+import math
 
 class User(Base):
     __tablename__ = "users"
@@ -17,6 +18,8 @@ class User(Base):
     balance = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     last_login = Column(DateTime, nullable=True)
+    # Game days this player's pets have lived through (see vitals.py)
+    decay_day = Column(Integer, default=0)
 
     pets = relationship("Pet", back_populates="owner")
     inventory = relationship("Inventory", back_populates="user")
@@ -26,15 +29,56 @@ class User(Base):
     sales_as_seller = relationship("PetSalesHistory", foreign_keys="PetSalesHistory.seller_id", back_populates="seller")
     purchases = relationship("PetSalesHistory", foreign_keys="PetSalesHistory.buyer_id", back_populates="buyer")
 
+def _owner_decay_day(context):
+    """New pets start with their vitals current as of the owner's game day."""
+    owner_id = context.get_current_parameters().get("owner_id")
+    if owner_id is None:
+        return 0
+    users = User.__table__
+    day = context.connection.execute(
+        select(users.c.decay_day).where(users.c.id == owner_id)
+    ).scalar()
+    return day or 0
+
 class Pet(Base):
     __tablename__ = "pets"
+    # Owner lookups lead with owner_id; the second column serves the hungry-pet
+    # filter (feeding.py) without touching other players' rows
+    __table_args__ = (
+        Index("ix_pets_owner_hunger", "owner_id", "hunger"),
+        # Portfolio detail pages, most valuable first
+        Index("ix_pets_owner_value", "owner_id", "market_value", "id"),
+        # Pets of an owner that can (or cannot yet) breed (/pets/owner?can_breed=)
+        Index("ix_pets_owner_breedable_at", "owner_id", "breedable_at"),
+        # Marketplace browsing: one index per sort order, with and without the
+        # rarity filter, each ending in id for the keyset tiebreaker
+        Index("ix_pets_listing_price", "for_sale", "asking_price", "id"),
+        Index("ix_pets_listing_rarity", "for_sale", "rarity_score", "id"),
+        Index("ix_pets_listing_value", "for_sale", "market_value", "id"),
+        Index("ix_pets_listing_tier_price", "for_sale", "rarity_tier", "asking_price", "id"),
+        Index("ix_pets_listing_tier_rarity", "for_sale", "rarity_tier", "rarity_score", "id"),
+        Index("ix_pets_listing_tier_value", "for_sale", "rarity_tier", "market_value", "id"),
+        # Coat colour filter: a colour matches either half of the phenotype
+        Index("ix_pets_listing_coat_dominant", "for_sale", "coat_dominant", "asking_price", "id"),
+        Index("ix_pets_listing_coat_secondary", "for_sale", "coat_secondary", "asking_price", "id"),
+        Index("ix_pets_listing_coat_pure", "for_sale", "coat_is_pure", "asking_price", "id"),
+        # Genotype filter: leading loci are a range of the packed value (genotype.py)
+        Index("ix_pets_listing_genotype", "for_sale", "genotype_packed", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"))
     name = Column(String)
-    species = Column(String)
+    species = Column(String, index=True)
     color = Column(String)
     color_phenotype = Column(String, nullable=True)
     hair_type = Column(String, default="short")
+    # Structured phenotype filled by RarityCalculator.store_phenotype (pricing.py)
+    coat_dominant = Column(String, nullable=True)
+    coat_secondary = Column(String, nullable=True)
+    coat_is_pure = Column(Integer, nullable=True)
+    hair_genotype = Column(String, nullable=True, index=True)
+    # The built-in loci of genetic_code packed into one integer (genotype.py)
+    genotype_packed = Column(Integer, nullable=True, index=True)
     age_days = Column(Integer, default=0)
     age_months = Column(Integer, default=0)
     health = Column(Integer, default=100)
@@ -46,19 +90,24 @@ class Pet(Base):
     speed = Column(Integer, default=50)
     endurance = Column(Integer, default=50)
     rarity_score = Column(Integer, default=0)
-    rarity_tier = Column(String, default="Common")
+    rarity_tier = Column(String, default="Common", index=True)
     market_value = Column(Integer, default=100)
     for_sale = Column(Integer, default=0)
+    # Copy of the PetMarketplace price while for_sale == 1, so listings page over pets alone
     asking_price = Column(Integer, nullable=True)
-    last_updated = Column(DateTime, default=datetime.datetime.utcnow)
+    last_updated = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    # Owner decay_day the stored vitals are current for (see vitals.py)
+    vitals_day = Column(Integer, default=_owner_decay_day, nullable=True)
     tick_progress = Column(Integer, default=0)
     game_year = Column(Integer, default=1)
     game_month = Column(Integer, default=1)
     game_day = Column(Integer, default=1)
     game_hour = Column(Integer, default=8)
     
-    # --- NEW: Tracks seconds remaining until breedable ---
-    breeding_cooldown = Column(Integer, default=0)
+    # --- Breeding cooldown: the moment the pet may breed again (evaluated on read) ---
+    breedable_at = Column(DateTime, nullable=True)
+    # Old seconds-remaining counter; only read once by the upgrade step in migrations.py
+    legacy_breeding_cooldown = Column("breeding_cooldown", Integer, default=0)
 
     owner = relationship("User", back_populates="pets")
     # ... (Keep existing relationships)
@@ -69,23 +118,38 @@ class Pet(Base):
     marketplace_listing = relationship("PetMarketplace", back_populates="pet", uselist=False)
     sales_history = relationship("PetSalesHistory", back_populates="pet")
 
+    @property
+    def breeding_cooldown(self):
+        """Seconds remaining until breedable, derived from breedable_at."""
+        if not self.breedable_at:
+            return 0
+        remaining = (self.breedable_at - datetime.datetime.utcnow()).total_seconds()
+        return max(0, math.ceil(remaining))
+
 class Inventory(Base):
     __tablename__ = "inventory"
+    # One stack per item per player (the key add_inventory_item upserts on)
+    __table_args__ = (Index("uq_inventory_user_item", "user_id", "item_name", unique=True),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    item_name = Column(String)
+    item_name = Column(String, index=True)
     quantity = Column(Integer, default=0)
 
     user = relationship("User", back_populates="inventory")
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    # A player's history, by type or newest first
+    __table_args__ = (
+        Index("ix_transactions_user_type", "user_id", "type"),
+        Index("ix_transactions_user_timestamp", "user_id", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    type = Column(String)
+    type = Column(String, index=True)
     amount = Column(Integer, default=0)
     description = Column(Text, nullable=True)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
 
     user = relationship("User", back_populates="transactions")
 
@@ -99,13 +163,74 @@ class MiniGame(Base):
 class Leaderboard(Base):
     __tablename__ = "leaderboards"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    score = Column(Integer, default=0)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, index=True)
+    score = Column(Integer, default=0, index=True)
+    # No longer written; ranks are computed on read (routes/leaderboard.py)
     rank = Column(Integer, nullable=True)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     user = relationship("User", back_populates="leaderboard")
 
+class LeaderboardScoreCount(Base):
+    """
+    Players whose leaderboard score falls in one bucket of one level of the
+    rank counter tree (bucket = score // SCORE_FANOUT**level), kept in step by
+    leaderboard_counts.py on every score write.
+    """
+    __tablename__ = "leaderboard_score_counts"
+    level = Column(Integer, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    players = Column(Integer, default=0)
+
+class LeaderboardTotals(Base):
+    """Single-row player count of the overall leaderboard (id == 1)."""
+    __tablename__ = "leaderboard_totals"
+    id = Column(Integer, primary_key=True)
+    players = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ScoreEvent(Base):
+    """One finished mini-game run; the raw feed behind the windowed leaderboards."""
+    __tablename__ = "score_events"
+    __table_args__ = (Index("ix_score_events_game_created", "game_id", "created_at"),)
+    id = Column(Integer, primary_key=True, index=True)
+    game_id = Column(Integer, ForeignKey("mini_games.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    score = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class LeaderboardBucket(Base):
+    """
+    A player's summed score for one mini-game in one window
+    (period "daily", "weekly" or "all", starting at period_start).
+    """
+    __tablename__ = "leaderboard_buckets"
+    __table_args__ = (
+        Index("uq_leaderboard_buckets_window_user", "game_id", "period", "period_start", "user_id", unique=True),
+        # Top-N of one window is a reverse walk of this index
+        Index("ix_leaderboard_buckets_window_score", "game_id", "period", "period_start", "score"),
+        # Expiry deletes whole finished windows across games
+        Index("ix_leaderboard_buckets_period_start", "period", "period_start"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    game_id = Column(Integer, ForeignKey("mini_games.id"))
+    user_id = Column(Integer, ForeignKey("users.id"))
+    period = Column(String)
+    period_start = Column(DateTime)
+    score = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class WorldClock(Base):
+    """Single-row save of the in-game calendar (id == 1)."""
+    __tablename__ = "world_clock"
+    id = Column(Integer, primary_key=True, index=True)
+    ticks = Column(Integer, default=0)
+    game_year = Column(Integer, default=1)
+    game_month = Column(Integer, default=1)
+    game_day = Column(Integer, default=1)
+    game_hour = Column(Integer, default=8)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class ShopItem(Base):
     __tablename__ = "shop_items"
     id = Column(Integer, primary_key=True, index=True)
@@ -132,7 +257,7 @@ class Gene(Base):
 class Allele(Base):
     __tablename__ = "alleles"
     id = Column(Integer, primary_key=True, index=True)
-    gene_id = Column(Integer, ForeignKey("genes.id"))
+    gene_id = Column(Integer, ForeignKey("genes.id"), index=True)
     name = Column(String)
     symbol = Column(String)
     dominance_level = Column(Integer, default=1)
@@ -145,9 +270,11 @@ class Allele(Base):
 
 class PetGenetics(Base):
     __tablename__ = "pet_genetics"
+    # One row per gene per pet, as the schema script's UNIQUE(pet_id, gene_id)
+    __table_args__ = (Index("uq_pet_genetics_pet_gene", "pet_id", "gene_id", unique=True),)
     id = Column(Integer, primary_key=True, index=True)
-    pet_id = Column(Integer, ForeignKey("pets.id"))
-    gene_id = Column(Integer, ForeignKey("genes.id"))
+    pet_id = Column(Integer, ForeignKey("pets.id"), index=True)
+    gene_id = Column(Integer, ForeignKey("genes.id"), index=True)
     allele1_id = Column(Integer, ForeignKey("alleles.id"))
     allele2_id = Column(Integer, ForeignKey("alleles.id"))
 
@@ -159,9 +286,9 @@ class PetGenetics(Base):
 class Offspring(Base):
     __tablename__ = "offspring"
     id = Column(Integer, primary_key=True, index=True)
-    parent1_id = Column(Integer, ForeignKey("pets.id"))
-    parent2_id = Column(Integer, ForeignKey("pets.id"))
-    child_id = Column(Integer, ForeignKey("pets.id"))
+    parent1_id = Column(Integer, ForeignKey("pets.id"), index=True)
+    parent2_id = Column(Integer, ForeignKey("pets.id"), index=True)
+    child_id = Column(Integer, ForeignKey("pets.id"), index=True)
     breeding_date = Column(DateTime, default=datetime.datetime.utcnow)
     punnett_square_data = Column(Text, nullable=True)
     inheritance_notes = Column(Text, nullable=True)
@@ -178,21 +305,120 @@ class PetMarketplace(Base):
     __tablename__ = "pet_marketplace"
     id = Column(Integer, primary_key=True, index=True)
     pet_id = Column(Integer, ForeignKey("pets.id"), unique=True)
-    seller_id = Column(Integer, ForeignKey("users.id"))
-    asking_price = Column(Integer)
+    seller_id = Column(Integer, ForeignKey("users.id"), index=True)
+    asking_price = Column(Integer, index=True)
     listed_date = Column(DateTime, default=datetime.datetime.utcnow)
 
     pet = relationship("Pet", back_populates="marketplace_listing")
     seller = relationship("User", back_populates="marketplace_listings")
 
+class Auction(Base):
+    """
+    A timed auction of one pet. Bids live in the in-memory order book
+    (order_book.py) and are persisted as MarketBid rows; the matching engine
+    settles the auction once ends_at has passed.
+    status: "open", "settled" (sold to winning_bid_id), "expired" (no valid bid)
+    or "cancelled" (the pet left the seller before settlement).
+    """
+    __tablename__ = "auctions"
+    __table_args__ = (Index("ix_auctions_status_ends_at", "status", "ends_at"),)
+    id = Column(Integer, primary_key=True, index=True)
+    pet_id = Column(Integer, ForeignKey("pets.id"), index=True)
+    seller_id = Column(Integer, ForeignKey("users.id"), index=True)
+    reserve_price = Column(Integer, default=1)
+    starts_at = Column(DateTime, default=datetime.datetime.utcnow)
+    ends_at = Column(DateTime)
+    status = Column(String, default="open")
+    winning_bid_id = Column(Integer, nullable=True)
+    final_price = Column(Integer, nullable=True)
+    settled_at = Column(DateTime, nullable=True)
+
+class MarketBid(Base):
+    """
+    A bid in the order book: on one auction (auction_id set), or a standing
+    bid for any listed pet of a tier / phenotype (NULL key columns match any).
+    status: "open", "filled", "outbid", "rejected" (bidder could not pay) or "cancelled".
+    """
+    __tablename__ = "market_bids"
+    __table_args__ = (Index("ix_market_bids_status", "status", "auction_id"),)
+    id = Column(Integer, primary_key=True, index=True)
+    bidder_id = Column(Integer, ForeignKey("users.id"), index=True)
+    price = Column(Integer)
+    auction_id = Column(Integer, ForeignKey("auctions.id"), nullable=True)
+    rarity_tier = Column(String, nullable=True)
+    coat_color = Column(String, nullable=True)
+    hair_type = Column(String, nullable=True)
+    status = Column(String, default="open")
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class RevaluationRun(Base):
+    """
+    One pass of the batch revaluation job (revaluation.py) over every pet with
+    a genetic code, in pet id order. last_pet_id and the counters are committed
+    with each chunk, so an interrupted run resumes after its last chunk.
+    status: "running", "done" or "failed".
+    """
+    __tablename__ = "revaluation_runs"
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, default="running", index=True)
+    total_pets = Column(Integer, default=0)
+    last_pet_id = Column(Integer, default=0)
+    pets_done = Column(Integer, default=0)
+    pets_changed = Column(Integer, default=0)
+    chunks = Column(Integer, default=0)
+    elapsed_ms = Column(Integer, default=0)  # time spent on chunks; pets_done / elapsed is the throughput
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class MarketTierStats(Base):
+    """
+    Running totals over the pets listed in one rarity tier, kept in step by
+    market_stats.py inside the list/unlist/purchase transactions.
+    """
+    __tablename__ = "market_tier_stats"
+    id = Column(Integer, primary_key=True, index=True)
+    rarity_tier = Column(String, unique=True, index=True)
+    listed_count = Column(Integer, default=0)
+    price_sum = Column(Integer, default=0)
+    price_min = Column(Integer, nullable=True)
+    price_max = Column(Integer, nullable=True)
+    value_sum = Column(Integer, default=0)
+    value_min = Column(Integer, nullable=True)
+    value_max = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class SaleRollup(Base):
+    """
+    Marketplace sales of one hour, per rarity tier and phenotype (coat colour,
+    hair type). Written by price_history.record_sale on every purchase.
+    """
+    __tablename__ = "sale_rollups"
+    __table_args__ = (
+        Index("uq_sale_rollups_hour_key", "hour_start", "rarity_tier", "coat_color", "hair_type", unique=True),
+        Index("ix_sale_rollups_tier_hour", "rarity_tier", "hour_start"),
+        Index("ix_sale_rollups_last_sale_at", "last_sale_at"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    hour_start = Column(DateTime)
+    rarity_tier = Column(String)
+    coat_color = Column(String)
+    hair_type = Column(String)
+    sale_count = Column(Integer, default=0)
+    volume = Column(Integer, default=0)  # sum of sale prices; volume / sale_count is the VWAP
+    last_price = Column(Integer, nullable=True)
+    last_sale_at = Column(DateTime, nullable=True)
+
 class PetSalesHistory(Base):
     __tablename__ = "pet_sales_history"
     id = Column(Integer, primary_key=True, index=True)
-    pet_id = Column(Integer, ForeignKey("pets.id"))
-    seller_id = Column(Integer, ForeignKey("users.id"))
-    buyer_id = Column(Integer, ForeignKey("users.id"))
+    pet_id = Column(Integer, ForeignKey("pets.id"), index=True)
+    seller_id = Column(Integer, ForeignKey("users.id"), index=True)
+    buyer_id = Column(Integer, ForeignKey("users.id"), index=True)
     sale_price = Column(Integer)
-    sale_date = Column(DateTime, default=datetime.datetime.utcnow)
+    sale_date = Column(DateTime, default=datetime.datetime.utcnow, index=True)
 
     pet = relationship("Pet", back_populates="sales_history")
     seller = relationship("User", foreign_keys=[seller_id], back_populates="sales_as_seller")
@@ -0,0 +1,521 @@
+"""
+Auctions and standing bids.
+
+Bids go into an in-memory order book - one max-heap per auction and one per
+standing-bid key (tier, coat colour, hair type; None matches anything) - without
+touching the database, so one node can take thousands of bids a second. A
+background thread wakes every GG_ORDER_BOOK_INTERVAL seconds and, per round:
+
+1. settles every auction whose ends_at has passed: the highest bid whose
+   bidder can still pay wins at their own price (first-price)
+2. matches standing bids against fixed-price listings of their key, highest
+   bid first, at the listing's asking price
+3. persists the bids accepted / cancelled / filled since the last commit
+   (MarketBid rows) and the auction results
+
+A round commits every GG_ORDER_BOOK_COMMIT_EVERY trades (or auctions), and
+whenever its transaction has been open GG_ORDER_BOOK_COMMIT_SECONDS, then
+pauses GG_ORDER_BOOK_COMMIT_PAUSE before the next batch. SQLite's busy handler
+only retries a waiting writer every 100 ms or so, so without the pause the
+engine would take the write lock straight back; with it, purchases, feeds and
+score writes get the lock between batches instead of timing out behind a
+whole round.
+
+Trades go through trades.settle_sale (the same conditional writes, Transaction
+and PetSalesHistory records as a fixed-price purchase), each in a savepoint:
+a bidder who can no longer pay is marked "rejected" and the next bid is tried.
+If the process dies, bids accepted since the last round are lost (at most one
+interval's worth); open auctions and persisted open bids are reloaded on start.
+
+The engine starts on first use (and at startup when there are open auctions or
+bids). Tunables (environment variables):
+
+- GG_ORDER_BOOK_INTERVAL        seconds between matching rounds      (1.0)
+- GG_ORDER_BOOK_MAX_TRADES      trades settled per round, at most     (500)
+- GG_ORDER_BOOK_COMMIT_EVERY    trades per transaction, at most       (20)
+- GG_ORDER_BOOK_COMMIT_SECONDS  seconds a transaction stays open      (0.25)
+- GG_ORDER_BOOK_COMMIT_PAUSE    seconds between transactions          (0.1)
+"""
+
+import datetime
+import heapq
+import itertools
+import os
+import threading
+import time
+from sqlalchemy import func, insert, select, update
+from .import models
+from .trades import TradeRejected, settle_sale
+from .write_queue import writer_session_factory
+
+
+class OrderBookConfig:
+    """Order book settings, read from the environment once at import."""
+
+    def __init__(self):
+        self.interval = float(os.environ.get("GG_ORDER_BOOK_INTERVAL", "1.0"))
+        self.max_trades = int(os.environ.get("GG_ORDER_BOOK_MAX_TRADES", "500"))
+        self.commit_every = int(os.environ.get("GG_ORDER_BOOK_COMMIT_EVERY", "20"))
+        self.commit_seconds = float(os.environ.get("GG_ORDER_BOOK_COMMIT_SECONDS", "0.25"))
+        self.commit_pause = float(os.environ.get("GG_ORDER_BOOK_COMMIT_PAUSE", "0.1"))
+
+
+ORDER_BOOK_CONFIG = OrderBookConfig()
+
+
+class BookBid:
+    """An open (or just closed, not yet persisted) bid held in memory."""
+    __slots__ = ("id", "bidder_id", "price", "auction_id", "key", "status", "created_at")
+
+    def __init__(self, id, bidder_id, price, auction_id=None, key=None, status="open", created_at=None):
+        self.id = id
+        self.bidder_id = bidder_id
+        self.price = price
+        self.auction_id = auction_id
+        self.key = key
+        self.status = status
+        self.created_at = created_at or datetime.datetime.utcnow()
+
+    def as_dict(self):
+        tier, coat_color, hair_type = self.key or (None, None, None)
+        return {
+            "bid_id": self.id, "bidder_id": self.bidder_id, "price": self.price,
+            "auction_id": self.auction_id, "rarity_tier": tier, "coat_color": coat_color,
+            "hair_type": hair_type, "status": self.status, "created_at": self.created_at,
+        }
+
+
+def _best(heap):
+    """Highest open bid of a heap, dropping closed ones off the top."""
+    while heap and heap[0][2].status != "open":
+        heapq.heappop(heap)
+    return heap[0][2] if heap else None
+
+
+class _RoundTransaction:
+    """
+    The write transaction a round is working in. checkpoint() after each trade
+    (or auction) commits once the transaction holds commit_every of them or has
+    been open commit_seconds, then leaves the lock free for commit_pause;
+    commit() persists the bid changes and commits.
+    `drained` is what the last commit took out of memory, for _recover.
+    """
+
+    def __init__(self, book, db, now: datetime.datetime):
+        self.book = book
+        self.db = db
+        self.now = now
+        self.drained = ([], {})
+        self._restart()
+
+    def _restart(self):
+        self.work = 0
+        self.opened = time.perf_counter()
+
+    def checkpoint(self):
+        self.work += 1
+        config = self.book.config
+        if self.work >= config.commit_every or time.perf_counter() - self.opened >= config.commit_seconds:
+            self.commit()
+            time.sleep(config.commit_pause)
+            self._restart()
+
+    def commit(self):
+        self.drained = self.book._persist(self.db, self.now)
+        self.db.commit()
+        self.drained = ([], {})
+        # Other writers may move pets and balances before the next batch
+        self.db.expire_all()
+
+
+class OrderBook:
+    """In-memory bids plus the matching thread that settles them."""
+
+    def __init__(self, session_factory, config: OrderBookConfig = ORDER_BOOK_CONFIG):
+        self.session_factory = session_factory
+        self.config = config
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._bids = {}            # open bid id -> BookBid
+        self._auction_books = {}   # auction id -> heap of (-price, seq, BookBid)
+        self._standing_books = {}  # (tier, coat_color, hair_type) -> heap of (-price, seq, BookBid)
+        self._auctions = {}        # open auction id -> (ends_at, reserve_price, seller_id)
+        self._new_bids = []        # accepted since the last round
+        self._status_changes = {}  # bid id -> status, not yet persisted
+        self._seq = itertools.count()
+        self._next_id = 1
+
+        self.metrics = {
+            "running": False,
+            "rounds": 0,
+            "errors": 0,
+            "last_error": None,
+            "last_round_ms": 0.0,
+            "bids_accepted": 0,
+            "bids_cancelled": 0,
+            "bids_rejected": 0,
+            "trades": 0,
+            "auctions_settled": 0,
+            "auctions_expired": 0,
+            "auctions_cancelled": 0,
+        }
+
+    # --- lifecycle ---
+
+    def load(self):
+        """(Re)load open auctions and persisted open bids from the database."""
+        db = self.session_factory()
+        try:
+            auctions = db.scalars(select(models.Auction).where(models.Auction.status == "open")).all()
+            bids = db.scalars(select(models.MarketBid).where(models.MarketBid.status == "open")).all()
+            last_id = db.execute(select(func.max(models.MarketBid.id))).scalar() or 0
+        finally:
+            db.close()
+        with self._lock:
+            self._bids, self._auction_books, self._standing_books, self._auctions = {}, {}, {}, {}
+            for auction in auctions:
+                self._auctions[auction.id] = (auction.ends_at, auction.reserve_price, auction.seller_id)
+            for row in bids:
+                key = None if row.auction_id else (row.rarity_tier, row.coat_color, row.hair_type)
+                self._push(BookBid(row.id, row.bidder_id, row.price, row.auction_id, key, "open", row.created_at))
+            self._next_id = max(self._next_id, last_id + 1)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="order-book", daemon=True)
+        self._thread.start()
+        self.metrics["running"] = True
+
+    def stop(self, timeout: float = 5.0):
+        """Stop matching and persist whatever bids are still only in memory."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.metrics["running"] = False
+        db = self.session_factory()
+        try:
+            self._persist(db, datetime.datetime.utcnow())
+            db.commit()
+        finally:
+            db.close()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_round()
+            except Exception as e:
+                self.metrics["errors"] += 1
+                self.metrics["last_error"] = str(e)
+                print(f"Order book error: {e}")
+            self._stop.wait(self.config.interval)
+
+    # --- taking orders (request threads) ---
+
+    def _push(self, bid: BookBid):
+        """Index a bid. Caller holds the lock."""
+        self._bids[bid.id] = bid
+        if bid.auction_id is not None:
+            heap = self._auction_books.setdefault(bid.auction_id, [])
+        else:
+            heap = self._standing_books.setdefault(bid.key, [])
+        heapq.heappush(heap, (-bid.price, next(self._seq), bid))
+
+    def add_auction(self, auction: models.Auction):
+        with self._lock:
+            self._auctions[auction.id] = (auction.ends_at, auction.reserve_price, auction.seller_id)
+
+    def submit_bid(self, bidder_id: int, price: int, auction_id: int = None, key: tuple = None,
+                   now: datetime.datetime = None) -> BookBid:
+        """
+        Accept a bid into memory. Auction bids must meet the reserve and beat
+        the best bid so far. Raises ValueError when the bid is not acceptable.
+        """
+        if price <= 0:
+            raise ValueError("Bid price must be greater than 0")
+        now = now or datetime.datetime.utcnow()
+        with self._lock:
+            if auction_id is not None:
+                auction = self._auctions.get(auction_id)
+                if auction is None or auction[0] <= now:
+                    raise ValueError("Auction is not open")
+                ends_at, reserve_price, seller_id = auction
+                if bidder_id == seller_id:
+                    raise ValueError("Cannot bid on your own auction")
+                if price < reserve_price:
+                    raise ValueError(f"Bid is below the reserve price of {reserve_price}")
+                best = _best(self._auction_books.get(auction_id, []))
+                if best is not None and price <= best.price:
+                    raise ValueError(f"Bid must beat the current best bid of {best.price}")
+                key = None
+            else:
+                key = tuple(key or (None, None, None))
+            bid = BookBid(self._next_id, bidder_id, price, auction_id, key, "open", now)
+            self._next_id += 1
+            self._push(bid)
+            self._new_bids.append(bid)
+            self.metrics["bids_accepted"] += 1
+        return bid
+
+    def open_bid(self, bid_id: int):
+        with self._lock:
+            return self._bids.get(bid_id)
+
+    def cancel_bid(self, bid_id: int) -> bool:
+        with self._lock:
+            bid = self._bids.get(bid_id)
+            if bid is None:
+                return False
+            self._close(bid, "cancelled")
+            self.metrics["bids_cancelled"] += 1
+            return True
+
+    def _close(self, bid: BookBid, status: str):
+        """Take a bid out of the book (lazily from its heap). Caller holds the lock."""
+        bid.status = status
+        self._bids.pop(bid.id, None)
+        self._status_changes[bid.id] = status
+
+    # --- reading the book ---
+
+    def auction_summary(self, auction_id: int) -> dict:
+        with self._lock:
+            heap = self._auction_books.get(auction_id, [])
+            best = _best(heap)
+            open_bids = sum(1 for _, _, bid in heap if bid.status == "open")
+        return {"best_bid": best.price if best else None, "best_bidder_id": best.bidder_id if best else None,
+                "open_bids": open_bids}
+
+    def depth(self, key: tuple, levels: int = 10) -> list:
+        """Top price levels of the standing bids for one key: [{"price", "bids"}], best first."""
+        with self._lock:
+            prices = [bid.price for _, _, bid in self._standing_books.get(tuple(key), []) if bid.status == "open"]
+        book = {}
+        for price in prices:
+            book[price] = book.get(price, 0) + 1
+        return [{"price": price, "bids": book[price]} for price in sorted(book, reverse=True)[:levels]]
+
+    # --- matching (engine thread) ---
+
+    def run_round(self, now: datetime.datetime = None) -> int:
+        """Settle due auctions, match standing bids, persist. Returns trades made."""
+        now = now or datetime.datetime.utcnow()
+        started = time.perf_counter()
+        with self._lock:
+            due = [auction_id for auction_id, (ends_at, _, _) in self._auctions.items() if ends_at <= now]
+            keys = [key for key, heap in self._standing_books.items() if _best(heap) is not None]
+            idle = not (due or keys or self._new_bids or self._status_changes)
+        if idle:
+            return 0
+
+        db = self.session_factory()
+        trades = 0
+        batch = _RoundTransaction(self, db, now)
+        try:
+            for auction_id in due:
+                trades += self._settle_auction(db, auction_id, now)
+                batch.checkpoint()
+            for key in keys:
+                if trades >= self.config.max_trades:
+                    break
+                trades += self._match_standing(batch, key, self.config.max_trades - trades)
+            batch.commit()
+        except Exception:
+            db.rollback()
+            # Memory may now be ahead of the database; start again from what was saved
+            self._recover(*batch.drained)
+            raise
+        finally:
+            db.close()
+
+        self.metrics["rounds"] += 1
+        self.metrics["trades"] += trades
+        self.metrics["last_round_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return trades
+
+    def _try_sale(self, db, pet, seller, bid, price, claim):
+        """One trade in a savepoint; returns None or the TradeRejected that undid it."""
+        buyer = db.get(models.User, bid.bidder_id)
+        if buyer is None:
+            return TradeRejected(404, "Buyer not found")
+        savepoint = db.begin_nested()
+        try:
+            settle_sale(db, pet, seller, buyer, price, claim=claim)
+        except TradeRejected as e:
+            savepoint.rollback()
+            db.expire_all()
+            return e
+        savepoint.commit()
+        return None
+
+    def _settle_auction(self, db, auction_id: int, now: datetime.datetime) -> int:
+        with self._lock:
+            self._auctions.pop(auction_id, None)
+            heap = self._auction_books.pop(auction_id, [])
+            bids = [bid for _, _, bid in sorted(heap, key=lambda entry: entry[:2]) if bid.status == "open"]
+
+        auction = db.get(models.Auction, auction_id)
+        if auction is None or auction.status != "open":
+            with self._lock:
+                for bid in bids:
+                    self._close(bid, "cancelled")
+            return 0
+        pet = db.get(models.Pet, auction.pet_id)
+        seller = db.get(models.User, auction.seller_id)
+
+        winner, outcome = None, "expired"
+        for bid in bids:
+            if pet is None or seller is None:
+                outcome = "cancelled"
+                break
+            rejected = self._try_sale(db, pet, seller, bid, bid.price, claim=(models.Pet.for_sale == 0,))
+            if rejected is None:
+                winner, outcome = bid, "settled"
+                break
+            if rejected.status_code == 409:
+                outcome = "cancelled"  # the pet left the seller (died, deleted, listed)
+                break
+            with self._lock:
+                self._close(bid, "rejected")
+            self.metrics["bids_rejected"] += 1
+
+        with self._lock:
+            for bid in bids:
+                if bid is winner:
+                    self._close(bid, "filled")
+                elif bid.status == "open":
+                    self._close(bid, "outbid" if outcome == "settled" else "cancelled")
+
+        auction.status = outcome
+        auction.settled_at = now
+        if winner is not None:
+            auction.winning_bid_id = winner.id
+            auction.final_price = winner.price
+        self.metrics[f"auctions_{outcome}"] += 1
+        return 1 if winner is not None else 0
+
+    def _match_standing(self, batch: _RoundTransaction, key: tuple, budget: int) -> int:
+        db = batch.db
+        tier, coat_color, hair_type = key
+        pets = models.Pet
+        trades = 0
+        while trades < budget:
+            with self._lock:
+                bid = _best(self._standing_books.get(key, []))
+            if bid is None:
+                break
+            # Cheapest listing this bid can take; walks the (for_sale, coat/tier, asking_price, id) indexes
+            query = select(pets).where(
+                pets.for_sale == 1, pets.asking_price <= bid.price, pets.owner_id != bid.bidder_id
+            )
+            if tier:
+                query = query.where(pets.rarity_tier == tier)
+            if coat_color:
+                query = query.where(pets.coat_dominant == coat_color)
+            if hair_type:
+                query = query.where(pets.hair_type == hair_type)
+            pet = db.scalars(query.order_by(pets.asking_price, pets.id).limit(1)).first()
+            if pet is None:
+                break  # lower bids cannot match either
+            seller = db.get(models.User, pet.owner_id)
+            if seller is None:
+                break
+            price = pet.asking_price
+            rejected = self._try_sale(db, pet, seller, bid, price,
+                                      claim=(pets.for_sale == 1, pets.asking_price == price))
+            if rejected is None:
+                trades += 1
+                with self._lock:
+                    self._close(bid, "filled")
+            elif rejected.status_code != 409:
+                with self._lock:
+                    self._close(bid, "rejected")
+                self.metrics["bids_rejected"] += 1
+            # 409: the listing changed under us; look again
+            batch.checkpoint()
+        return trades
+
+    def _persist(self, db, now: datetime.datetime):
+        """
+        Write new bids and bid status changes. Does NOT commit.
+        Returns what it took out of memory, (new bids, status changes), so a
+        round whose commit fails can hand them back to _recover.
+        """
+        with self._lock:
+            new_bids, self._new_bids = self._new_bids, []
+            changes, self._status_changes = self._status_changes, {}
+        bids = models.MarketBid.__table__
+        if new_bids:
+            db.execute(insert(bids), [
+                {"id": bid.id, "bidder_id": bid.bidder_id, "price": bid.price, "auction_id": bid.auction_id,
+                 "rarity_tier": (bid.key or (None,) * 3)[0], "coat_color": (bid.key or (None,) * 3)[1],
+                 "hair_type": (bid.key or (None,) * 3)[2], "status": bid.status,
+                 "created_at": bid.created_at, "updated_at": now}
+                for bid in new_bids
+            ])
+        inserted = {bid.id for bid in new_bids}
+        by_status = {}
+        for bid_id, status in changes.items():
+            if bid_id not in inserted:
+                by_status.setdefault(status, []).append(bid_id)
+        for status, ids in by_status.items():
+            db.execute(update(bids).where(bids.c.id.in_(ids)).values(status=status, updated_at=now))
+        return new_bids, changes
+
+    def _recover(self, persisting=(), persisting_changes=None):
+        """
+        After a failed round: reload from the database, keeping bids it never
+        saw - those accepted since, and those the failed commit was persisting.
+        Batches the round committed before failing stay settled.
+        Cancellations that never reached the database are applied again.
+        """
+        with self._lock:
+            pending = list(persisting) + self._new_bids
+            unsaved = [bid for bid in pending if bid.status in ("open", "filled", "rejected", "outbid")]
+            changes = dict(persisting_changes or {})
+            changes.update(self._status_changes)
+            self._new_bids, self._status_changes = [], {}
+        self.load()
+        with self._lock:
+            for bid in unsaved:
+                bid.status = "open"
+                self._push(bid)
+                self._new_bids.append(bid)
+            for bid_id, status in changes.items():
+                if status == "cancelled" and bid_id in self._bids:
+                    self._close(self._bids[bid_id], "cancelled")
+
+
+_book = None
+_book_lock = threading.Lock()
+
+
+def get_order_book() -> OrderBook:
+    """The shared order book, loaded and started on first use."""
+    global _book
+    with _book_lock:
+        if _book is None:
+            book = OrderBook(writer_session_factory())
+            book.load()
+            book.start()
+            _book = book
+        return _book
+
+
+def resume_order_book(db) -> None:
+    """Start the engine at startup if a previous run left open auctions or bids."""
+    has_orders = db.execute(select(models.Auction.id).where(models.Auction.status == "open").limit(1)).first() \
+        or db.execute(select(models.MarketBid.id).where(models.MarketBid.status == "open").limit(1)).first()
+    if has_orders:
+        get_order_book()
+
+
+def stop_order_book() -> None:
+    global _book
+    with _book_lock:
+        if _book is not None:
+            _book.stop()
+            _book = None
@@ -0,0 +1,134 @@
+"""
+Marketplace price history.
+
+Every purchase adds its price to an hourly SaleRollup row for the pet's rarity
+tier and phenotype (coat colour, hair type), inside the purchase transaction.
+Price statistics (last price, 24h / 7d VWAP and sale counts) and the hourly
+series behind /marketplace/price-history read only those rollups - at most a
+few dozen rows per hour of window - never the raw PetSalesHistory.
+Windows are hour-granular: "24h" covers the current hour and the 23 before it.
+Rollups past ROLLUPS_KEPT are deleted by expire_rollups, which startup and the
+tick scheduler call; sales also run it through expire_rollups_if_due, so
+rollups expire when the scheduler is off.
+"""
+
+import datetime
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from .import models
+from .commit_hooks import PeriodicExpiry
+from .upserts import upsert
+
+WINDOWS = {"24h": datetime.timedelta(hours=24), "7d": datetime.timedelta(days=7)}
+ROLLUPS_KEPT = datetime.timedelta(days=90)
+MAX_HISTORY_HOURS = int(ROLLUPS_KEPT.total_seconds() // 3600)
+# Real seconds between the expiry runs sales piggyback
+EXPIRY_INTERVAL = 3600
+
+
+def hour_start(now: datetime.datetime) -> datetime.datetime:
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+def sale_key(pet) -> tuple:
+    """(rarity_tier, coat_color, hair_type) a sale of this pet is filed under."""
+    return (pet.rarity_tier or "Common", pet.coat_dominant or "Unknown", pet.hair_type or "short")
+
+
+def record_sale(db: Session, pet: models.Pet, price: int, now: datetime.datetime = None) -> None:
+    """Add one sale to its hourly rollup. Does NOT commit."""
+    now = now or datetime.datetime.utcnow()
+    rollups = models.SaleRollup
+    tier, coat_color, hair_type = sale_key(pet)
+    upsert(
+        db, rollups,
+        {"hour_start": hour_start(now), "rarity_tier": tier, "coat_color": coat_color, "hair_type": hair_type,
+         "sale_count": 1, "volume": price, "last_price": price, "last_sale_at": now},
+        key=["hour_start", "rarity_tier", "coat_color", "hair_type"],
+        on_conflict=lambda excluded: {
+            "sale_count": rollups.sale_count + 1,
+            "volume": rollups.volume + excluded.volume,
+            "last_price": excluded.last_price,
+            "last_sale_at": excluded.last_sale_at,
+        },
+    )
+    expire_rollups_if_due(db, now)
+
+
+def _filters(rarity: str = None, coat_color: str = None, hair_type: str = None) -> list:
+    rollups = models.SaleRollup
+    filters = []
+    if rarity:
+        filters.append(rollups.rarity_tier == rarity)
+    if coat_color:
+        filters.append(rollups.coat_color == coat_color)
+    if hair_type:
+        filters.append(rollups.hair_type == hair_type)
+    return filters
+
+
+def _vwap(sales: int, volume: int):
+    return round(volume / sales, 2) if sales else None
+
+
+def price_stats(db: Session, rarity: str = None, coat_color: str = None, hair_type: str = None,
+                now: datetime.datetime = None) -> dict:
+    """Last price plus sale count and VWAP per window, for the matching rollups."""
+    now = now or datetime.datetime.utcnow()
+    rollups = models.SaleRollup
+    filters = _filters(rarity, coat_color, hair_type)
+
+    # Reverse walk of the last_sale_at index, stopping at the first match
+    last = db.execute(
+        select(rollups.last_price, rollups.last_sale_at)
+        .where(*filters)
+        .order_by(rollups.last_sale_at.desc())
+        .limit(1)
+    ).first()
+
+    windows = {}
+    for name, span in WINDOWS.items():
+        sales, volume = db.execute(
+            select(func.coalesce(func.sum(rollups.sale_count), 0), func.coalesce(func.sum(rollups.volume), 0))
+            .where(*filters, rollups.hour_start > hour_start(now) - span)
+        ).one()
+        windows[name] = {"sales": sales, "vwap": _vwap(sales, volume)}
+
+    return {
+        "last_price": last.last_price if last else None,
+        "last_sale_at": last.last_sale_at if last else None,
+        "windows": windows,
+    }
+
+
+def hourly_history(db: Session, hours: int, rarity: str = None, coat_color: str = None, hair_type: str = None,
+                   now: datetime.datetime = None) -> list:
+    """Hours with sales in the last `hours` hours, oldest first."""
+    now = now or datetime.datetime.utcnow()
+    rollups = models.SaleRollup
+    sales = func.sum(rollups.sale_count)
+    volume = func.sum(rollups.volume)
+    rows = db.execute(
+        select(rollups.hour_start, sales, volume)
+        .where(*_filters(rarity, coat_color, hair_type),
+               rollups.hour_start > hour_start(now) - datetime.timedelta(hours=hours))
+        .group_by(rollups.hour_start)
+        .order_by(rollups.hour_start)
+    ).all()
+    return [
+        {"hour_start": start, "sales": count, "volume": total, "vwap": _vwap(count, total)}
+        for start, count, total in rows
+    ]
+
+
+def expire_rollups(db: Session, now: datetime.datetime = None) -> int:
+    """Delete rollups past retention. Does NOT commit."""
+    now = now or datetime.datetime.utcnow()
+    rollups = models.SaleRollup
+    return db.execute(
+        delete(rollups).where(rollups.hour_start < hour_start(now - ROLLUPS_KEPT))
+    ).rowcount
+
+
+# expire_rollups at most once per EXPIRY_INTERVAL in this process. Does NOT commit.
+expire_rollups_if_due = PeriodicExpiry(expire_rollups, EXPIRY_INTERVAL)
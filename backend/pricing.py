@@ -3,8 +3,25 @@ Pricing and Rarity System for Guinea Pig Genetics
 Calculates market value based on genetic rarity.
 """
 
+from types import SimpleNamespace
+from typing import NamedTuple
 from sqlalchemy.orm import Session
-from .import models
+from .import genotype, models
+from .market_stats import listing_key, update_listing
+from .price_history import price_stats, sale_key
+
+# calculate_market_adjusted_value: weight of the recent sale price, and how
+# many sales in the last 7 days it takes before the market is trusted at all
+MARKET_PRICE_WEIGHT = 0.5
+MIN_MARKET_SALES = 5
+
+# Base prices by tier
+TIER_BASE_PRICES = {
+    "Common": 100,
+    "Uncommon": 500,
+    "Rare": 2000,
+    "Legendary": 10000
+}
 
 
 class RarityCalculator:
@@ -40,6 +57,8 @@ class RarityCalculator:
             return {
                 "phenotype": f"{color_names.get(allele1, 'Unknown')} (pure)",
                 "genotype": coat_genotype,
+                "dominant": color_names.get(allele1, "Unknown"),
+                "secondary": None,
                 "is_pure": True,
                 "rarity_bonus": 5  # Pure colors are rarer
             }
@@ -51,6 +70,8 @@ class RarityCalculator:
         return {
             "phenotype": f"{color_names.get(dominant, 'Unknown')}-{color_names.get(recessive, 'Unknown')} mix",
             "genotype": coat_genotype,
+            "dominant": color_names.get(dominant, "Unknown"),
+            "secondary": color_names.get(recessive, "Unknown"),
             "is_pure": False,
             "rarity_bonus": 2  # Mixed colors are more common
         }
@@ -84,17 +105,9 @@ class RarityCalculator:
         Parse genetic code string into gene dictionary.
 
         Format: "coat_color:BB;hair_length:Hh;speed:Ff;endurance:Ee"
+        GeneticCode.encode writes "coat_color:B-B"; the dash is dropped.
         """
-        genes = {}
-        if not genetic_code:
-            return genes
-
-        for gene_pair in genetic_code.split(";"):
-            if ":" in gene_pair:
-                gene_name, alleles = gene_pair.split(":")
-                genes[gene_name.strip()] = alleles.strip()
-
-        return genes
+        return genotype.parse(genetic_code)
 
     @staticmethod
     def calculate_rarity_score(pet: models.Pet, db: Session) -> int:
@@ -196,41 +209,82 @@ class RarityCalculator:
             pet.rarity_score = RarityCalculator.calculate_rarity_score(pet, db)
             pet.rarity_tier = RarityCalculator.get_rarity_tier(pet.rarity_score)
 
-        # Base prices by tier
-        base_prices = {
-            "Common": 100,
-            "Uncommon": 500,
-            "Rare": 2000,
-            "Legendary": 10000
-        }
-
         tier = pet.rarity_tier or "Common"
-        base_price = base_prices.get(tier, 100)
+        base_price = TIER_BASE_PRICES.get(tier, 100)
 
         # 1. Stat multiplier (0.5x - 2.0x)
-        # Average of speed and endurance (0-100 range)
-        stat_avg = (pet.speed + pet.endurance) / 2
-        stat_multiplier = 0.5 + (stat_avg / 100) * 1.5  # ranges 0.5 to 2.0
+        stat_multiplier = RarityCalculator.stat_multiplier((pet.speed + pet.endurance) / 2)
 
         # 2. Coat color premium
         coat_info = RarityCalculator.get_coat_phenotype(pet.genetic_code or "")
-        if coat_info["is_pure"]:
-            color_multiplier = 1.5  # Pure colors are more valuable
-        else:
-            color_multiplier = 1.0
+        color_multiplier = RarityCalculator.color_multiplier(coat_info)
 
-        # 3. Hair type premium (fluffy is more desirable aesthetically)
+        # 3. Hair type premium
         hair_info = RarityCalculator.get_hair_type(pet.genetic_code or "")
-        if hair_info["is_fluffy"]:
-            hair_multiplier = 1.3
-        else:
-            hair_multiplier = 1.0
+        hair_multiplier = RarityCalculator.hair_multiplier(hair_info)
 
-        # Calculate final price
-        price = int(base_price * stat_multiplier * color_multiplier * hair_multiplier)
+        return RarityCalculator.price(base_price, stat_multiplier, color_multiplier, hair_multiplier)
+
+    @staticmethod
+    def stat_multiplier(stat_avg: float) -> float:
+        """Average of speed and endurance (0-100 range) mapped to 0.5x - 2.0x"""
+        return 0.5 + (stat_avg / 100) * 1.5
+
+    @staticmethod
+    def color_multiplier(coat_info: dict) -> float:
+        """Pure colors are more valuable"""
+        return 1.5 if coat_info["is_pure"] else 1.0
 
+    @staticmethod
+    def hair_multiplier(hair_info: dict) -> float:
+        """Fluffy is more desirable aesthetically"""
+        return 1.3 if hair_info["is_fluffy"] else 1.0
+
+    @staticmethod
+    def price(base_price: int, stat_multiplier: float, color_multiplier: float, hair_multiplier: float) -> int:
+        """Final price, at least 50 (multiplied in this order so every caller rounds alike)"""
+        price = int(base_price * stat_multiplier * color_multiplier * hair_multiplier)
         return max(price, 50)  # Minimum price of 50
 
+    @staticmethod
+    def phenotype_columns(genetic_code: str) -> dict:
+        """
+        Structured phenotype for the indexed Pet columns (coat_dominant,
+        coat_secondary, coat_is_pure, hair_genotype, genotype_packed).
+        """
+        coat_info = RarityCalculator.get_coat_phenotype(genetic_code or "")
+        hair_info = RarityCalculator.get_hair_type(genetic_code or "")
+        return {
+            "coat_dominant": coat_info["dominant"],
+            "coat_secondary": coat_info["secondary"],
+            "coat_is_pure": 1 if coat_info["is_pure"] else 0,
+            "hair_genotype": hair_info["genotype"],
+            "genotype_packed": genotype.pack_genetic_code(genetic_code),
+        }
+
+    @staticmethod
+    def store_phenotype(pet: models.Pet) -> None:
+        """
+        Fill the indexed phenotype columns from the pet's genetic code, so
+        marketplace filters are index seeks instead of substring matches on
+        color_phenotype.
+        """
+        for column, value in RarityCalculator.phenotype_columns(pet.genetic_code).items():
+            setattr(pet, column, value)
+
+    @staticmethod
+    def calculate_market_adjusted_value(pet: models.Pet, db: Session) -> int:
+        """
+        Market value blended with the 7-day VWAP of pets sold with the same
+        tier and phenotype (price_history.py). Falls back to the plain market
+        value until there have been MIN_MARKET_SALES such sales.
+        """
+        market_value = pet.market_value or RarityCalculator.calculate_market_value(pet, db)
+        recent = price_stats(db, *sale_key(pet))["windows"]["7d"]
+        if recent["sales"] < MIN_MARKET_SALES:
+            return market_value
+        return int(round((1 - MARKET_PRICE_WEIGHT) * market_value + MARKET_PRICE_WEIGHT * recent["vwap"]))
+
     @staticmethod
     def calculate_and_store_valuation(pet: models.Pet, db: Session) -> dict:
         """
@@ -243,12 +297,62 @@ class RarityCalculator:
         Returns:
             Dictionary with valuation details
         """
+        listed_before = listing_key(pet)
+
+        valuation = RarityCalculator.value_pet(pet)
+
+        db.add(pet)
+        # A listed pet's new tier/value moves it within the market stats
+        update_listing(db, listed_before, listing_key(pet))
+
+        return valuation
+
+    @staticmethod
+    def value_pet(pet: models.Pet) -> dict:
+        """
+        Set rarity, market value and phenotype fields of a pet with one parse of
+        its genetic code and one VALUATION_TABLE lookup. Pets without a code, or
+        with loci the table does not know, go through the formulas.
+        """
+        genes = genotype.parse(pet.genetic_code)
+        stat_avg = (pet.speed + pet.endurance) / 2
+        key = valuation_key(genes) if pet.genetic_code else None
+        if key is None:
+            return RarityCalculator.value_pet_by_formulas(pet)
+        entry = VALUATION_TABLE[key, stat_bucket(stat_avg)]
+
+        pet.rarity_score = entry.rarity_score
+        pet.rarity_tier = entry.rarity_tier
+        pet.market_value = RarityCalculator.price(
+            entry.base_price, RarityCalculator.stat_multiplier(stat_avg), entry.color_multiplier, entry.hair_multiplier
+        )
+        pet.color_phenotype = entry.color_phenotype
+        pet.hair_type = entry.hair_type
+        pet.coat_dominant = entry.coat_dominant
+        pet.coat_secondary = entry.coat_secondary
+        pet.coat_is_pure = entry.coat_is_pure
+        pet.hair_genotype = genes.get("hair_length", "HH")
+        pet.genotype_packed = key or None
+
+        return {
+            "rarity_score": pet.rarity_score,
+            "rarity_tier": pet.rarity_tier,
+            "market_value": pet.market_value,
+            "coat_color": entry.color_phenotype,
+            "hair_type": entry.hair_type,
+            "speed": pet.speed,
+            "endurance": pet.endurance
+        }
+
+    @staticmethod
+    def value_pet_by_formulas(pet: models.Pet) -> dict:
+        """value_pet computed straight from the formulas (the reference VALUATION_TABLE is built from)."""
         # Calculate rarity
-        pet.rarity_score = RarityCalculator.calculate_rarity_score(pet, db)
+        pet.rarity_score = RarityCalculator.calculate_rarity_score(pet, None)
         pet.rarity_tier = RarityCalculator.get_rarity_tier(pet.rarity_score)
 
         # Calculate market value
-        pet.market_value = RarityCalculator.calculate_market_value(pet, db)
+        pet.market_value = RarityCalculator.calculate_market_value(pet, None)
 
         # Get phenotypes
         coat_info = RarityCalculator.get_coat_phenotype(pet.genetic_code or "")
@@ -257,8 +361,7 @@ class RarityCalculator:
         # Update phenotype fields
         pet.color_phenotype = coat_info["phenotype"]
         pet.hair_type = hair_info["type"]
-
-        db.add(pet)
+        RarityCalculator.store_phenotype(pet)
 
         return {
             "rarity_score": pet.rarity_score,
@@ -269,3 +372,102 @@ class RarityCalculator:
             "speed": pet.speed,
             "endurance": pet.endurance
         }
+
+
+# =====================
+# VALUATION TABLE
+# =====================
+
+# The genotype space is tiny: every unordered genotype of the four packed loci
+# (each locus may also be missing) times the four stat bonus bands. The table is
+# built once at import by running the formulas above on a stand-in pet for each
+# entry, so a lookup gives exactly what the formulas would.
+
+# Lowest average stat of each bonus band in calculate_rarity_score
+STAT_BANDS = (0, 60, 70, 80)
+
+
+class ValuationEntry(NamedTuple):
+    rarity_score: int
+    rarity_tier: str
+    base_price: int
+    color_multiplier: float
+    hair_multiplier: float
+    color_phenotype: str
+    hair_type: str
+    coat_dominant: str
+    coat_secondary: str
+    coat_is_pure: int
+
+
+def stat_bucket(stat_avg: float) -> int:
+    """Index of the STAT_BANDS band an average stat falls in"""
+    bucket = 0
+    for i, floor in enumerate(STAT_BANDS):
+        if stat_avg >= floor:
+            bucket = i
+    return bucket
+
+
+def valuation_key(genes: dict):
+    """
+    Packed genotype of the loci present in a parsed genetic code, or None when
+    one of them is malformed (the formulas decide what those are worth).
+    """
+    packed = 0
+    for gene, _ in genotype.LOCI:
+        alleles = genes.get(gene)
+        if alleles is not None:
+            bits = genotype.packed_locus(gene, alleles)
+            if bits is None:
+                return None
+            packed |= bits
+    return packed
+
+
+def _locus_options(symbols: tuple) -> list:
+    """Each unordered genotype of a locus, plus None for "missing"."""
+    return [None] + [a + b for i, a in enumerate(symbols) for b in symbols[i:]]
+
+
+def _build_valuation_table() -> dict:
+    table = {}
+    options = [(gene, _locus_options(symbols)) for gene, symbols in genotype.LOCI]
+
+    def combinations(index, chosen):
+        if index == len(options):
+            yield dict(chosen)
+            return
+        gene, alleles = options[index]
+        for choice in alleles:
+            if choice is not None:
+                chosen[gene] = choice
+            yield from combinations(index + 1, chosen)
+            chosen.pop(gene, None)
+
+    for genes in combinations(0, {}):
+        code = ";".join(f"{gene}:{alleles[0]}-{alleles[1]}" for gene, alleles in genes.items())
+        # An empty code would mean "no genetics"; a stand-in unknown gene keeps every locus at its default
+        code = code or "unpacked:X-X"
+        coat_info = RarityCalculator.get_coat_phenotype(code)
+        hair_info = RarityCalculator.get_hair_type(code)
+        for bucket, stat in enumerate(STAT_BANDS):
+            stand_in = SimpleNamespace(genetic_code=code, speed=stat, endurance=stat)
+            score = RarityCalculator.calculate_rarity_score(stand_in, None)
+            tier = RarityCalculator.get_rarity_tier(score)
+            table[valuation_key(genes), bucket] = ValuationEntry(
+                rarity_score=score,
+                rarity_tier=tier,
+                base_price=TIER_BASE_PRICES.get(tier, 100),
+                color_multiplier=RarityCalculator.color_multiplier(coat_info),
+                hair_multiplier=RarityCalculator.hair_multiplier(hair_info),
+                color_phenotype=coat_info["phenotype"],
+                hair_type=hair_info["type"],
+                coat_dominant=coat_info["dominant"],
+                coat_secondary=coat_info["secondary"],
+                coat_is_pure=1 if coat_info["is_pure"] else 0,
+            )
+    return table
+
+
+VALUATION_TABLE = _build_valuation_table()
@@ -0,0 +1,400 @@
+"""
+Batch revaluation of the whole pet population.
+
+When the pricing rules change, every pet's rarity score, tier, market value
+and phenotype columns (the fields RarityCalculator.value_pet sets) have to be
+recomputed. Doing that one ORM object at a time costs a parse, a lookup and a
+flush per pet; this job instead:
+
+1. streams pets with a genetic code in pet id order, GG_REVALUATION_CHUNK at a
+   time, through Core selects (plain rows, no identity map)
+2. turns each chunk into numpy arrays of packed genotypes and stats and values
+   them all at once against VALUATION_TABLE laid out as flat arrays
+3. writes back only the pets whose valuation changed, with one executemany
+   UPDATE, and recomputes the market stats counters once if listed pets moved
+   (one aggregate query instead of an upsert pair per listing)
+
+Each chunk is one write transaction that also advances the RevaluationRun row
+(last_pet_id, counters, elapsed time), so an interrupted run - a stop, a
+crash, an error - resumes after the last committed chunk. Throughput is
+reported in pets per second.
+
+Genetic codes in the form the game writes (the four loci in order, any allele
+order) map straight to their packed genotype. Any other code is parsed like
+value_pet does, and codes with malformed loci go through the formulas, so the
+job writes exactly what value_pet would.
+
+Start it with POST /marketplace/revaluation or run it in the foreground with
+python -m backend.revaluation. numpy is imported when the job first values a
+chunk, so the server starts without it. Tunables (environment variables):
+
+- GG_REVALUATION_CHUNK  pets per chunk / transaction               (5000)
+- GG_REVALUATION_PAUSE  seconds between chunks, to let writes in    (0.0)
+"""
+
+import datetime
+import itertools
+import os
+import threading
+import time
+from types import SimpleNamespace
+from sqlalchemy import bindparam, func, select, update
+from .import genotype, models
+from .market_stats import rebuild_market_stats
+from .pricing import STAT_BANDS, VALUATION_TABLE, RarityCalculator, valuation_key
+from .write_queue import writer_session_factory
+
+
+class RevaluationConfig:
+    """Revaluation job settings, read from the environment once at import."""
+
+    def __init__(self):
+        self.chunk_size = int(os.environ.get("GG_REVALUATION_CHUNK", "5000"))
+        self.pause = float(os.environ.get("GG_REVALUATION_PAUSE", "0.0"))
+
+
+REVALUATION_CONFIG = RevaluationConfig()
+
+# The Pet columns value_pet sets, in the order value_chunk compares them
+VALUED_COLUMNS = ("rarity_score", "rarity_tier", "market_value", "color_phenotype", "hair_type",
+                  "coat_dominant", "coat_secondary", "coat_is_pure", "hair_genotype", "genotype_packed")
+
+_pets = models.Pet.__table__
+_chunk_columns = (_pets.c.id, _pets.c.genetic_code, _pets.c.speed, _pets.c.endurance,
+                  _pets.c.for_sale, _pets.c.asking_price) + tuple(_pets.c[name] for name in VALUED_COLUMNS)
+_first_valued = len(_chunk_columns) - len(VALUED_COLUMNS)
+_write_back = update(_pets).where(_pets.c.id == bindparam("pet_id")).values(
+    {name: bindparam(f"new_{name}") for name in VALUED_COLUMNS}
+)
+
+
+# =====================
+# VECTORIZED VALUATION
+# =====================
+
+def _code_keys() -> dict:
+    """
+    {genetic_code: (packed genotype, hair genotype)} for every code in the
+    form the game writes: the loci in LOCI order (each may be missing),
+    "gene:A-B" with the alleles in either order.
+    """
+    choices = [[None] + [(a, b) for a, b in itertools.product(symbols, repeat=2)] for _, symbols in genotype.LOCI]
+    keys = {}
+    for picks in itertools.product(*choices):
+        loci = [(gene, pair) for (gene, _), pair in zip(genotype.LOCI, picks) if pair]
+        if loci:
+            genes = {gene: a + b for gene, (a, b) in loci}
+            code = ";".join(f"{gene}:{a}-{b}" for gene, (a, b) in loci)
+            keys[code] = (valuation_key(genes), genes.get("hair_length", "HH"))
+    return keys
+
+
+_CODE_KEYS = _code_keys()
+
+
+class ValuationArrays:
+    """VALUATION_TABLE as flat numpy arrays, indexed by packed * len(STAT_BANDS) + band."""
+
+    def __init__(self, table=VALUATION_TABLE):
+        import numpy as np
+        self.entries = list(table.values())
+        self.index = np.full((1 << genotype.TOTAL_BITS) * len(STAT_BANDS), -1, dtype=np.int32)
+        for i, (packed, band) in enumerate(table):
+            self.index[packed * len(STAT_BANDS) + band] = i
+        self.base_price = np.array([entry.base_price for entry in self.entries], dtype=np.float64)
+        self.color_multiplier = np.array([entry.color_multiplier for entry in self.entries], dtype=np.float64)
+        self.hair_multiplier = np.array([entry.hair_multiplier for entry in self.entries], dtype=np.float64)
+        self.bands = np.array(STAT_BANDS, dtype=np.float64)
+
+    def value(self, packed, speed, endurance):
+        """
+        (entry indexes, market values) for arrays of packed genotypes and
+        stats. Same float operations in the same order as value_pet, so the
+        truncated prices match it exactly.
+        """
+        import numpy as np
+        stat_avg = (speed + endurance) / 2
+        band = np.maximum(np.searchsorted(self.bands, stat_avg, side="right") - 1, 0)
+        entry = self.index[packed * len(STAT_BANDS) + band]
+        stat_multiplier = 0.5 + (stat_avg / 100) * 1.5
+        price = self.base_price[entry] * stat_multiplier * self.color_multiplier[entry] * self.hair_multiplier[entry]
+        return entry, np.maximum(price.astype(np.int64), 50)
+
+
+_arrays = None
+
+
+def valuation_arrays() -> ValuationArrays:
+    global _arrays
+    if _arrays is None:
+        _arrays = ValuationArrays()
+    return _arrays
+
+
+def _by_formulas(row) -> tuple:
+    """VALUED_COLUMNS of a pet whose code the table cannot value."""
+    stand_in = SimpleNamespace(genetic_code=row.genetic_code, speed=row.speed, endurance=row.endurance)
+    RarityCalculator.value_pet_by_formulas(stand_in)
+    return tuple(getattr(stand_in, name) for name in VALUED_COLUMNS)
+
+
+def value_chunk(rows, arrays: ValuationArrays = None):
+    """
+    Revalue a chunk of pets rows (_chunk_columns). Returns the executemany
+    parameters of the pets whose valuation changed, and how many of them are
+    listed with a new tier or market value (their market stats moved).
+    """
+    arrays = arrays or valuation_arrays()
+    rows = [row for row in rows if row.speed is not None and row.endurance is not None]
+    keys, hair_genotypes = [], []
+    for row in rows:
+        known = _CODE_KEYS.get(row.genetic_code)
+        if known is None:
+            genes = genotype.parse(row.genetic_code)
+            known = (valuation_key(genes), genes.get("hair_length", "HH"))
+        keys.append(known[0])
+        hair_genotypes.append(known[1])
+
+    # Everything with a valuation key is valued at once; the rest row by row
+    by_table = [i for i, key in enumerate(keys) if key is not None]
+    entry_of, value_of = {}, {}
+    if by_table:
+        import numpy as np
+        count = len(by_table)
+        packed = np.fromiter((keys[i] for i in by_table), dtype=np.int64, count=count)
+        speed = np.fromiter((rows[i].speed for i in by_table), dtype=np.float64, count=count)
+        endurance = np.fromiter((rows[i].endurance for i in by_table), dtype=np.float64, count=count)
+        entries, values = arrays.value(packed, speed, endurance)
+        entry_of = dict(zip(by_table, entries.tolist()))
+        value_of = dict(zip(by_table, values.tolist()))
+
+    params, moved = [], 0
+    for i, row in enumerate(rows):
+        if i in entry_of:
+            entry = arrays.entries[entry_of[i]]
+            new = (entry.rarity_score, entry.rarity_tier, value_of[i], entry.color_phenotype, entry.hair_type,
+                   entry.coat_dominant, entry.coat_secondary, entry.coat_is_pure, hair_genotypes[i],
+                   keys[i] or None)
+        else:
+            new = _by_formulas(row)
+        old = tuple(row[_first_valued:])
+        if new == old:
+            continue
+        params.append({"pet_id": row.id, **{f"new_{name}": value for name, value in zip(VALUED_COLUMNS, new)}})
+        if row.for_sale == 1 and (new[1], new[2]) != (row.rarity_tier, row.market_value):
+            moved += 1
+    return params, moved
+
+
+# =====================
+# THE JOB
+# =====================
+
+def run_summary(run: models.RevaluationRun) -> dict:
+    """A RevaluationRun as the API reports it"""
+    seconds = (run.elapsed_ms or 0) / 1000
+    return {
+        "run_id": run.id,
+        "status": run.status,
+        "total_pets": run.total_pets,
+        "pets_done": run.pets_done,
+        "pets_changed": run.pets_changed,
+        "chunks": run.chunks,
+        "last_pet_id": run.last_pet_id,
+        "elapsed_seconds": round(seconds, 3),
+        "pets_per_second": round(run.pets_done / seconds, 1) if seconds else None,
+        "error": run.error,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+    }
+
+
+class RevaluationJob:
+    """Runs (or resumes) one revaluation pass, in the foreground or on a thread."""
+
+    def __init__(self, session_factory, config: RevaluationConfig = REVALUATION_CONFIG):
+        self.session_factory = session_factory
+        self.config = config
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {
+            "running": False,
+            "run_id": None,
+            "chunks": 0,
+            "pets_done": 0,
+            "pets_changed": 0,
+            "listings_moved": 0,
+            "pets_per_second": None,
+            "last_error": None,
+        }
+
+    # --- lifecycle ---
+
+    def start(self):
+        if self.running():
+            return
+        # Claim the run up front so its status is visible as soon as this returns
+        db = self.session_factory()
+        try:
+            self.metrics["run_id"] = self._current_run(db).id
+        finally:
+            db.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_logged, name="revaluation", daemon=True)
+        self.metrics["running"] = True
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop after the current chunk; the run stays resumable."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run_logged(self):
+        try:
+            self.run()
+        except Exception as e:
+            print(f"Revaluation job error: {e}")
+
+    # --- one pass ---
+
+    def run(self, max_chunks: int = None) -> dict:
+        """
+        Revalue every pet with a genetic code, continuing the latest run that
+        did not finish if there is one. Returns the run's summary.
+        """
+        self.metrics["running"] = True
+        db = self.session_factory()
+        run = None
+        try:
+            run = self._current_run(db)
+            self.metrics["run_id"] = run.id
+            done_ms = run.elapsed_ms or 0
+            spent = 0.0
+            chunks = 0
+            while not self._stop.is_set() and (max_chunks is None or chunks < max_chunks):
+                started = time.perf_counter()
+                if not self._run_chunk(db, run, done_ms, spent):
+                    run.status = "done"
+                    run.finished_at = datetime.datetime.utcnow()
+                    db.commit()
+                    break
+                spent += time.perf_counter() - started
+                chunks += 1
+                self.metrics["pets_per_second"] = round(run.pets_done / (run.elapsed_ms / 1000), 1) \
+                    if run.elapsed_ms else None
+                if self.config.pause:
+                    self._stop.wait(self.config.pause)
+            return run_summary(run)
+        except Exception as e:
+            db.rollback()
+            self.metrics["last_error"] = str(e)
+            if run is not None:
+                run.status = "failed"
+                run.error = str(e)
+                db.commit()
+            raise
+        finally:
+            db.close()
+            self.metrics["running"] = False
+
+    def _current_run(self, db) -> models.RevaluationRun:
+        runs = models.RevaluationRun
+        run = db.scalar(
+            select(runs).where(runs.status.in_(("running", "failed"))).order_by(runs.id.desc()).limit(1)
+        )
+        if run is None:
+            total = db.scalar(select(func.count()).select_from(_pets).where(
+                _pets.c.genetic_code.isnot(None), _pets.c.genetic_code != ""
+            ))
+            run = runs(status="running", total_pets=total)
+            db.add(run)
+        run.status = "running"
+        run.error = None
+        db.commit()
+        return run
+
+    def _run_chunk(self, db, run: models.RevaluationRun, done_ms: int, spent: float) -> bool:
+        """Revalue the next chunk and advance the run, in one transaction. False when nothing was left."""
+        started = time.perf_counter()
+        rows = db.execute(
+            select(*_chunk_columns)
+            .where(_pets.c.id > run.last_pet_id, _pets.c.genetic_code.isnot(None), _pets.c.genetic_code != "")
+            .order_by(_pets.c.id)
+            .limit(self.config.chunk_size)
+            .with_for_update()
+        ).all()
+        if not rows:
+            return False
+
+        params, moved = value_chunk(rows)
+        if params:
+            db.execute(_write_back, params)
+        if moved:
+            rebuild_market_stats(db)
+
+        run.last_pet_id = rows[-1].id
+        run.pets_done += len(rows)
+        run.pets_changed += len(params)
+        run.chunks += 1
+        run.updated_at = datetime.datetime.utcnow()
+        run.elapsed_ms = done_ms + int((spent + time.perf_counter() - started) * 1000)
+        db.commit()
+
+        self.metrics["chunks"] += 1
+        self.metrics["pets_done"] += len(rows)
+        self.metrics["pets_changed"] += len(params)
+        self.metrics["listings_moved"] += moved
+        return True
+
+
+_job = None
+_job_lock = threading.Lock()
+
+
+def start_revaluation() -> RevaluationJob:
+    """Start (or resume) a revaluation pass on a background thread; no-op while one is running."""
+    global _job
+    with _job_lock:
+        if _job is None:
+            _job = RevaluationJob(writer_session_factory())
+        _job.start()
+        return _job
+
+
+def revaluation_status(db) -> dict:
+    """Summary of the latest run, with the live counters of this process's job."""
+    runs = models.RevaluationRun
+    run = db.scalar(select(runs).order_by(runs.id.desc()).limit(1))
+    return {
+        "run": run_summary(run) if run is not None else None,
+        "job": dict(_job.metrics) if _job is not None else None,
+    }
+
+
+def resume_revaluation(db) -> None:
+    """Continue at startup a run the previous process did not finish."""
+    runs = models.RevaluationRun
+    if db.execute(select(runs.id).where(runs.status == "running").limit(1)).first():
+        start_revaluation()
+
+
+def stop_revaluation() -> None:
+    global _job
+    with _job_lock:
+        if _job is not None:
+            _job.stop()
+            _job = None
+
+
+if __name__ == "__main__":
+    from .db_connect import SessionLocal, engine
+    from .migrations import run_migrations
+
+    run_migrations(engine, SessionLocal)
+    summary = RevaluationJob(writer_session_factory()).run()
+    print(f"Revaluation run {summary['run_id']} {summary['status']}: {summary['pets_done']} pets, "
+          f"{summary['pets_changed']} changed, {summary['pets_per_second']} pets/s")
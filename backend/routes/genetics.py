@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..db_connect import get_db
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import traceback
 from .. import models, schemas
+from ..pricing import RarityCalculator
 import random
 
 # --- IMPORT PARENT DIRECTORY ---
@@ -13,10 +14,14 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # ------------------------------------
 
-from ..genetics import BreedingEngine, GeneticCode, PunnettSquare, initialize_genetics_system
+from ..genetics import (BreedingEngine, GeneticCode, PunnettSquare, gene_registry, initialize_genetics_system,
+                        reload_gene_registry)
 
 router = APIRouter(prefix="/genetics", tags=["Genetics"])
 
+# 3 Minutes between litters
+BREEDING_COOLDOWN_SECONDS = 180
+
 # =====================
 # GENE ENDPOINTS
 # =====================
@@ -38,6 +43,7 @@ def create_gene(gene: schemas.GeneCreate, db: Session = Depends(get_db)):
     db_gene = models.Gene(name=gene.name, trait=gene.trait, description=gene.description)
     db.add(db_gene)
     db.commit()
+    reload_gene_registry(db)
     db.refresh(db_gene)
     return db_gene
 
@@ -71,6 +77,7 @@ def create_allele(allele: schemas.AlleleCreate, db: Session = Depends(get_db)):
     )
     db.add(db_allele)
     db.commit()
+    reload_gene_registry(db)
     db.refresh(db_allele)
     return db_allele
 
@@ -105,7 +112,8 @@ def create_pet_genetics(genetics: schemas.PetGeneticsCreate, db: Session = Depen
     db.refresh(db_genetics)
 
     all_genetics = db.query(models.PetGenetics).filter(models.PetGenetics.pet_id == genetics.pet_id).all()
-    pet.genetic_code = GeneticCode.encode(all_genetics)
+    pet.genetic_code = GeneticCode.encode(all_genetics, gene_registry(db))
+    RarityCalculator.store_phenotype(pet)
     db.commit()
 
     return db_genetics
@@ -147,13 +155,14 @@ def breed_pets(breeding_request: schemas.BreedingRequest, db: Session = Depends(
         if not parent1 or not parent2:
             raise HTTPException(status_code=404, detail="One or both parents not found")
 
-        # 2. Check Cooldowns
-        if parent1.breeding_cooldown > 0 or parent2.breeding_cooldown > 0:
+        # 2. Check Cooldowns (expiry timestamps, nothing counts down in the DB)
+        now = datetime.utcnow()
+        if any(p.breedable_at and p.breedable_at > now for p in (parent1, parent2)):
              raise HTTPException(status_code=400, detail="Parents are on cooldown!")
 
-        # 3. Set Cooldowns (3 Minutes = 180 Seconds)
-        parent1.breeding_cooldown = 180
-        parent2.breeding_cooldown = 180
+        # 3. Set Cooldowns
+        parent1.breedable_at = now + timedelta(seconds=BREEDING_COOLDOWN_SECONDS)
+        parent2.breedable_at = now + timedelta(seconds=BREEDING_COOLDOWN_SECONDS)
         
         # 4. Generate Babies
         outcomes = [] 
@@ -162,10 +171,12 @@ def breed_pets(breeding_request: schemas.BreedingRequest, db: Session = Depends(
         for i in range(litter_size):
             # Mix Species & Color (Random 50/50 split)
             baby_species = parent1.species if random.random() > 0.5 else parent2.species
-            baby_color = parent1.color if random.random() > 0.5 else parent2.color
+            color_parent = parent1 if random.random() > 0.5 else parent2
+            baby_color = color_parent.color
             
             # Inherit Hair Type (Random 50/50 split)
-            baby_hair = parent1.hair_type if random.random() > 0.5 else parent2.hair_type
+            hair_parent = parent1 if random.random() > 0.5 else parent2
+            baby_hair = hair_parent.hair_type
             if not baby_hair: baby_hair = "Short" 
 
             # Create Pet in DB
@@ -176,6 +187,11 @@ def breed_pets(breeding_request: schemas.BreedingRequest, db: Session = Depends(
                 color=baby_color,
                 color_phenotype=baby_color,
                 hair_type=baby_hair,
+                # Babies carry no genetic code; the indexed phenotype follows the parent it came from
+                coat_dominant=color_parent.coat_dominant,
+                coat_secondary=color_parent.coat_secondary,
+                coat_is_pure=color_parent.coat_is_pure,
+                hair_genotype=hair_parent.hair_genotype,
                 health=100,
                 happiness=100,
                 hunger=0,
@@ -184,8 +200,7 @@ def breed_pets(breeding_request: schemas.BreedingRequest, db: Session = Depends(
                 market_value=100,
                 rarity_tier="Common",
                 speed=int((parent1.speed + parent2.speed) / 2),
-                endurance=int((parent1.endurance + parent2.endurance) / 2),
-                breeding_cooldown=0
+                endurance=int((parent1.endurance + parent2.endurance) / 2)
             )
             
             db.add(new_pet)
@@ -229,6 +244,9 @@ def breed_pets(breeding_request: schemas.BreedingRequest, db: Session = Depends(
         db.commit()
         return outcomes 
 
+    except HTTPException:
+        db.rollback()
+        raise
     except ValueError as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,50 +1,43 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..db_connect import get_db
+from ..db_connect import get_db, get_async_db
 from ..import models, schemas
+from ..upserts import upsert
+from ..write_queue import run_write
 
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
 
 @router.post("/", response_model=schemas.Inventory)
 def add_inventory_item(item: schemas.InventoryCreate, db: Session = Depends(get_db)):
     """Add an item to user's inventory"""
+    return run_write(db, _add_inventory_item, item)
+
+def _add_inventory_item(db: Session, item: schemas.InventoryCreate):
     # Verify user exists
     user = db.query(models.User).filter(models.User.id == item.user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Check if item already exists in inventory
-    existing_item = db.query(models.Inventory).filter(
-        models.Inventory.user_id == item.user_id,
-        models.Inventory.item_name == item.item_name
-    ).first()
-
-    if existing_item:
-        existing_item.quantity += item.quantity
-        db.commit()
-        db.refresh(existing_item)
-        return existing_item
-
-    # Create new inventory entry
-    db_item = models.Inventory(
-        user_id=item.user_id,
-        item_name=item.item_name,
-        quantity=item.quantity
+    # New stack, or add to the existing one (a single statement, so concurrent adds can't duplicate it)
+    return upsert(
+        db, models.Inventory,
+        {"user_id": item.user_id, "item_name": item.item_name, "quantity": item.quantity},
+        key=["user_id", "item_name"],
+        on_conflict=lambda excluded: {"quantity": models.Inventory.quantity + excluded.quantity},
     )
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-    return db_item
 
 @router.get("/{user_id}", response_model=list[schemas.Inventory])
-def get_user_inventory(user_id: int, db: Session = Depends(get_db)):
+async def get_user_inventory(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get all items in a user's inventory"""
     # Verify user exists
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return db.query(models.Inventory).filter(models.Inventory.user_id == user_id).all()
+    result = await db.execute(select(models.Inventory).where(models.Inventory.user_id == user_id))
+    return result.scalars().all()
 
 @router.get("/{user_id}/{item_name}", response_model=schemas.Inventory)
 def get_inventory_item(user_id: int, item_name: str, db: Session = Depends(get_db)):
@@ -1,17 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from ..db_connect import get_db
+from sqlalchemy import delete, select, tuple_, update
+from ..db_connect import get_db, get_async_db
 from ..import models, schemas
+from ..leaderboard_counts import move_score, players_ahead, players_on_score, total_players
+from ..upserts import insert_if_missing
+from ..write_queue import run_write
+from ..score_buckets import PERIODS, record_score, top_buckets, user_bucket
+import datetime
 
 router = APIRouter(prefix="/leaderboard", tags=["Leaderboard"])
 
-def update_leaderboard_ranks(db: Session):
-    """Update all leaderboard ranks based on scores"""
-    leaderboard_entries = db.query(models.Leaderboard).order_by(desc(models.Leaderboard.score)).all()
-    for rank, entry in enumerate(leaderboard_entries, 1):
-        entry.rank = rank
-    db.commit()
+# =====================
+# RANKS (computed on read)
+# =====================
+# Ranks are never stored: a score write touches one row (plus its score index
+# entry and its rank counters, see leaderboard_counts.py) instead of
+# re-ranking every player. Tied scores share a rank (1, 2, 2, 4).
+# Writes take the old score from the row they change (RETURNING, or a row
+# lock), never from an earlier SELECT, so two concurrent writes for one player
+# cannot both move that player's counters.
+
+# Highest score first; newest entry first within a tie (a plain reverse walk of the score index)
+BY_SCORE = (models.Leaderboard.score.desc(), models.Leaderboard.id.desc())
+
+def with_rank(entry, rank: int, schema=schemas.Leaderboard):
+    ranked = schema.model_validate(entry)
+    ranked.rank = rank
+    return ranked
+
+def rank_entry(db: Session, entry: models.Leaderboard) -> schemas.Leaderboard:
+    return with_rank(entry, 1 + players_ahead(db, entry.score))
+
+def rank_page(entries, first_rank: int = 1, schema=schemas.Leaderboard, first_position: int = None) -> list:
+    """
+    Ranks for entries already sorted by score (highest first), the first one holding first_rank.
+    first_position is how many entries precede the first one overall; it only differs
+    from first_rank - 1 when the page starts partway through a tie.
+    """
+    if first_position is None:
+        first_position = first_rank - 1
+    ranked = []
+    rank = first_rank
+    for position, entry in enumerate(entries):
+        if position and entry.score < entries[position - 1].score:
+            rank = first_position + position + 1
+        ranked.append(with_rank(entry, rank, schema))
+    return ranked
 
 @router.post("/", response_model=schemas.Leaderboard)
 def create_leaderboard_entry(entry: schemas.LeaderboardCreate, db: Session = Depends(get_db)):
@@ -21,38 +57,44 @@ def create_leaderboard_entry(entry: schemas.LeaderboardCreate, db: Session = Dep
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Check if user already has a leaderboard entry
-    existing_entry = db.query(models.Leaderboard).filter(models.Leaderboard.user_id == entry.user_id).first()
-    if existing_entry:
-        existing_entry.score = entry.score
-        db.commit()
-        db.refresh(existing_entry)
-    else:
-        db_entry = models.Leaderboard(
-            user_id=entry.user_id,
-            score=entry.score
-        )
-        db.add(db_entry)
-        db.commit()
-        db.refresh(db_entry)
-        existing_entry = db_entry
-
-    # Update all ranks
-    update_leaderboard_ranks(db)
-    db.refresh(existing_entry)
-    return existing_entry
+    now = datetime.datetime.utcnow()
+    # Create the entry; the insert also takes the write lock on SQLite
+    existing_entry = insert_if_missing(
+        db, models.Leaderboard,
+        {"user_id": entry.user_id, "score": entry.score, "updated_at": now},
+        key=["user_id"],
+    )
+    before = None
+    if existing_entry is None:
+        # Or overwrite the score of the existing one, reading the old score under a row lock
+        before = db.execute(
+            select(models.Leaderboard.score)
+            .where(models.Leaderboard.user_id == entry.user_id)
+            .with_for_update()
+        ).scalar()
+        existing_entry = db.scalars(
+            update(models.Leaderboard)
+            .where(models.Leaderboard.user_id == entry.user_id)
+            .values(score=entry.score, updated_at=now)
+            .returning(models.Leaderboard),
+            execution_options={"populate_existing": True},
+        ).one()
+    move_score(db, before, existing_entry.score)
+    db.commit()
+    return rank_entry(db, existing_entry)
 
 @router.get("/", response_model=list[schemas.Leaderboard])
-def get_leaderboard(limit: int = 100, db: Session = Depends(get_db)):
+async def get_leaderboard(limit: int = 100, db: AsyncSession = Depends(get_async_db)):
     """Get the complete leaderboard sorted by rank"""
-    return db.query(models.Leaderboard).order_by(models.Leaderboard.rank).limit(limit).all()
+    result = await db.execute(select(models.Leaderboard).order_by(*BY_SCORE).limit(limit))
+    return rank_page(result.scalars().all())
 
 @router.get("/top/{limit}", response_model=list[schemas.Leaderboard])
 def get_top_players(limit: int = 10, db: Session = Depends(get_db)):
     """Get top N players"""
     if limit <= 0:
         raise HTTPException(status_code=400, detail="Limit must be positive")
-    return db.query(models.Leaderboard).order_by(models.Leaderboard.rank).limit(limit).all()
+    return rank_page(db.query(models.Leaderboard).order_by(*BY_SCORE).limit(limit).all())
 
 @router.get("/user/{user_id}", response_model=schemas.Leaderboard)
 def get_user_rank(user_id: int, db: Session = Depends(get_db)):
@@ -60,34 +102,110 @@ def get_user_rank(user_id: int, db: Session = Depends(get_db)):
     entry = db.query(models.Leaderboard).filter(models.Leaderboard.user_id == user_id).first()
     if not entry:
         raise HTTPException(status_code=404, detail="User not found on leaderboard")
-    return entry
+    return rank_entry(db, entry)
+
+@router.get("/user/{user_id}/around", response_model=schemas.LeaderboardNeighborhood)
+def get_user_neighborhood(user_id: int, k: int = 5, db: Session = Depends(get_db)):
+    """The k players ranked just above and just below a user, plus the user's percentile"""
+    if not 1 <= k <= 50:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 50")
+    entry = db.query(models.Leaderboard).filter(models.Leaderboard.user_id == user_id).first()
+    if not entry:
+        raise HTTPException(status_code=404, detail="User not found on leaderboard")
+
+    # Keyset seeks on the score index from the user's (score, id) in both directions
+    key = tuple_(models.Leaderboard.score, models.Leaderboard.id)
+    here = tuple_(entry.score, entry.id)
+    above = db.query(models.Leaderboard).filter(key > here).order_by(
+        models.Leaderboard.score.asc(), models.Leaderboard.id.asc()
+    ).limit(k).all()
+    below = db.query(models.Leaderboard).filter(key < here).order_by(*BY_SCORE).limit(k).all()
+    window = above[::-1] + [entry] + below
+
+    # Rank of the window's first entry from the rank counters. The window may
+    # start partway through a tie; the rest of that tie precedes it
+    first = window[0]
+    ahead_of_first = players_ahead(db, first.score)
+    tied_in_window = sum(1 for ranked in window if ranked.score == first.score)
+    tied_before_first = max(players_on_score(db, first.score) - tied_in_window, 0)
+    entries = rank_page(window, 1 + ahead_of_first, first_position=ahead_of_first + tied_before_first)
+
+    rank = entries[len(above)].rank
+    # Counter row; never below the rank just computed, even before a rebuild
+    total = max(total_players(db), rank)
+    return {
+        "user_id": user_id,
+        "rank": rank,
+        # Share of players this user scores at least as well as
+        "percentile": round(100 * (total - rank + 1) / total, 1),
+        "total_players": total,
+        "entries": entries,
+    }
 
 @router.put("/user/{user_id}", response_model=schemas.Leaderboard)
 def update_user_score(user_id: int, score_update: int, db: Session = Depends(get_db)):
     """Update a user's score (add to existing score)"""
-    entry = db.query(models.Leaderboard).filter(models.Leaderboard.user_id == user_id).first()
+    entry = db.scalars(
+        update(models.Leaderboard)
+        .where(models.Leaderboard.user_id == user_id)
+        .values(score=models.Leaderboard.score + score_update)
+        .returning(models.Leaderboard),
+        execution_options={"populate_existing": True},
+    ).first()
     if not entry:
         raise HTTPException(status_code=404, detail="User not found on leaderboard")
 
-    entry.score += score_update
+    move_score(db, entry.score - score_update, entry.score)
     db.commit()
-    db.refresh(entry)
-
-    # Update all ranks
-    update_leaderboard_ranks(db)
-    db.refresh(entry)
-    return entry
+    return rank_entry(db, entry)
 
 @router.delete("/user/{user_id}")
 def remove_from_leaderboard(user_id: int, db: Session = Depends(get_db)):
     """Remove a user from the leaderboard"""
-    entry = db.query(models.Leaderboard).filter(models.Leaderboard.user_id == user_id).first()
-    if not entry:
+    removed = db.execute(
+        delete(models.Leaderboard).where(models.Leaderboard.user_id == user_id).returning(models.Leaderboard.score)
+    ).first()
+    if not removed:
         raise HTTPException(status_code=404, detail="User not found on leaderboard")
 
-    db.delete(entry)
+    move_score(db, removed.score, None)
     db.commit()
-
-    # Update all ranks
-    update_leaderboard_ranks(db)
     return {"message": "User removed from leaderboard"}
+
+
+# =====================
+# PER-GAME WINDOWED LEADERBOARDS
+# =====================
+
+def check_period(period: str):
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"Period must be one of {', '.join(PERIODS)}")
+
+@router.post("/games/{game_id}/scores", response_model=schemas.ScoreEvent)
+def submit_game_score(game_id: int, event: schemas.ScoreEventCreate, db: Session = Depends(get_db)):
+    """Record a finished mini-game run for the daily, weekly and all-time boards"""
+    return run_write(db, _submit_game_score, game_id, event)
+
+def _submit_game_score(db: Session, game_id: int, event: schemas.ScoreEventCreate):
+    if not db.get(models.MiniGame, game_id):
+        raise HTTPException(status_code=404, detail="Mini-game not found")
+    if not db.get(models.User, event.user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    return record_score(db, game_id, event.user_id, event.score)
+
+@router.get("/games/{game_id}", response_model=list[schemas.GameLeaderboardEntry])
+def get_game_leaderboard(game_id: int, period: str = "all", limit: int = 100, db: Session = Depends(get_db)):
+    """Top players of a mini-game for the current day, week, or all time"""
+    check_period(period)
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="Limit must be positive")
+    return rank_page(top_buckets(db, game_id, period, limit), schema=schemas.GameLeaderboardEntry)
+
+@router.get("/games/{game_id}/user/{user_id}", response_model=schemas.GameLeaderboardEntry)
+def get_game_rank(game_id: int, user_id: int, period: str = "all", db: Session = Depends(get_db)):
+    """A player's score and rank in a mini-game window"""
+    check_period(period)
+    bucket, rank = user_bucket(db, game_id, user_id, period)
+    if not bucket:
+        raise HTTPException(status_code=404, detail="User has no score in this window")
+    return with_rank(bucket, rank, schemas.GameLeaderboardEntry)
@@ -3,11 +3,23 @@ Marketplace API Routes
 Handles pet trading, valuation, and portfolio management
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import base64
+import datetime
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, or_, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..db_connect import get_db
-from ..import models, schemas
+from ..db_connect import get_db, get_async_db
+from ..import genotype, models, schemas
+from ..market_stats import listing_key, tier_stats, update_listing
+from ..offspring import offspring_engine
+from ..order_book import get_order_book
 from ..pricing import RarityCalculator
+from ..price_history import MAX_HISTORY_HOURS, hourly_history, price_stats
+from ..revaluation import revaluation_status, start_revaluation
+from ..trades import TradeRejected, settle_sale
+from ..write_queue import run_write
 
 router = APIRouter(prefix="/marketplace", tags=["Marketplace"])
 
@@ -41,6 +53,9 @@ def get_pet_valuation(pet_id: int, db: Session = Depends(get_db)):
             "endurance": pet.endurance
         }
 
+    # What recent sales of the same tier and phenotype say it is worth
+    valuation["market_adjusted_value"] = RarityCalculator.calculate_market_adjusted_value(pet, db)
+
     # Add ownership info
     valuation["pet_id"] = pet_id
     valuation["pet_name"] = pet.name
@@ -49,11 +64,29 @@ def get_pet_valuation(pet_id: int, db: Session = Depends(get_db)):
     return valuation
 
 
+@router.post("/revaluation")
+def start_batch_revaluation(db: Session = Depends(get_db)):
+    """
+    Recompute rarity, market value and phenotype of every pet with genetics
+    (after a pricing rule change) on a background job. Continues an unfinished
+    run instead of starting over; does nothing while one is running.
+    """
+    start_revaluation()
+    return revaluation_status(db)
+
+
+@router.get("/revaluation")
+def get_batch_revaluation(db: Session = Depends(get_db)):
+    """Progress and throughput (pets per second) of the latest revaluation run"""
+    return revaluation_status(db)
+
+
 @router.get("/compare-breeding")
 def compare_breeding_value(parent1_id: int, parent2_id: int, db: Session = Depends(get_db)):
     """
-    Analyze breeding potential and predict offspring value ranges.
-    Shows all 4 possible offspring outcomes with estimated values.
+    Analyze breeding potential: the exact offspring distribution of the pair
+    over all loci (offspring.py) - genotype odds per locus, and probability,
+    expected value and value range of every phenotype and rarity tier.
     """
     parent1 = db.query(models.Pet).filter(models.Pet.id == parent1_id).first()
     parent2 = db.query(models.Pet).filter(models.Pet.id == parent2_id).first()
@@ -61,31 +94,37 @@ def compare_breeding_value(parent1_id: int, parent2_id: int, db: Session = Depen
     if not parent1 or not parent2:
         raise HTTPException(status_code=404, detail="One or both parents not found")
 
-    # Get parent valuations
+    # Get parent valuations (also refreshes their packed genotypes)
     p1_val = RarityCalculator.calculate_and_store_valuation(parent1, db)
     p2_val = RarityCalculator.calculate_and_store_valuation(parent2, db)
 
-    # Simulate 4 possible offspring based on Mendelian inheritance
-    # For coat_color, hair_length, speed, endurance genes
-    offspring_outcomes = []
-
-    for i in range(4):  # 4 possible combinations from Punnett squares
-        # Simplified: show possible phenotypes
-        outcome = {
-            "outcome": i + 1,
-            "coat_colors": _get_possible_coat_colors(parent1.genetic_code, parent2.genetic_code),
-            "hair_types": _get_possible_hair_types(parent1.genetic_code, parent2.genetic_code),
-            "estimated_min_value": int(parent1.market_value * 0.7),  # Conservative estimate
-            "estimated_max_value": int(max(parent1.market_value, parent2.market_value) * 1.2),
-            "probability": 0.25  # Equal probability for each outcome
-        }
-        offspring_outcomes.append(outcome)
+    if parent1.genotype_packed is None or parent2.genotype_packed is None:
+        raise HTTPException(status_code=400, detail="One or both parents lack genetic information")
+
+    offspring = offspring_engine(db).distribution(parent1.genotype_packed, parent2.genotype_packed)
 
     return {
         "parent1": {"id": parent1_id, "name": parent1.name, "valuation": p1_val},
         "parent2": {"id": parent2_id, "name": parent2.name, "valuation": p2_val},
-        "possible_offspring": offspring_outcomes,
-        "average_offspring_value": int(sum(o["estimated_max_value"] for o in offspring_outcomes) / len(offspring_outcomes))
+        "possible_offspring": [
+            {
+                "outcome": i,
+                "coat_color": coat_color,
+                "hair_type": hair_type,
+                "probability": probability,
+                "expected_value": round(expected_value, 2),
+                "estimated_min_value": min_value,
+                "estimated_max_value": max_value
+            }
+            for i, (coat_color, hair_type, probability, expected_value, min_value, max_value)
+            in enumerate(offspring.phenotypes, 1)
+        ],
+        "genotypes": {gene: dict(odds) for gene, odds in offspring.loci},
+        "rarity_tiers": dict(offspring.rarity_tiers),
+        "expected_offspring_value": round(offspring.expected_market_value, 2),
+        "average_offspring_value": int(round(offspring.expected_market_value)),
+        "min_offspring_value": offspring.min_market_value,
+        "max_offspring_value": offspring.max_market_value
     }
 
 
@@ -106,6 +145,11 @@ def list_pet_for_sale(pet_id: int, asking_price: int, db: Session = Depends(get_
     if asking_price <= 0:
         raise HTTPException(status_code=400, detail="Asking price must be greater than 0")
 
+    if _open_auction(db, pet_id):
+        raise HTTPException(status_code=400, detail="Pet is up for auction")
+
+    listed_before = listing_key(pet)
+
     # Check if already listed
     existing_listing = db.query(models.PetMarketplace).filter(
         models.PetMarketplace.pet_id == pet_id
@@ -126,6 +170,7 @@ def list_pet_for_sale(pet_id: int, asking_price: int, db: Session = Depends(get_
     # Update pet status
     pet.for_sale = 1
     pet.asking_price = asking_price
+    update_listing(db, listed_before, listing_key(pet))
 
     db.commit()
 
@@ -148,6 +193,8 @@ def unlist_pet_from_sale(pet_id: int, db: Session = Depends(get_db)):
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
 
+    listed_before = listing_key(pet)
+
     # Remove marketplace listing
     listing = db.query(models.PetMarketplace).filter(
         models.PetMarketplace.pet_id == pet_id
@@ -159,6 +206,7 @@ def unlist_pet_from_sale(pet_id: int, db: Session = Depends(get_db)):
     # Update pet status
     pet.for_sale = 0
     pet.asking_price = None
+    update_listing(db, listed_before, None)
 
     db.commit()
 
@@ -169,61 +217,151 @@ def unlist_pet_from_sale(pet_id: int, db: Session = Depends(get_db)):
 # BROWSING & PURCHASING
 # =====================
 
-@router.get("/listings")
-def get_marketplace_listings(
-    rarity: str = Query(None),
-    min_price: int = Query(None),
-    max_price: int = Query(None),
-    coat_color: str = Query(None),
-    hair_type: str = Query(None),
-    sort_by: str = Query("price_asc"),
-    db: Session = Depends(get_db)
-):
+# Sort orders for /listings: (column, descending). Every order breaks ties on
+# Pet.id in the same direction, so (column, id) is a strict keyset.
+LISTING_SORTS = {
+    "price_asc": (models.Pet.asking_price, False),
+    "price_desc": (models.Pet.asking_price, True),
+    "rarity": (models.Pet.rarity_score, True),
+    "value": (models.Pet.market_value, True),
+}
+MAX_LISTINGS_PAGE = 200
+
+def encode_listing_cursor(sort_by: str, value: int, pet_id: int) -> str:
+    raw = json.dumps({"sort": sort_by, "value": value, "id": pet_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_listing_cursor(cursor: str, sort_by: str):
+    """(value, pet_id) the next page starts after."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if data["sort"] != sort_by:
+            raise ValueError("cursor belongs to another sort order")
+        return data["value"], int(data["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+def coat_color_page(query, color: str, sort_column, order: tuple, limit: int):
     """
-    Browse available pets for sale.
-
-    Query parameters:
-    - rarity: "Common", "Uncommon", "Rare", "Legendary"
-    - min_price, max_price: Price range
-    - coat_color: Filter by color (Brown, Orange, White, mix)
-    - hair_type: "short" or "fluffy"
-    - sort_by: "price_asc", "price_desc", "rarity", "value"
+    The page of a listings query restricted to pets with `color` as their
+    dominant or secondary coat, as a subquery of (id, sort column). An OR of
+    the two columns makes SQLite walk every listing, so each column gets its
+    own branch on its (for_sale, coat column, asking_price, id) index and the
+    page is the first `limit` rows of their ordered UNION ALL. Pure coats have
+    no secondary, so the branches never overlap.
     """
-    query = db.query(models.Pet, models.PetMarketplace).join(
-        models.PetMarketplace,
-        models.Pet.id == models.PetMarketplace.pet_id
-    )
+    branches = [
+        query.filter(models.Pet.coat_dominant == color),
+        query.filter(models.Pet.coat_secondary == color, models.Pet.coat_dominant != color),
+    ]
+    return union_all(*(
+        branch.with_only_columns(models.Pet.id, sort_column) for branch in branches
+    )).order_by(*order).limit(limit).subquery()
+
+
+def listings_query(rarity: str = None, min_price: int = None, max_price: int = None, coat_color: str = None,
+                   hair_type: str = None, genotype_code: str = None, sort_by: str = "price_asc",
+                   limit: int = 50, cursor: str = None):
+    """The /listings statement for one page (plus one row to detect the next page)."""
+    sort_column, descending = LISTING_SORTS[sort_by]
+
+    # The page is picked from the pets alone, walking their (for_sale,
+    # [rarity_tier,] sort column, id) index; the listing row is only joined
+    # for the pets on this page
+    query = select(models.Pet).where(models.Pet.for_sale == 1)
 
     # Apply filters
     if rarity:
         query = query.filter(models.Pet.rarity_tier == rarity)
 
     if min_price is not None:
-        query = query.filter(models.PetMarketplace.asking_price >= min_price)
+        query = query.filter(models.Pet.asking_price >= min_price)
 
     if max_price is not None:
-        query = query.filter(models.PetMarketplace.asking_price <= max_price)
+        query = query.filter(models.Pet.asking_price <= max_price)
 
     if hair_type:
         query = query.filter(models.Pet.hair_type == hair_type)
 
+    color = None
     if coat_color:
-        # Search in color_phenotype field
-        query = query.filter(models.Pet.color_phenotype.contains(coat_color))
+        # Indexed phenotype columns (see RarityCalculator.store_phenotype)
+        if coat_color.lower() == "mix":
+            query = query.filter(models.Pet.coat_is_pure == 0)
+        elif coat_color.lower() == "pure":
+            query = query.filter(models.Pet.coat_is_pure == 1)
+        else:
+            color = coat_color.capitalize()  # either coat column, merged below
+
+    if genotype_code:
+        # Integer comparisons on the packed genotype (see genotype.py)
+        try:
+            query = query.filter(genotype.genotype_filter(models.Pet.genotype_packed, genotype.parse(genotype_code)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid genotype: {e}")
+
+    # Resume after the last pet of the previous page
+    if cursor:
+        value, pet_id = decode_listing_cursor(cursor, sort_by)
+        key = tuple_(sort_column, models.Pet.id)
+        query = query.filter(key < tuple_(value, pet_id) if descending else key > tuple_(value, pet_id))
 
     # Apply sorting
-    if sort_by == "price_desc":
-        query = query.order_by(models.PetMarketplace.asking_price.desc())
-    elif sort_by == "rarity":
-        # Order: Legendary > Rare > Uncommon > Common
-        tier_order = {"Legendary": 4, "Rare": 3, "Uncommon": 2, "Common": 1}
-        query = query.order_by(models.Pet.rarity_score.desc())
-    elif sort_by == "value":
-        query = query.order_by(models.Pet.market_value.desc())
-    else:  # price_asc (default)
-        query = query.order_by(models.PetMarketplace.asking_price.asc())
-
-    listings = query.all()
+    if descending:
+        order = (sort_column.desc(), models.Pet.id.desc())
+    else:
+        order = (sort_column.asc(), models.Pet.id.asc())
+
+    # One extra row tells whether there is a next page
+    if color:
+        page = coat_color_page(query, color, sort_column, order, limit + 1)
+    else:
+        page = query.with_only_columns(models.Pet.id, sort_column).order_by(*order).limit(limit + 1).subquery()
+    return select(models.Pet, models.PetMarketplace).join(
+        models.PetMarketplace,
+        models.Pet.id == models.PetMarketplace.pet_id
+    ).join(page, page.c.id == models.Pet.id).order_by(*order)
+
+
+@router.get("/listings")
+async def get_marketplace_listings(
+    response: Response,
+    rarity: str = Query(None),
+    min_price: int = Query(None),
+    max_price: int = Query(None),
+    coat_color: str = Query(None),
+    hair_type: str = Query(None),
+    genotype_code: str = Query(None, alias="genotype"),
+    sort_by: str = Query("price_asc"),
+    limit: int = Query(50, ge=1, le=MAX_LISTINGS_PAGE),
+    cursor: str = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Browse available pets for sale, one page at a time.
+
+    Query parameters:
+    - rarity: "Common", "Uncommon", "Rare", "Legendary"
+    - min_price, max_price: Price range
+    - coat_color: Filter by color (Brown, Orange, White, mix, pure)
+    - hair_type: "short" or "fluffy"
+    - genotype: exact loci, genetic code format, e.g. "coat_color:B-B;hair_length:h-h"
+    - sort_by: "price_asc", "price_desc", "rarity", "value"
+    - limit: page size (max 200)
+    - cursor: the X-Next-Cursor header of the previous page (absent on the last page)
+    """
+    if sort_by not in LISTING_SORTS:
+        sort_by = "price_asc"  # unknown orders fall back to the default, as before
+    sort_column, _ = LISTING_SORTS[sort_by]
+    query = listings_query(rarity, min_price, max_price, coat_color, hair_type, genotype_code, sort_by, limit, cursor)
+
+    listings = (await db.execute(query)).all()
+    if len(listings) > limit:
+        listings = listings[:limit]
+        last_pet = listings[-1][0]
+        response.headers["X-Next-Cursor"] = encode_listing_cursor(
+            sort_by, getattr(last_pet, sort_column.key), last_pet.id
+        )
 
     # Format response
     result = []
@@ -252,6 +390,9 @@ def purchase_pet(pet_id: int, buyer_id: int, db: Session = Depends(get_db)):
     Purchase a pet from the marketplace.
     Transfers ownership, updates balance, and logs transaction.
     """
+    return run_write(db, _purchase_pet, pet_id, buyer_id)
+
+def _purchase_pet(db: Session, pet_id: int, buyer_id: int):
     # Get pet and listing
     pet = db.query(models.Pet).filter(models.Pet.id == pet_id).first()
     if not pet:
@@ -280,57 +421,176 @@ def purchase_pet(pet_id: int, buyer_id: int, db: Session = Depends(get_db)):
     if buyer_id == listing.seller_id:
         raise HTTPException(status_code=400, detail="Cannot buy your own pet")
 
-    # Execute transaction
+    # Execute transaction (conditional writes, see trades.py)
     sale_price = listing.asking_price
+    try:
+        buyer_balance, seller_balance = settle_sale(
+            db, pet, seller, buyer, sale_price,
+            claim=(models.Pet.for_sale == 1, models.Pet.asking_price == sale_price)
+        )
+    except TradeRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    # Update balances
-    buyer.balance -= sale_price
-    seller.balance += sale_price
+    return {
+        "message": "Purchase successful",
+        "pet_id": pet_id,
+        "pet_name": pet.name,
+        "sale_price": sale_price,
+        "new_owner_id": buyer_id,
+        "buyer_balance": buyer_balance,
+        "seller_balance": seller_balance
+    }
 
-    # Transfer ownership
-    pet.owner_id = buyer_id
 
-    # Log transactions for both parties
-    buyer_transaction = models.Transaction(
-        user_id=buyer_id,
-        type="pet_purchase",
-        amount=-sale_price,
-        description=f"Purchased {pet.name} from user {seller.username}"
-    )
-    seller_transaction = models.Transaction(
-        user_id=listing.seller_id,
-        type="pet_sale",
-        amount=sale_price,
-        description=f"Sold {pet.name} to user {buyer.username}"
-    )
+# =====================
+# AUCTIONS & STANDING BIDS
+# =====================
 
-    # Log sales history
-    sales_record = models.PetSalesHistory(
-        pet_id=pet_id,
-        seller_id=listing.seller_id,
-        buyer_id=buyer_id,
-        sale_price=sale_price
-    )
+# Bids are taken by the in-memory order book and settled by its matching
+# thread once per GG_ORDER_BOOK_INTERVAL (see order_book.py)
+MAX_AUCTION_MINUTES = 7 * 24 * 60
 
-    # Remove from marketplace
-    db.delete(listing)
-    pet.for_sale = 0
-    pet.asking_price = None
+def _open_auction(db: Session, pet_id: int):
+    return db.query(models.Auction).filter(
+        models.Auction.pet_id == pet_id, models.Auction.status == "open"
+    ).first()
+
+def _check_bidder(db: Session, bidder_id: int, price: int):
+    bidder = db.get(models.User, bidder_id)
+    if not bidder:
+        raise HTTPException(status_code=404, detail="Bidder not found")
+    # Checked again at settlement; a bidder who cannot pay then is skipped
+    if bidder.balance < price:
+        raise HTTPException(status_code=400, detail="Insufficient balance")
+
+
+@router.post("/auctions")
+def create_auction(
+    pet_id: int,
+    reserve_price: int = Query(1, ge=1),
+    duration_minutes: int = Query(60, ge=1, le=MAX_AUCTION_MINUTES),
+    db: Session = Depends(get_db)
+):
+    """
+    Put a pet up for a timed auction. The highest bid at or above the reserve
+    when it ends buys the pet at that bid.
+    """
+    pet = db.get(models.Pet, pet_id)
+    if not pet:
+        raise HTTPException(status_code=404, detail="Pet not found")
+    if pet.for_sale == 1:
+        raise HTTPException(status_code=400, detail="Unlist the pet before auctioning it")
+    if _open_auction(db, pet_id):
+        raise HTTPException(status_code=400, detail="Pet is already up for auction")
 
-    # Commit all changes
-    db.add(buyer_transaction)
-    db.add(seller_transaction)
-    db.add(sales_record)
+    now = datetime.datetime.utcnow()
+    auction = models.Auction(
+        pet_id=pet_id,
+        seller_id=pet.owner_id,
+        reserve_price=reserve_price,
+        starts_at=now,
+        ends_at=now + datetime.timedelta(minutes=duration_minutes),
+        status="open"
+    )
+    db.add(auction)
     db.commit()
+    get_order_book().add_auction(auction)
 
     return {
-        "message": "Purchase successful",
+        "auction_id": auction.id,
         "pet_id": pet_id,
-        "pet_name": pet.name,
-        "sale_price": sale_price,
-        "new_owner_id": buyer_id,
-        "buyer_balance": buyer.balance,
-        "seller_balance": seller.balance
+        "seller_id": auction.seller_id,
+        "reserve_price": reserve_price,
+        "ends_at": auction.ends_at
+    }
+
+
+@router.get("/auctions/{auction_id}")
+def get_auction(auction_id: int, db: Session = Depends(get_db)):
+    """Auction state; while open, the best bid comes from the order book"""
+    auction = db.get(models.Auction, auction_id)
+    if not auction:
+        raise HTTPException(status_code=404, detail="Auction not found")
+
+    result = {
+        "auction_id": auction.id,
+        "pet_id": auction.pet_id,
+        "seller_id": auction.seller_id,
+        "reserve_price": auction.reserve_price,
+        "starts_at": auction.starts_at,
+        "ends_at": auction.ends_at,
+        "status": auction.status,
+        "winning_bid_id": auction.winning_bid_id,
+        "final_price": auction.final_price,
+        "settled_at": auction.settled_at
+    }
+    if auction.status == "open":
+        result.update(get_order_book().auction_summary(auction_id))
+    return result
+
+
+@router.post("/auctions/{auction_id}/bids")
+def bid_on_auction(auction_id: int, bidder_id: int, price: int, db: Session = Depends(get_db)):
+    """Bid on an auction. A bid must meet the reserve and beat the best bid so far."""
+    _check_bidder(db, bidder_id, price)
+    try:
+        bid = get_order_book().submit_bid(bidder_id, price, auction_id=auction_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return bid.as_dict()
+
+
+@router.post("/bids")
+def place_standing_bid(
+    bidder_id: int,
+    price: int,
+    rarity: str = Query(None),
+    coat_color: str = Query(None),
+    hair_type: str = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Standing bid: buy the cheapest listed pet of this tier / dominant coat
+    colour / hair type (omitted filters match anything) as soon as one is
+    listed at or below `price`. The sale goes through at the asking price.
+    """
+    _check_bidder(db, bidder_id, price)
+    key = (rarity, coat_color.capitalize() if coat_color else None, hair_type)
+    try:
+        bid = get_order_book().submit_bid(bidder_id, price, key=key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return bid.as_dict()
+
+
+@router.delete("/bids/{bid_id}")
+def cancel_bid(bid_id: int, bidder_id: int):
+    """Withdraw an open bid (auction or standing)"""
+    book = get_order_book()
+    bid = book.open_bid(bid_id)
+    if bid is None:
+        raise HTTPException(status_code=404, detail="No open bid with that id")
+    if bid.bidder_id != bidder_id:
+        raise HTTPException(status_code=403, detail="Not your bid")
+    if not book.cancel_bid(bid_id):
+        raise HTTPException(status_code=409, detail="Bid was filled or closed meanwhile")
+    return {"message": f"Bid {bid_id} cancelled"}
+
+
+@router.get("/order-book")
+def get_order_book_depth(
+    rarity: str = Query(None),
+    coat_color: str = Query(None),
+    hair_type: str = Query(None),
+    levels: int = Query(10, ge=1, le=100)
+):
+    """Best price levels of the standing bids for one tier / phenotype key, plus engine counters"""
+    book = get_order_book()
+    key = (rarity, coat_color.capitalize() if coat_color else None, hair_type)
+    return {
+        "filters": {"rarity": key[0], "coat_color": key[1], "hair_type": key[2]},
+        "bids": book.depth(key, levels),
+        "engine": dict(book.metrics)
     }
 
 
@@ -339,29 +599,43 @@ def purchase_pet(pet_id: int, buyer_id: int, db: Session = Depends(get_db)):
 # =====================
 
 @router.get("/portfolio/{user_id}")
-def get_user_portfolio(user_id: int, db: Session = Depends(get_db)):
+def get_user_portfolio(
+    user_id: int,
+    response: Response,
+    details: bool = Query(False),
+    limit: int = Query(50, ge=1, le=MAX_LISTINGS_PAGE),
+    cursor: str = Query(None),
+    db: Session = Depends(get_db)
+):
     """
     Get total collection value and portfolio breakdown for a user.
+
+    The totals come from one grouped aggregate (tier x coat colour x hair type).
+    With details=true the user's pets are added, most valuable first, one page
+    at a time (limit / cursor, next page in the X-Next-Cursor header).
     """
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    pets = db.query(models.Pet).filter(models.Pet.owner_id == user_id).all()
-
-    if not pets:
-        return {
-            "user_id": user_id,
-            "username": user.username,
-            "total_value": 0,
-            "pet_count": 0,
-            "breakdown": {}
-        }
+    # Recalculate valuations if needed (only the pets that were never valued)
+    unvalued = db.query(models.Pet).filter(
+        models.Pet.owner_id == user_id,
+        or_(models.Pet.rarity_score == 0, models.Pet.market_value == 0)
+    ).all()
+    for pet in unvalued:
+        RarityCalculator.calculate_and_store_valuation(pet, db)
+    if unvalued:
+        db.commit()
 
-    # Recalculate valuations if needed
-    for pet in pets:
-        if pet.rarity_score == 0 or pet.market_value == 0:
-            RarityCalculator.calculate_and_store_valuation(pet, db)
+    tier = func.coalesce(models.Pet.rarity_tier, "Common")
+    color = func.coalesce(models.Pet.coat_dominant, "Unknown")
+    hair = func.coalesce(models.Pet.hair_type, "short")
+    groups = db.execute(
+        select(tier, color, hair, func.count(), func.coalesce(func.sum(models.Pet.market_value), 0))
+        .where(models.Pet.owner_id == user_id)
+        .group_by(tier, color, hair)
+    ).all()
 
     # Sum up values by tier
     breakdown = {
@@ -370,25 +644,95 @@ def get_user_portfolio(user_id: int, db: Session = Depends(get_db)):
         "Rare": {"count": 0, "total_value": 0},
         "Legendary": {"count": 0, "total_value": 0}
     }
+    by_color = {}
+    by_hair_type = {}
 
     total_value = 0
-    for pet in pets:
-        tier = pet.rarity_tier or "Common"
-        breakdown[tier]["count"] += 1
-        breakdown[tier]["total_value"] += pet.market_value
-        total_value += pet.market_value
-
-    db.commit()
+    pet_count = 0
+    for tier_name, color_name, hair_name, count, value in groups:
+        for totals in (
+            breakdown.setdefault(tier_name, {"count": 0, "total_value": 0}),
+            by_color.setdefault(color_name, {"count": 0, "total_value": 0}),
+            by_hair_type.setdefault(hair_name, {"count": 0, "total_value": 0}),
+        ):
+            totals["count"] += count
+            totals["total_value"] += value
+        total_value += value
+        pet_count += count
+
+    if not pet_count:
+        return {
+            "user_id": user_id,
+            "username": user.username,
+            "total_value": 0,
+            "pet_count": 0,
+            "breakdown": {}
+        }
 
-    return {
+    portfolio = {
         "user_id": user_id,
         "username": user.username,
         "total_value": total_value,
-        "pet_count": len(pets),
+        "pet_count": pet_count,
         "breakdown": breakdown,
-        "average_pet_value": int(total_value / len(pets)) if pets else 0
+        "by_color": by_color,
+        "by_hair_type": by_hair_type,
+        "average_pet_value": int(total_value / pet_count)
     }
 
+    if details:
+        # Walks the (owner_id, market_value, id) index, same keyset as the "value" listings order
+        query = select(models.Pet).where(models.Pet.owner_id == user_id)
+        if cursor:
+            value, pet_id = decode_listing_cursor(cursor, "value")
+            query = query.where(tuple_(models.Pet.market_value, models.Pet.id) < tuple_(value, pet_id))
+        pets = db.scalars(
+            query.order_by(models.Pet.market_value.desc(), models.Pet.id.desc()).limit(limit + 1)
+        ).all()
+        if len(pets) > limit:
+            pets = pets[:limit]
+            response.headers["X-Next-Cursor"] = encode_listing_cursor("value", pets[-1].market_value, pets[-1].id)
+        portfolio["pets"] = [
+            {
+                "pet_id": pet.id,
+                "name": pet.name,
+                "market_value": pet.market_value,
+                "rarity_tier": pet.rarity_tier,
+                "rarity_score": pet.rarity_score,
+                "coat_color": pet.color_phenotype,
+                "hair_type": pet.hair_type,
+                "for_sale": bool(pet.for_sale)
+            }
+            for pet in pets
+        ]
+
+    return portfolio
+
+
+@router.get("/price-history")
+def get_price_history(
+    rarity: str = Query(None),
+    coat_color: str = Query(None),
+    hair_type: str = Query(None),
+    hours: int = Query(168, ge=1, le=MAX_HISTORY_HOURS),
+    db: Session = Depends(get_db)
+):
+    """
+    Sale prices over time, from the hourly sale rollups (see price_history.py).
+
+    Query parameters (all optional, combined with AND):
+    - rarity: "Common", "Uncommon", "Rare", "Legendary"
+    - coat_color: dominant coat colour (Brown, Orange, White)
+    - hair_type: "short" or "fluffy"
+    - hours: length of the hourly series (default one week)
+    """
+    if coat_color:
+        coat_color = coat_color.capitalize()
+    stats = price_stats(db, rarity, coat_color, hair_type)
+    stats["filters"] = {"rarity": rarity, "coat_color": coat_color, "hair_type": hair_type}
+    stats["history"] = hourly_history(db, hours, rarity, coat_color, hair_type)
+    return stats
+
 
 @router.get("/my-listings/{user_id}")
 def get_user_listings(user_id: int, db: Session = Depends(get_db)):
@@ -420,99 +764,34 @@ def get_user_listings(user_id: int, db: Session = Depends(get_db)):
 
 @router.get("/market-stats")
 def get_market_statistics(db: Session = Depends(get_db)):
-    """Get market analytics and statistics"""
-    # Get all listings
-    listings = db.query(models.Pet, models.PetMarketplace).join(
-        models.PetMarketplace,
-        models.Pet.id == models.PetMarketplace.pet_id
-    ).all()
+    """Get market analytics and statistics (per-tier counters, see market_stats.py)"""
+    tiers = tier_stats(db)
 
-    if not listings:
+    if not tiers:
         return {
             "total_pets_listed": 0,
             "average_prices": {},
             "price_range": {}
         }
 
-    # Calculate stats by tier
-    stats_by_tier = {
-        "Common": {"count": 0, "total_price": 0, "prices": []},
-        "Uncommon": {"count": 0, "total_price": 0, "prices": []},
-        "Rare": {"count": 0, "total_price": 0, "prices": []},
-        "Legendary": {"count": 0, "total_price": 0, "prices": []}
-    }
-
-    for pet, listing in listings:
-        tier = pet.rarity_tier or "Common"
-        stats_by_tier[tier]["count"] += 1
-        stats_by_tier[tier]["total_price"] += listing.asking_price
-        stats_by_tier[tier]["prices"].append(listing.asking_price)
-
-    # Calculate averages and ranges
     average_prices = {}
     price_ranges = {}
+    average_market_values = {}
+    market_value_ranges = {}
 
-    for tier, stats in stats_by_tier.items():
-        if stats["count"] > 0:
-            avg = int(stats["total_price"] / stats["count"])
-            average_prices[tier] = avg
-            price_ranges[tier] = {
-                "min": min(stats["prices"]),
-                "max": max(stats["prices"])
-            }
+    for stats in tiers:
+        tier = stats.rarity_tier
+        average_prices[tier] = int(stats.price_sum / stats.listed_count)
+        price_ranges[tier] = {"min": stats.price_min, "max": stats.price_max}
+        average_market_values[tier] = int(stats.value_sum / stats.listed_count)
+        market_value_ranges[tier] = {"min": stats.value_min, "max": stats.value_max}
 
     return {
-        "total_pets_listed": len(listings),
+        "total_pets_listed": sum(stats.listed_count for stats in tiers),
         "average_prices": average_prices,
         "price_ranges": price_ranges,
-        "total_market_value": sum(listing.asking_price for _, listing in listings)
+        "average_market_values": average_market_values,
+        "market_value_ranges": market_value_ranges,
+        "total_market_value": sum(stats.price_sum for stats in tiers)
     }
 
-
-# =====================
-# HELPER FUNCTIONS
-# =====================
-
-def _get_possible_coat_colors(genetic_code1: str, genetic_code2: str) -> list:
-    """Get possible coat colors from parent genetics"""
-    genes1 = RarityCalculator.parse_genetic_code(genetic_code1)
-    genes2 = RarityCalculator.parse_genetic_code(genetic_code2)
-
-    coat1 = genes1.get("coat_color", "WW")
-    coat2 = genes2.get("coat_color", "WW")
-
-    # Simplified: show parent genotypes
-    colors = {
-        "B": "Brown",
-        "O": "Orange",
-        "W": "White"
-    }
-
-    possible = set()
-    for a1 in coat1:
-        for a2 in coat2:
-            possible.add(colors.get(a1, "Unknown"))
-            possible.add(colors.get(a2, "Unknown"))
-
-    return list(possible)
-
-
-def _get_possible_hair_types(genetic_code1: str, genetic_code2: str) -> list:
-    """Get possible hair types from parent genetics"""
-    genes1 = RarityCalculator.parse_genetic_code(genetic_code1)
-    genes2 = RarityCalculator.parse_genetic_code(genetic_code2)
-
-    hair1 = genes1.get("hair_length", "HH")
-    hair2 = genes2.get("hair_length", "HH")
-
-    possible = set()
-
-    # If either parent can pass 'h', fluffy is possible
-    if "h" in hair1 or "h" in hair2:
-        possible.add("fluffy")
-
-    # Short is likely possible
-    if "H" in hair1 or "H" in hair2:
-        possible.add("short")
-
-    return list(possible) if possible else ["short"]
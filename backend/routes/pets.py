@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..db_connect import get_db
+from ..db_connect import get_db, get_async_db
 from ..import models, schemas
 import json
 import datetime
@@ -9,7 +11,11 @@ import random
 
 # Add these imports at the top of the file
 from ..genetics import GeneticCode, BreedingEngine
+from ..market_stats import listing_key, update_listing
 from ..pricing import RarityCalculator
+from ..vitals import apply_pending_decay, apply_pending_decay_all
+from ..scheduler import SCHEDULER_CONFIG
+from ..write_queue import run_write
 
 # --- THIS LINE IS CRITICAL (It was missing in the broken version) ---
 router = APIRouter(prefix="/pets", tags=["Pets"])
@@ -45,11 +51,10 @@ def create_pet(pet: schemas.PetCreate, db: Session = Depends(get_db)):
     best_genetic_code = None
     for _ in range(50):
         candidate = GeneticCode.generate_random_genetic_code(db)
-        decoded = GeneticCode.decode(candidate)
-        gene_color = decoded.get('coat_color', 'Mixed')
-        gene_hair = decoded.get('hair_type', 'short')
+        gene_color = RarityCalculator.get_coat_phenotype(candidate)["dominant"]
+        gene_hair = RarityCalculator.get_hair_type(candidate)["type"]
         
-        color_ok = (target_color in gene_color) or (target_color == "Orange" and "Mixed" in gene_color)
+        color_ok = (gene_color == target_color)
         hair_ok = (gene_hair == target_hair)
         
         if color_ok and hair_ok:
@@ -57,6 +62,7 @@ def create_pet(pet: schemas.PetCreate, db: Session = Depends(get_db)):
             break
             
     db_pet.genetic_code = best_genetic_code if best_genetic_code else GeneticCode.generate_random_genetic_code(db)
+    RarityCalculator.store_phenotype(db_pet)
     
     db.add(db_pet)
     db.commit()
@@ -106,8 +112,10 @@ def create_pet(pet: schemas.PetCreate, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=list[schemas.Pet])
 def get_all_pets(db: Session = Depends(get_db)):
-    """Get all pets"""
-    return db.query(models.Pet).all()
+    """Get all pets (vitals caught up in memory, nothing is written)"""
+    pets = db.query(models.Pet).all()
+    apply_pending_decay_all(db, pets)
+    return pets
 
 @router.get("/{pet_id}", response_model=schemas.Pet)
 def get_pet(pet_id: int, db: Session = Depends(get_db)):
@@ -115,24 +123,56 @@ def get_pet(pet_id: int, db: Session = Depends(get_db)):
     pet = db.query(models.Pet).filter(models.Pet.id == pet_id).first()
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
+    apply_pending_decay_all(db, [pet])
     return pet
 
+def owner_pets_query(owner_id: int, can_breed: bool = None, now: datetime.datetime = None):
+    """
+    The /owner statement. can_breed=True keeps the pets that were never bred
+    or whose cooldown is over, False the ones still cooling down; both search
+    the (owner_id, breedable_at) index. An OR of "never bred" (NULL) and
+    "cooled down" stops that index at owner_id, so each half gets its own branch.
+    """
+    pets = models.Pet
+    if can_breed is None:
+        return select(pets).where(pets.owner_id == owner_id)
+    now = now or datetime.datetime.utcnow()
+    if not can_breed:
+        return select(pets).where(pets.owner_id == owner_id, pets.breedable_at > now)
+    return select(pets).where(pets.id.in_(union_all(
+        select(pets.id).where(pets.owner_id == owner_id, pets.breedable_at.is_(None)),
+        select(pets.id).where(pets.owner_id == owner_id, pets.breedable_at <= now),
+    )))
+
 @router.get("/owner/{owner_id}", response_model=list[schemas.Pet])
-def get_pets_by_owner(owner_id: int, db: Session = Depends(get_db)):
-    """Get all pets owned by a specific user"""
-    user = db.query(models.User).filter(models.User.id == owner_id).first()
+async def get_pets_by_owner(owner_id: int, can_breed: bool = None, db: AsyncSession = Depends(get_async_db)):
+    """Get all pets owned by a specific user (can_breed: only those that can / cannot breed now)"""
+    user = await db.get(models.User, owner_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return db.query(models.Pet).filter(models.Pet.owner_id == owner_id).all()
+    now = datetime.datetime.utcnow()
+    result = await db.execute(owner_pets_query(owner_id, can_breed, now))
+    pets = result.scalars().all()
+
+    # Caught up in memory only - this session is never committed
+    for pet in pets:
+        apply_pending_decay(pet, user.decay_day or 0, now)
+    return pets
 
 @router.put("/{pet_id}", response_model=schemas.Pet)
 def update_pet(pet_id: int, pet_update: schemas.PetUpdate, db: Session = Depends(get_db)):
     """Update a pet's stats AND name"""
+    return run_write(db, _update_pet, pet_id, pet_update)
+
+def _update_pet(db: Session, pet_id: int, pet_update: schemas.PetUpdate):
     pet = db.query(models.Pet).filter(models.Pet.id == pet_id).first()
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
 
+    # Settle pending decay first so the commit stores a fresh baseline
+    apply_pending_decay_all(db, [pet])
+
     if pet_update.name is not None:
         pet.name = pet_update.name
 
@@ -149,18 +189,20 @@ def update_pet(pet_id: int, pet_update: schemas.PetUpdate, db: Session = Depends
         pet.age_days = pet_update.age_days
 
     pet.last_updated = datetime.datetime.utcnow()
-    
-    db.commit()
-    db.refresh(pet)
     return pet
 
 @router.post("/{pet_id}/feed", response_model=schemas.Pet)
 def feed_pet(pet_id: int, feed_request: schemas.FeedPetRequest, db: Session = Depends(get_db)):
     """Feed a pet with food from user's inventory"""
+    return run_write(db, _feed_pet, pet_id, feed_request)
+
+def _feed_pet(db: Session, pet_id: int, feed_request: schemas.FeedPetRequest):
     pet = db.query(models.Pet).filter(models.Pet.id == pet_id).first()
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
 
+    apply_pending_decay_all(db, [pet])
+
     inventory_item = db.query(models.Inventory).filter(
         models.Inventory.user_id == pet.owner_id,
         models.Inventory.item_name == feed_request.item_name
@@ -204,69 +246,43 @@ def feed_pet(pet_id: int, feed_request: schemas.FeedPetRequest, db: Session = De
         description=f"Fed {pet.name} with {feed_request.item_name}"
     )
     db.add(transaction)
-
-    db.commit()
-    db.refresh(pet)
+    db.flush()
     return pet
 
 @router.post("/decay/{user_id}")
 def process_daily_decay(user_id: int, db: Session = Depends(get_db)):
     """
-    Called by the frontend clock. 
-    Ages pets by Game Days, but handles Hunger by REAL TIME (5 mins).
+    Called by the frontend clock once per Game Day.
+    Only advances the player's game-day counter (one row); pet vitals are
+    derived from it lazily (see vitals.py). Hunger still follows REAL TIME (5 mins).
+    When the server-side scheduler is on it owns the calendar, and this only reports.
     """
-    pets = db.query(models.Pet).filter(models.Pet.owner_id == user_id).all()
     results = {"dead_pets": [], "starving_pets": [], "aged_pets": 0}
-    
-    # 300 seconds = 5 Minutes
-    SECONDS_PER_HUNGER_POINT = 300 
-    now = datetime.datetime.utcnow()
 
-    for pet in pets:
-        # --- 1. AGE THE PET (Still happens every Game Day) ---
-        pet.age_days += 1
-        results["aged_pets"] += 1
+    if not SCHEDULER_CONFIG.enabled:
+        db.query(models.User).filter(models.User.id == user_id).update(
+            {models.User.decay_day: models.User.decay_day + 1}, synchronize_session=False
+        )
+        db.commit()
 
-        # --- 2. INCREASE HUNGER (REAL TIME CHECK) ---
-        # Ensure last_updated is not None (fallback to now)
-        last_check = pet.last_updated or now
-        
-        # Calculate seconds passed since last save/feed/update
-        time_diff = (now - last_check).total_seconds()
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        return results
 
-        # Calculate how many "5 minute chunks" have passed
-        hunger_increase = int(time_diff // SECONDS_PER_HUNGER_POINT)
+    # Report on the caught-up vitals without writing them back
+    pets = db.query(models.Pet).filter(models.Pet.owner_id == user_id).all()
+    now = datetime.datetime.utcnow()
 
-        if hunger_increase > 0:
-            # Apply the calculated hunger (capped at 3)
-            # We use min() to ensure we don't go over 3
-            current_hunger = pet.hunger
-            pet.hunger = min(3, current_hunger + hunger_increase)
-            
-            # CRITICAL: Update the timestamp so it doesn't add hunger again immediately
-            # We only update if hunger actually changed or time passed significantly
-            pet.last_updated = now
+    for pet in pets:
+        apply_pending_decay(pet, user.decay_day, now)
+        results["aged_pets"] += 1
 
-        # --- 3. APPLY PENALTIES ---
         if pet.hunger >= 3:
-            # Starving penalties
-            pet.health -= 25 
-            pet.happiness -= 20
             results["starving_pets"].append(pet.name)
-        elif pet.hunger == 2:
-            # Hungry penalties
-            pet.happiness -= 5
-        
-        # Cap stats
-        pet.health = max(0, pet.health)
-        pet.happiness = max(0, pet.happiness)
 
-        # --- 4. CHECK DEATH ---
         if pet.health <= 0:
-            pet.is_dead = True 
             results["dead_pets"].append(pet.name)
 
-    db.commit()
     return results
 
 @router.delete("/{pet_id}")
@@ -276,39 +292,26 @@ def delete_pet(pet_id: int, db: Session = Depends(get_db)):
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
 
+    listed_before = listing_key(pet)
     db.delete(pet)
+    update_listing(db, listed_before, None)
     db.commit()
     return {"message": "Pet deleted successfully"}
 @router.post("/cooldowns/tick/{user_id}")
 def tick_cooldowns(user_id: int, seconds: int = 1, db: Session = Depends(get_db)):
     """
-    Called by the frontend game loop to decrease breeding cooldowns.
-    Only affects pets that currently have a cooldown > 0.
+    Kept for older clients; does nothing.
+    Cooldowns are stored as Pet.breedable_at and evaluated on read.
     """
-    # Get pets with active cooldowns
-    pets_on_cooldown = db.query(models.Pet).filter(
-        models.Pet.owner_id == user_id, 
-        models.Pet.breeding_cooldown > 0
-    ).all()
-    
-    if not pets_on_cooldown:
-        return {"message": "No updates needed"}
-
-    for pet in pets_on_cooldown:
-        # Decrease cooldown, stop at 0
-        pet.breeding_cooldown = max(0, pet.breeding_cooldown - seconds)
-    
-    db.commit()
-    return {"message": "Cooldowns updated", "updated_count": len(pets_on_cooldown)}
+    return {"message": "No updates needed"}
 @router.post("/feed/all/{user_id}")
 def feed_all_pets(user_id: int, db: Session = Depends(get_db)):
     """Feeds all hungry pets using available food in inventory."""
     
-    # 1. Get all hungry pets
-    pets = db.query(models.Pet).filter(
-        models.Pet.owner_id == user_id,
-        models.Pet.hunger > 0
-    ).all()
+    # 1. Get all hungry pets (stored hunger can be stale, so catch up first)
+    pets = db.query(models.Pet).filter(models.Pet.owner_id == user_id).all()
+    apply_pending_decay_all(db, pets)
+    pets = [pet for pet in pets if pet.hunger > 0]
     
     if not pets:
         return {"message": "No hungry pets!", "fed_count": 0}
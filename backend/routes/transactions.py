@@ -2,12 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..db_connect import get_db
 from ..import models, schemas
+from ..write_queue import run_write
 
 router = APIRouter(prefix="/transactions", tags=["Transactions"])
 
 @router.post("/", response_model=schemas.Transaction)
 def create_transaction(transaction: schemas.TransactionCreate, db: Session = Depends(get_db)):
     """Create a new transaction record AND update user balance"""
+    return run_write(db, _create_transaction, transaction)
+
+def _create_transaction(db: Session, transaction: schemas.TransactionCreate):
     # Verify user exists
     user = db.query(models.User).filter(models.User.id == transaction.user_id).first()
     if not user:
@@ -31,8 +35,7 @@ def create_transaction(transaction: schemas.TransactionCreate, db: Session = Dep
     #     db.rollback()
     #     raise HTTPException(status_code=400, detail="Insufficient funds")
 
-    db.commit()
-    db.refresh(db_transaction)
+    db.flush()
     return db_transaction
 
 @router.get("/user/{user_id}", response_model=list[schemas.Transaction])
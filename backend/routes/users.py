@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..db_connect import get_db
+from ..db_connect import get_db, get_async_db
 from .. import models, schemas
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -18,9 +19,9 @@ def get_users(db: Session = Depends(get_db)):
     return db.query(models.User).all()
 
 @router.get("/{user_id}", response_model=schemas.User)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific user by ID"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+Server-side tick scheduler.
+
+Runs the game-day decay sweep for every player from one background thread in
+the backend process, so clients no longer have to drive it through /pets/decay.
+Breeding cooldowns need no sweep: they are expiry timestamps (Pet.breedable_at).
+Once an hour it also expires old mini-game leaderboard buckets (score_buckets.py)
+and sale rollups (price_history.py), and checks the marketplace counters against the listings (market_stats.py)
+and the leaderboard's rank counters against the scores (leaderboard_counts.py).
+
+Off by default (the single-player game still drives its own clock); enable
+with GG_SCHEDULER=1. Tunables (environment variables):
+
+- GG_SCHEDULER_INTERVAL   seconds between runs                       (1.0)
+- GG_SCHEDULER_BATCH_SIZE rows per statement                         (500)
+- GG_SCHEDULER_BUDGET_MS  time budget per run for the pet sweep     (50)
+
+The length of a game day is the decay setting GG_GAME_DAY_SECONDS (vitals.py),
+so the sweep advances days at the pace lazy decay replays them.
+"""
+
+import datetime
+import os
+import threading
+import time
+from sqlalchemy import select, update
+from .import models
+from .vitals import SECONDS_PER_GAME_DAY, SECONDS_PER_HUNGER_POINT, apply_pending_decay
+from .leaderboard_counts import rebuild_leaderboard_counts
+from .market_stats import rebuild_market_stats
+from .price_history import expire_rollups
+from .score_buckets import expire_buckets
+
+# Real seconds between leaderboard bucket expiry sweeps
+BUCKET_EXPIRY_INTERVAL = 3600
+# Real seconds between market stats consistency checks
+MARKET_STATS_CHECK_INTERVAL = 3600
+
+
+class SchedulerConfig:
+    """Scheduler settings, read from the environment once at import."""
+
+    def __init__(self):
+        self.enabled = os.environ.get("GG_SCHEDULER", "0").lower() in ("1", "true", "yes", "on")
+        self.interval = float(os.environ.get("GG_SCHEDULER_INTERVAL", "1.0"))
+        self.day_seconds = SECONDS_PER_GAME_DAY
+        self.batch_size = int(os.environ.get("GG_SCHEDULER_BATCH_SIZE", "500"))
+        self.budget_seconds = float(os.environ.get("GG_SCHEDULER_BUDGET_MS", "50")) / 1000
+
+
+SCHEDULER_CONFIG = SchedulerConfig()
+
+
+class TickScheduler:
+    """Background thread that sweeps decay for all users in batches."""
+
+    def __init__(self, session_factory, config: SchedulerConfig = SCHEDULER_CONFIG):
+        self.session_factory = session_factory
+        self.config = config
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._last_run = None
+        self._pending_days = 0.0
+        self._last_bucket_expiry = None
+        self._last_market_check = None
+
+        self.metrics = {
+            "running": False,
+            "runs": 0,
+            "errors": 0,
+            "last_error": None,
+            "last_run_at": None,
+            "last_run_ms": 0.0,
+            "game_days_advanced": 0,
+            "users_advanced": 0,
+            "pets_caught_up": 0,
+            "budget_exhausted": 0,
+            "buckets_expired": 0,
+            "sale_rollups_expired": 0,
+            "market_tiers_repaired": 0,
+            "leaderboard_counts_repaired": 0,
+        }
+
+    # --- lifecycle ---
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="tick-scheduler", daemon=True)
+        self._thread.start()
+        self.metrics["running"] = True
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.metrics["running"] = False
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.metrics["errors"] += 1
+                self.metrics["last_error"] = str(e)
+                print(f"Tick scheduler error: {e}")
+            self._stop.wait(self.config.interval)
+
+    # --- one scheduler run ---
+
+    def run_once(self, now: float = None):
+        """Advance game days, then spend the time budget on the pet sweep."""
+        now = time.monotonic() if now is None else now
+        started = time.perf_counter()
+        deadline = started + self.config.budget_seconds
+        elapsed = 0.0 if self._last_run is None else now - self._last_run
+        self._last_run = now
+
+        db = self.session_factory()
+        try:
+            self._pending_days += elapsed / self.config.day_seconds
+            whole_days = int(self._pending_days)
+            if whole_days:
+                self._pending_days -= whole_days
+                self._advance_game_days(db, whole_days)
+
+            self._catch_up_stale_pets(db, deadline)
+
+            if self._last_bucket_expiry is None or now - self._last_bucket_expiry >= BUCKET_EXPIRY_INTERVAL:
+                self._last_bucket_expiry = now
+                self.metrics["buckets_expired"] += expire_buckets(db)
+                self.metrics["sale_rollups_expired"] += expire_rollups(db)
+                db.commit()
+
+            if self._last_market_check is None or now - self._last_market_check >= MARKET_STATS_CHECK_INTERVAL:
+                self._last_market_check = now
+                self.metrics["market_tiers_repaired"] += len(rebuild_market_stats(db))
+                self.metrics["leaderboard_counts_repaired"] += int(rebuild_leaderboard_counts(db))
+                db.commit()
+        finally:
+            db.close()
+
+        self.metrics["runs"] += 1
+        self.metrics["last_run_at"] = datetime.datetime.utcnow().isoformat()
+        self.metrics["last_run_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _advance_game_days(self, db, days: int):
+        """Bump every player's game-day counter, one id range per statement."""
+        users = models.User.__table__
+        last_id = 0
+        while True:
+            ids = db.execute(
+                select(users.c.id).where(users.c.id > last_id)
+                .order_by(users.c.id).limit(self.config.batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            db.execute(
+                update(users).where(users.c.id.between(ids[0], ids[-1]))
+                .values(decay_day=users.c.decay_day + days)
+            )
+            db.commit()
+            self.metrics["users_advanced"] += len(ids)
+            last_id = ids[-1]
+        self.metrics["game_days_advanced"] += days
+
+    def _catch_up_stale_pets(self, db, deadline: float):
+        """
+        Write back vitals for pets whose hunger is due to move.
+        Range scan on last_updated: only pets untouched for a full hunger
+        interval that also have days pending are picked up.
+        """
+        now = datetime.datetime.utcnow()
+        cutoff = now - datetime.timedelta(seconds=SECONDS_PER_HUNGER_POINT)
+        Pet, User = models.Pet, models.User
+
+        while time.perf_counter() < deadline:
+            rows = db.query(Pet, User.decay_day).join(User, User.id == Pet.owner_id).filter(
+                Pet.last_updated <= cutoff,
+                Pet.vitals_day < User.decay_day,
+                Pet.health > 0
+            ).order_by(Pet.last_updated, Pet.id).limit(self.config.batch_size).all()
+            if not rows:
+                return
+
+            for pet, owner_day in rows:
+                apply_pending_decay(pet, owner_day, now)
+            db.commit()
+            self.metrics["pets_caught_up"] += len(rows)
+
+        self.metrics["budget_exhausted"] += 1
@@ -81,8 +81,9 @@ class Pet(PetBase):
     
     genetic_code: Optional[str]
     
-    # --- NEW FIELD ADDED HERE ---
+    # Breeding cooldown: seconds left (computed on read) and the absolute expiry
     breeding_cooldown: int = 0
+    breedable_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -128,6 +129,35 @@ class Leaderboard(LeaderboardCreate):
     class Config:
         from_attributes = True
 
+class LeaderboardNeighborhood(BaseModel):
+    user_id: int
+    rank: int
+    percentile: float
+    total_players: int
+    entries: List[Leaderboard]
+
+class ScoreEventCreate(BaseModel):
+    user_id: int
+    score: int
+
+class ScoreEvent(ScoreEventCreate):
+    id: int
+    game_id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class GameLeaderboardEntry(BaseModel):
+    user_id: int
+    score: int
+    rank: Optional[int] = None
+    period: str
+    period_start: datetime
+
+    class Config:
+        from_attributes = True
+
 # --- GENETICS SCHEMAS ---
 
 class GeneCreate(BaseModel):
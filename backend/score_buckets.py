@@ -0,0 +1,115 @@
+"""
+Windowed mini-game leaderboards.
+
+Every finished run is stored as a ScoreEvent and added, in the same
+transaction, to the player's LeaderboardBucket for the current day, the
+current week and all time. Leaderboard reads only touch the buckets of one
+window (a reverse walk of the window/score index), never the raw events.
+Old daily/weekly buckets and old raw events are deleted by expire_buckets,
+which startup and the tick scheduler call, and which score writes also run
+through expire_buckets_if_due (a commit_hooks.PeriodicExpiry) so windows
+expire without the scheduler too.
+"""
+
+import datetime
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from .import models
+from .commit_hooks import PeriodicExpiry
+from .upserts import upsert
+
+PERIODS = ("daily", "weekly", "all")
+ALL_TIME_START = datetime.datetime(1970, 1, 1)
+
+# How long finished windows and raw events are kept
+DAILY_BUCKETS_KEPT = datetime.timedelta(days=7)
+WEEKLY_BUCKETS_KEPT = datetime.timedelta(weeks=8)
+SCORE_EVENTS_KEPT = datetime.timedelta(days=30)
+# Real seconds between the expiry runs score writes piggyback
+EXPIRY_INTERVAL = 3600
+
+
+def period_start(period: str, now: datetime.datetime) -> datetime.datetime:
+    """Start of the window containing `now` (UTC days, weeks starting Monday)."""
+    midnight = datetime.datetime(now.year, now.month, now.day)
+    if period == "daily":
+        return midnight
+    if period == "weekly":
+        return midnight - datetime.timedelta(days=midnight.weekday())
+    if period == "all":
+        return ALL_TIME_START
+    raise ValueError(f"Unknown period '{period}', expected one of {PERIODS}")
+
+
+def record_score(db: Session, game_id: int, user_id: int, score: int, now: datetime.datetime = None) -> models.ScoreEvent:
+    """Store one run and add it to the player's daily, weekly and all-time buckets. Does NOT commit."""
+    now = now or datetime.datetime.utcnow()
+    event = models.ScoreEvent(game_id=game_id, user_id=user_id, score=score, created_at=now)
+    db.add(event)
+    for period in PERIODS:
+        upsert(
+            db, models.LeaderboardBucket,
+            {"game_id": game_id, "user_id": user_id, "period": period,
+             "period_start": period_start(period, now), "score": score, "updated_at": now},
+            key=["game_id", "period", "period_start", "user_id"],
+            on_conflict=lambda excluded: {
+                "score": models.LeaderboardBucket.score + excluded.score,
+                "updated_at": excluded.updated_at,
+            },
+        )
+    expire_buckets_if_due(db, now)
+    db.flush()
+    return event
+
+
+def _window(game_id: int, period: str, now: datetime.datetime):
+    buckets = models.LeaderboardBucket
+    return (
+        buckets.game_id == game_id,
+        buckets.period == period,
+        buckets.period_start == period_start(period, now),
+    )
+
+
+def top_buckets(db: Session, game_id: int, period: str, limit: int, now: datetime.datetime = None):
+    """The best `limit` buckets of the current window, highest score first."""
+    buckets = models.LeaderboardBucket
+    return db.scalars(
+        select(buckets)
+        .where(*_window(game_id, period, now or datetime.datetime.utcnow()))
+        .order_by(buckets.score.desc(), buckets.id.desc())
+        .limit(limit)
+    ).all()
+
+
+def user_bucket(db: Session, game_id: int, user_id: int, period: str, now: datetime.datetime = None):
+    """(bucket, rank) for a player in the current window, or (None, None)."""
+    buckets = models.LeaderboardBucket
+    window = _window(game_id, period, now or datetime.datetime.utcnow())
+    bucket = db.scalars(select(buckets).where(*window, buckets.user_id == user_id)).first()
+    if bucket is None:
+        return None, None
+    ahead = db.execute(
+        select(func.count()).select_from(buckets).where(*window, buckets.score > bucket.score)
+    ).scalar()
+    return bucket, ahead + 1
+
+
+def expire_buckets(db: Session, now: datetime.datetime = None) -> int:
+    """Delete finished daily/weekly buckets and raw events past retention. Does NOT commit."""
+    now = now or datetime.datetime.utcnow()
+    buckets = models.LeaderboardBucket
+    removed = 0
+    for period, kept in (("daily", DAILY_BUCKETS_KEPT), ("weekly", WEEKLY_BUCKETS_KEPT)):
+        cutoff = period_start(period, now - kept)
+        removed += db.execute(
+            delete(buckets).where(buckets.period == period, buckets.period_start < cutoff)
+        ).rowcount
+    removed += db.execute(
+        delete(models.ScoreEvent).where(models.ScoreEvent.created_at < now - SCORE_EVENTS_KEPT)
+    ).rowcount
+    return removed
+
+
+# expire_buckets at most once per EXPIRY_INTERVAL in this process. Does NOT commit.
+expire_buckets_if_due = PeriodicExpiry(expire_buckets, EXPIRY_INTERVAL)
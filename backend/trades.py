@@ -0,0 +1,99 @@
+"""
+Settling a pet sale between two players.
+
+Used by fixed-price purchases (routes/marketplace.py) and by the auction /
+standing-bid matching engine (order_book.py). Every write re-checks its
+precondition in its WHERE clause, so the row lock taken by the UPDATE decides
+a race instead of a value read earlier:
+
+1. claim the pet - only moves if the seller still owns it (plus any extra
+   conditions, e.g. still listed at this price)
+2. debit the buyer - only if the balance still covers the price
+3. credit the seller
+
+A failed step raises TradeRejected; the caller rolls back (the claim with it).
+"""
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+from .import models
+from .market_stats import listing_key, update_listing
+from .price_history import record_sale
+from .vitals import apply_pending_decay
+
+
+class TradeRejected(Exception):
+    """A sale whose preconditions no longer hold (status_code/detail map onto the HTTP error)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def settle_sale(db: Session, pet: models.Pet, seller: models.User, buyer: models.User,
+                price: int, claim=()) -> tuple:
+    """
+    Move `pet` from `seller` to `buyer` for `price` and log it (Transaction x2,
+    PetSalesHistory, price history, market stats). `claim` adds conditions on
+    the pet row. Returns (buyer_balance, seller_balance). Does NOT commit.
+    """
+    listed_before = listing_key(pet)
+
+    claimed = db.execute(
+        update(models.Pet)
+        .where(models.Pet.id == pet.id, models.Pet.owner_id == seller.id, *claim)
+        .values(owner_id=buyer.id, for_sale=0, asking_price=None)
+    ).rowcount
+    if claimed != 1:
+        raise TradeRejected(409, "Pet is no longer for sale at this price")
+
+    buyer_balance = db.execute(
+        update(models.User)
+        .where(models.User.id == buyer.id, models.User.balance >= price)
+        .values(balance=models.User.balance - price)
+        .returning(models.User.balance)
+    ).scalar()
+    if buyer_balance is None:
+        raise TradeRejected(400, "Insufficient balance")
+
+    seller_balance = db.execute(
+        update(models.User)
+        .where(models.User.id == seller.id)
+        .values(balance=models.User.balance + price)
+        .returning(models.User.balance)
+    ).scalar()
+
+    # Settle decay on the seller's calendar, then rebase onto the buyer's
+    apply_pending_decay(pet, seller.decay_day or 0)
+    pet.vitals_day = buyer.decay_day or 0
+
+    # Log transactions for both parties
+    db.add(models.Transaction(
+        user_id=buyer.id,
+        type="pet_purchase",
+        amount=-price,
+        description=f"Purchased {pet.name} from user {seller.username}"
+    ))
+    db.add(models.Transaction(
+        user_id=seller.id,
+        type="pet_sale",
+        amount=price,
+        description=f"Sold {pet.name} to user {buyer.username}"
+    ))
+    db.add(models.PetSalesHistory(
+        pet_id=pet.id,
+        seller_id=seller.id,
+        buyer_id=buyer.id,
+        sale_price=price
+    ))
+
+    # Feed the price history rollups (tier and phenotype as sold)
+    record_sale(db, pet, price)
+
+    # Remove from marketplace (by pet: a re-list at the same price is a new listing row)
+    db.execute(delete(models.PetMarketplace).where(models.PetMarketplace.pet_id == pet.id))
+    update_listing(db, listed_before, None)
+
+    db.flush()
+    return buyer_balance, seller_balance
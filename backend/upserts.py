@@ -0,0 +1,75 @@
+"""
+"Insert or update by key" in one statement.
+SQLite and PostgreSQL both speak INSERT ... ON CONFLICT DO UPDATE, which
+closes the race between looking a row up and inserting it (two requests
+could otherwise both insert the same inventory stack or leaderboard entry).
+Other backends fall back to select-then-write.
+"""
+
+from types import SimpleNamespace
+from sqlalchemy import literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+_DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def upsert(db, model, values, key, on_conflict):
+    """
+    Insert a row, or update the row that already has the same key columns.
+
+    values:      column -> value for the new row
+    key:         column names of the unique key, e.g. ["user_id", "item_name"]
+    on_conflict: function(excluded) -> column -> value/expression to set on the
+                 existing row; `excluded.<column>` is the incoming value
+
+    Returns the ORM object. Does NOT commit.
+    """
+    dialect_insert = _DIALECT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        return _select_then_write(db, model, values, key, on_conflict)
+
+    stmt = dialect_insert(model).values(**values)
+    stmt = stmt.on_conflict_do_update(index_elements=key, set_=on_conflict(stmt.excluded))
+    return db.scalars(
+        stmt.returning(model), execution_options={"populate_existing": True}
+    ).one()
+
+
+def insert_if_missing(db, model, values, key):
+    """
+    Insert a row unless one with the same key columns exists (INSERT ... ON
+    CONFLICT DO NOTHING). Returns the new ORM object, or None when the row was
+    already there. Does NOT commit.
+    """
+    dialect_insert = _DIALECT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        key_filter = [getattr(model, column) == values[column] for column in key]
+        if db.scalars(select(model).where(*key_filter)).first() is not None:
+            return None
+        row = model(**values)
+        db.add(row)
+        db.flush()
+        return row
+
+    stmt = dialect_insert(model).values(**values).on_conflict_do_nothing(index_elements=key)
+    return db.scalars(
+        stmt.returning(model), execution_options={"populate_existing": True}
+    ).first()
+
+
+def _select_then_write(db, model, values, key, on_conflict):
+    key_filter = [getattr(model, column) == values[column] for column in key]
+    existing = db.scalars(select(model).where(*key_filter)).first()
+    if existing is None:
+        row = model(**values)
+        db.add(row)
+        db.flush()
+        return row
+
+    excluded = SimpleNamespace(**{column: literal(value) for column, value in values.items()})
+    db.execute(update(model).where(*key_filter).values(on_conflict(excluded)))
+    db.refresh(existing)
+    return existing
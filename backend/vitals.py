@@ -0,0 +1,166 @@
+"""
+Lazy hunger/health decay.
+
+Pets are no longer decayed on a timer. Each player has a game-day counter
+(User.decay_day) that the daily decay call bumps, and each pet remembers the
+owner day its vitals were last brought up to date (Pet.vitals_day). Pending
+days are applied when a pet is read or written:
+
+- Read endpoints apply them in memory and never commit, so idle pets cost no writes.
+- Write endpoints apply them before changing the pet, so the commit stores
+  a fresh baseline.
+
+Pending days are replayed at the real times they happened (one per
+SECONDS_PER_GAME_DAY up to now), because hunger follows real time and the
+penalties of each day depend on the hunger reached by then.
+
+The monthly tick changes stored vitals directly, so it settles every pending
+day first (settle_pending_decay); days after the month then replay on top of
+the month's result, in the order they happened.
+"""
+
+import datetime
+import os
+from typing import Dict, Iterable
+from sqlalchemy.orm import Session
+from .import models
+
+# 300 seconds = 5 Minutes of real time per hunger point
+SECONDS_PER_HUNGER_POINT = 300
+
+# Real seconds per game day (GG_GAME_DAY_SECONDS): the homescreen clock calls
+# /pets/decay every 10 s, and the scheduler advances days at the same pace
+SECONDS_PER_GAME_DAY = float(os.environ.get("GG_GAME_DAY_SECONDS", "10"))
+
+
+def step_decay(pet: models.Pet, now: datetime.datetime) -> None:
+    """
+    One game day of decay, exactly as /pets/decay used to apply it per call.
+    Ages by one day, adds real-time hunger, then applies hunger penalties.
+    """
+    # --- 1. AGE THE PET ---
+    pet.age_days += 1
+
+    # --- 2. INCREASE HUNGER (REAL TIME CHECK) ---
+    last_check = pet.last_updated or now
+    time_diff = (now - last_check).total_seconds()
+    hunger_increase = int(time_diff // SECONDS_PER_HUNGER_POINT)
+
+    if hunger_increase > 0:
+        pet.hunger = min(3, pet.hunger + hunger_increase)
+        pet.last_updated = now
+
+    # --- 3. APPLY PENALTIES ---
+    if pet.hunger >= 3:
+        pet.health -= 25
+        pet.happiness -= 20
+    elif pet.hunger == 2:
+        pet.happiness -= 5
+
+    pet.health = max(0, pet.health)
+    pet.happiness = max(0, pet.happiness)
+
+
+def _charge_penalties(pet: models.Pet, days: int) -> None:
+    """The hunger penalties of `days` game days at the pet's current hunger."""
+    # Repeated "subtract then floor at 0" collapses into one subtraction
+    if pet.hunger >= 3:
+        pet.health = max(0, pet.health - 25 * days)
+        pet.happiness = max(0, pet.happiness - 20 * days)
+    elif pet.hunger == 2:
+        pet.health = max(0, pet.health)
+        pet.happiness = max(0, pet.happiness - 5 * days)
+    else:
+        pet.health = max(0, pet.health)
+        pet.happiness = max(0, pet.happiness)
+
+
+def catch_up_decay(pet: models.Pet, game_days: int, now: datetime.datetime,
+                   day_seconds: float = SECONDS_PER_GAME_DAY) -> None:
+    """
+    Apply game_days of decay at once, replaying each day at the real time it
+    happened: the last pending day at `now`, the ones before it day_seconds
+    apart (the client clock's cadence). Gives the same result as calling
+    step_decay at each of those moments. Hunger only moves on the days where
+    a full SECONDS_PER_HUNGER_POINT has passed since last_updated, so the
+    days are charged in runs at constant hunger - a handful of steps however
+    many days are pending.
+    """
+    if game_days <= 0:
+        return
+
+    pet.age_days += game_days
+    first = now - datetime.timedelta(seconds=day_seconds * (game_days - 1))
+    day = datetime.timedelta(seconds=day_seconds)
+    interval = datetime.timedelta(seconds=SECONDS_PER_HUNGER_POINT)
+    last_check = pet.last_updated or now
+
+    done = 0
+    while done < game_days:
+        # First remaining day that sees a full hunger interval since last_check
+        due = last_check + interval
+        moves = done if first + done * day >= due else -((first - due) // day)
+        if moves >= game_days:
+            _charge_penalties(pet, game_days - done)
+            return
+        _charge_penalties(pet, moves - done)
+
+        moved_at = first + moves * day
+        pet.hunger = min(3, pet.hunger + int((moved_at - last_check).total_seconds() // SECONDS_PER_HUNGER_POINT))
+        pet.last_updated = last_check = moved_at
+        _charge_penalties(pet, 1)
+        done = moves + 1
+
+        if pet.hunger >= 3 and done < game_days:
+            # Capped: penalties no longer change, only last_updated keeps moving
+            _charge_penalties(pet, game_days - done)
+            every = -(-interval // day)  # days between hunger checks that pass
+            remaining = game_days - 1 - moves
+            if remaining >= every:
+                pet.last_updated = first + (moves + remaining // every * every) * day
+            return
+
+
+def apply_pending_decay(pet: models.Pet, owner_day: int, now: datetime.datetime = None) -> None:
+    """Bring a pet's vitals up to its owner's current game day (in memory only)."""
+    now = now or datetime.datetime.utcnow()
+    if pet.vitals_day is None:
+        pet.vitals_day = owner_day
+        return
+
+    catch_up_decay(pet, owner_day - pet.vitals_day, now)
+    pet.vitals_day = owner_day
+
+
+def owner_days(db: Session, owner_ids: Iterable[int]) -> Dict[int, int]:
+    """Current game day for each owner, in one query."""
+    ids = {owner_id for owner_id in owner_ids if owner_id is not None}
+    if not ids:
+        return {}
+    rows = db.query(models.User.id, models.User.decay_day).filter(models.User.id.in_(ids)).all()
+    return {user_id: day or 0 for user_id, day in rows}
+
+
+def apply_pending_decay_all(db: Session, pets: Iterable[models.Pet], now: datetime.datetime = None) -> None:
+    """apply_pending_decay for a batch of pets that may have different owners."""
+    pets = list(pets)
+    now = now or datetime.datetime.utcnow()
+    days = owner_days(db, (pet.owner_id for pet in pets))
+    for pet in pets:
+        apply_pending_decay(pet, days.get(pet.owner_id, 0), now)
+
+
+def settle_pending_decay(db: Session, now: datetime.datetime = None) -> int:
+    """
+    Bring every pet that is behind its owner's game day up to date and flush.
+    Used before set-based updates of the stored vitals (the monthly tick).
+    Returns the number of pets settled.
+    """
+    now = now or datetime.datetime.utcnow()
+    rows = db.query(models.Pet, models.User.decay_day).join(
+        models.User, models.User.id == models.Pet.owner_id
+    ).filter(models.Pet.vitals_day < models.User.decay_day).all()
+    for pet, owner_day in rows:
+        apply_pending_decay(pet, owner_day or 0, now)
+    db.flush()
+    return len(rows)
@@ -0,0 +1,165 @@
+"""
+Optional single-writer group commit for the SQLite write endpoints.
+
+SQLite allows one writer at a time, so concurrent write requests mostly queue
+on the file lock (or fail with "database is locked"), and every one of them
+pays for its own commit. With GG_GROUP_COMMIT=1 the write routes hand their
+work to one writer thread instead. It drains whatever is queued, runs each
+request inside its own SAVEPOINT (a failing request only undoes itself),
+commits the whole batch once, then hands every caller its own result or error.
+
+Tunables (environment variables):
+- GG_GROUP_COMMIT_MAX_BATCH  requests per commit                          (64)
+- GG_GROUP_COMMIT_WAIT_MS    extra wait for more work to join a batch      (0)
+
+With no extra wait a batch is simply everything that queued up while the
+previous batch was committing, so a lone request is never held back.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from .db_connect import DATABASE_URL, DB_PROFILE, build_engine
+
+GROUP_COMMIT_ENABLED = os.environ.get("GG_GROUP_COMMIT", "0").lower() in ("1", "true", "yes", "on")
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("GG_GROUP_COMMIT_MAX_BATCH", "64"))
+GROUP_COMMIT_WAIT_SECONDS = float(os.environ.get("GG_GROUP_COMMIT_WAIT_MS", "0")) / 1000
+
+
+def writer_session_factory(url=DATABASE_URL, profile=DB_PROFILE):
+    """
+    Sessions for the writer thread, on an engine of their own.
+    pysqlite's implicit transactions turn the release of the first SAVEPOINT
+    into a COMMIT, so SQLite connections here start every transaction with an
+    explicit BEGIN IMMEDIATE (SQLAlchemy's documented pysqlite recipe).
+    """
+    writer_engine = build_engine(url, profile)
+
+    if writer_engine.dialect.name == "sqlite":
+        @event.listens_for(writer_engine, "connect")
+        def disable_implicit_begin(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(writer_engine, "begin")
+        def begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    # Results are read by the caller after the batch commits
+    return sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=writer_engine)
+
+
+class WriteCoordinator:
+    """One writer thread that batches many callers' work into a single commit."""
+
+    def __init__(self, session_factory, max_batch=GROUP_COMMIT_MAX_BATCH, max_wait=GROUP_COMMIT_WAIT_SECONDS):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+        self.metrics = {"batches": 0, "requests": 0, "failed_requests": 0, "failed_commits": 0}
+
+    def submit(self, fn, *args):
+        """Run fn(session, *args) on the writer thread and block until its batch commits."""
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future.result()
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join(5)
+
+    def _next_batch(self):
+        job = self._queue.get()
+        if job is None:
+            return None
+        batch = [job]
+        while len(batch) < self.max_batch:
+            try:
+                job = self._queue.get(timeout=self.max_wait)
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        outcomes = []
+        db = self.session_factory()
+        try:
+            for fn, args, future in batch:
+                savepoint = db.begin_nested()
+                try:
+                    result = fn(db, *args)
+                    savepoint.commit()
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    savepoint.rollback()
+                    outcomes.append((future, None, e))
+                    self.metrics["failed_requests"] += 1
+            db.commit()
+        except Exception as e:
+            # The batch commit itself failed: nobody's work was saved
+            db.rollback()
+            self.metrics["failed_commits"] += 1
+            outcomes = [(future, None, e) for _, _, future in batch]
+        finally:
+            db.close()
+
+        self.metrics["batches"] += 1
+        self.metrics["requests"] += len(batch)
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_write_coordinator():
+    """The shared coordinator, started on first use (None when group commit is off)."""
+    global _coordinator
+    if not GROUP_COMMIT_ENABLED:
+        return None
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = WriteCoordinator(writer_session_factory())
+        return _coordinator
+
+
+def stop_write_coordinator():
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is not None:
+            _coordinator.stop()
+            _coordinator = None
+
+
+def run_write(db, fn, *args):
+    """
+    Run fn(session, *args) and commit it.
+    fn does the route's work but must not commit. Without group commit it runs
+    on the request's own session; with it, on the shared writer thread.
+    """
+    coordinator = get_write_coordinator()
+    if coordinator is None:
+        result = fn(db, *args)
+        db.commit()
+        return result
+    return coordinator.submit(fn, *args)
@@ -1,6 +1,7 @@
 import pygame
 import os
 import time
+import math
 from api_client import api
 from guineapig import GuineaPigSprite 
 
@@ -15,6 +16,18 @@ GOLD = (255, 215, 0)
 BLUE = (70, 130, 180)
 PLATFORM_COLOR = (100, 100, 120)
 
+def cooldown_remaining(pet_data):
+    """
+    Seconds until a pet can breed again: the server's breeding_cooldown when
+    the pet was fetched, minus the time since. Only the server's clock decides
+    the cooldown, so a client clock that is off does not show a wrong one.
+    """
+    seconds = pet_data.get('breeding_cooldown', 0) or 0
+    fetched_at = pet_data.get('fetched_at')
+    if fetched_at is not None:
+        seconds -= time.monotonic() - fetched_at
+    return max(0, math.ceil(seconds))
+
 class BreedingPage:
     def __init__(self, user_id=1):
         self.user_id = user_id
@@ -102,6 +115,7 @@ class BreedingPage:
         self.message = "Refreshing..."
         try:
             raw_pets = api.get_user_pets(self.user_id)
+            fetched_at = time.monotonic()
             self.pets = []
             
             adult_count = 0
@@ -112,6 +126,9 @@ class BreedingPage:
                 if p.get('health', 100) <= 0:
                     continue
 
+                # Cooldowns count down from the moment of this fetch
+                p['fetched_at'] = fetched_at
+
                 # Only Adults can breed
                 if p.get('age_days', 0) >= 1: 
                     wrapper = GuineaPigSprite(0, 0, p)
@@ -189,9 +206,9 @@ class BreedingPage:
                     if 0 <= index < len(self.pets):
                         pig = self.pets[int(index)]
                         
-                        # --- COOLDOWN CHECK (DB BASED) ---
-                        # We now read the cooldown directly from the database field
-                        cooldown = pig.data.get('breeding_cooldown', 0)
+                        # --- COOLDOWN CHECK ---
+                        # Counts down live from the server's seconds at the last fetch
+                        cooldown = cooldown_remaining(pig.data)
                         
                         if cooldown > 0:
                             self.message = f"Cooldown: Wait {cooldown}s"
@@ -375,7 +392,7 @@ class BreedingPage:
             screen.blit(pig.image, (30, item_y)) 
 
             # --- DRAW COOLDOWN TIMER ---
-            cooldown = pig.data.get('breeding_cooldown', 0)
+            cooldown = cooldown_remaining(pig.data)
             if cooldown > 0:
                 if self.cooldown_img:
                     screen.blit(self.cooldown_img, (95, item_y + 25))